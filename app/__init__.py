@@ -1,20 +1,41 @@
 # Instance of of Flask class
 
 from flask import Flask
+from .config import get_config
 from .models import user_db
+from .engine import init_engines
+from .replicas import read_replicas
+from .logs import log
+from .metrics import metrics
 from .routes import routes_bp
+from .cache import snapshot_cache, watering_cache, directory_cache
+from .blobstore import blob_store
+from .derivatives import derivatives
+from .pubsub import notification_broker
+from .passwords import password_hasher
+from .changes import change_retention
 from flask_wtf.csrf import CSRFProtect
 
 csrf = CSRFProtect()
 
-def create_app():
+def create_app(config_name=None):
   app = Flask(__name__, static_folder = 'static') # app is our web server now
-  app.config['SECRET_KEY'] = 'AgileWeb_group82' # secret key for encryption and security
-  app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///user.db' # create database called 'users.db' in this folder to store user accounts
-  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+  app.config.from_object(get_config(config_name)) # settings live in app/config.py
   
+  log.init_app(app) # structured, level-gated logging to stderr
   user_db.init_app(app) # Connect database object to flask app
+  init_engines(app) # WAL, pragmas and busy timeout on every SQLite connection
+  read_replicas.init_app(app) # read-only pool for GET requests
+  metrics.init_app(app) # request and SQL timings for /metrics
   csrf.init_app(app)
+  snapshot_cache.init_app(app)
+  watering_cache.init_app(app)
+  directory_cache.init_app(app)
+  blob_store.init_app(app) # photo bytes under instance/photos
+  derivatives.init_app(app)
+  notification_broker.init_app(app)
+  password_hasher.init_app(app)
+  change_retention.init_app(app) # compacts and prunes change_log in the background
   
   app.register_blueprint(routes_bp)
 
@@ -0,0 +1,300 @@
+# Server-side analytics for plant charts.
+# Growth charts used to get every PlantGrowthEntry row and do the maths in the
+# browser. Here the measurements of one plant are loaded as two NumPy arrays
+# (day, height) and everything is computed with array operations: calendar
+# rollups via reduceat over sorted bucket keys, growth rate from np.diff, a
+# time-windowed moving average from a cumulative sum, and largest triangle
+# three buckets (LTTB) downsampling so a chart gets a few hundred points that
+# keep the shape of the curve no matter how long the history is.
+#
+# Watering analytics work the same way across all of a user's plants at once:
+# one query sorted by (plant, date), then per-plant interval statistics from
+# group boundaries, bincount and a lexsort for medians. Results are cached per
+# plant id in watering_cache until that plant gets a new watering; the change
+# log tells which plants got one since the stats were cached, in any process.
+
+from datetime import date
+
+import numpy as np
+
+from .models import user_db, PlantGrowthEntry, PlantWaterEntry, Plants
+from .cache import watering_cache
+from .changes import latest_change_id, changes_since
+
+PERIODS = ('day', 'week', 'month')
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+STATS_MAX_CHANGES = 500  # changes since the cached watering stats before we just recompute them all
+
+
+def growth_series(user_id, plant_id):
+    # (days as datetime64[D], heights) sorted by day, straight off ix_growth_user_plant_id_date
+    rows = (user_db.session.query(PlantGrowthEntry.date_recorded, PlantGrowthEntry.cm_grown)
+            .filter(PlantGrowthEntry.user_id == user_id, PlantGrowthEntry.plant_id == plant_id)
+            .order_by(PlantGrowthEntry.date_recorded, PlantGrowthEntry.id)
+            .all())
+    days = np.array([r[0] for r in rows], dtype='datetime64[D]')
+    values = np.array([r[1] for r in rows], dtype=float)
+    return days, values
+
+
+def period_start(days, period):
+    if period == 'day':
+        return days
+    if period == 'week':
+        # 1970-01-01 was a Thursday, shift so weeks start on Monday
+        offset = (days.astype('int64') + 3) % 7
+        return days - offset.astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(period)
+
+
+def rollup(days, values, period):
+    # one row per calendar period: start, count, mean, min, max and the last measurement
+    if len(days) == 0:
+        return {key: np.array([]) for key in ('start', 'count', 'mean', 'min', 'max', 'last')}
+    keys = period_start(days, period)
+    starts, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+    last_index = first_index + counts - 1
+    return {
+        'start': starts,
+        'count': counts,
+        'mean': np.add.reduceat(values, first_index) / counts,
+        'min': np.minimum.reduceat(values, first_index),
+        'max': np.maximum.reduceat(values, first_index),
+        'last': values[last_index],
+    }
+
+
+def growth_rate(days, values):
+    # cm per day since the previous point, NaN for the first one
+    rate = np.full(len(values), np.nan)
+    if len(values) > 1:
+        elapsed = np.diff(days).astype('int64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate[1:] = np.where(elapsed > 0, np.diff(values) / elapsed, np.nan)
+    return rate
+
+
+def moving_average(days, values, window_days):
+    # mean of the points in the window_days days ending at each point (irregular sampling safe)
+    if len(values) == 0:
+        return values
+    ordinal = days.astype('int64')
+    start = np.searchsorted(ordinal, ordinal - window_days + 1, side='left')
+    totals = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    return (totals[end] - totals[start]) / (end - start)
+
+
+def lttb(x, y, threshold):
+    # indices of the points to keep (threshold >= 3), always including the first and last
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    x = x.astype(float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # buckets between the two end points
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (just the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        # keep the point making the largest triangle with the previous pick and that average
+        area = np.abs((x[selected] - avg_x) * (y[lo:hi] - y[selected])
+                      - (x[selected] - x[lo:hi]) * (avg_y - y[selected]))
+        selected = lo + int(np.argmax(area))
+        keep[i + 1] = selected
+    return keep
+
+
+def _number(value, digits=3):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def growth_analytics(plant, period='week', points=DEFAULT_POINTS, window_days=7):
+    raw_days, raw_values = growth_series(plant.user_id, plant.id)
+    buckets = rollup(raw_days, raw_values, period)
+
+    # several measurements on one day count as that day's average
+    daily = rollup(raw_days, raw_values, 'day')
+    days, values = daily['start'], daily['mean']
+
+    rate = growth_rate(days, values)
+    average = moving_average(days, values, window_days)
+    keep = lttb(days.astype('int64'), values, points)
+
+    summary = {'count': len(raw_days), 'days': len(days)}
+    if len(days):
+        span = int((days[-1] - days[0]).astype('int64'))
+        summary.update({
+            'first_date': str(days[0]),
+            'last_date': str(days[-1]),
+            'latest_cm': _number(values[-1]),
+            'total_growth_cm': _number(values[-1] - values[0]),
+            'cm_per_day': _number((values[-1] - values[0]) / span) if span else None,
+        })
+
+    return {
+        'plant_id': plant.id,
+        'plant_name': plant.plant_name,
+        'period': period,
+        'window_days': window_days,
+        'summary': summary,
+        'rollup': [{
+            'period_start': str(start),
+            'count': int(count),
+            'mean_cm': _number(mean),
+            'min_cm': _number(low),
+            'max_cm': _number(high),
+            'last_cm': _number(last),
+        } for start, count, mean, low, high, last in zip(
+            buckets['start'], buckets['count'], buckets['mean'], buckets['min'], buckets['max'], buckets['last'])],
+        'points': [{
+            'date': str(days[i]),
+            'cm': _number(values[i]),
+            'moving_average': _number(average[i]),
+            'cm_per_day': _number(rate[i]),
+        } for i in keep],
+    }
+
+
+def watering_series(user_id, plant_ids=None):
+    # (plant ids, days) sorted by plant then day, straight off ix_water_user_plant_id_date,
+    # plus plant id -> name. Deleting a plant deletes its waterings, and rows
+    # left from plants deleted before plant ids have no plant_id.
+    query = (user_db.session.query(PlantWaterEntry.plant_id, PlantWaterEntry.date_watered)
+             .filter(PlantWaterEntry.user_id == user_id, PlantWaterEntry.plant_id.isnot(None)))
+    names = user_db.session.query(Plants.id, Plants.plant_name).filter(Plants.user_id == user_id)
+    if plant_ids is not None:
+        query = query.filter(PlantWaterEntry.plant_id.in_(plant_ids))
+        names = names.filter(Plants.id.in_(plant_ids))
+    rows = query.order_by(PlantWaterEntry.plant_id, PlantWaterEntry.date_watered).all()
+    plants = np.array([r[0] for r in rows], dtype='int64')
+    days = np.array([r[1] for r in rows], dtype='datetime64[D]')
+    return plants, days, dict(names.all())
+
+
+def watering_intervals(plants, days, names):
+    # plant id -> interval stats, for arrays sorted by (plant, day)
+    if len(days) == 0:
+        return {}
+
+    # several waterings of one plant on the same day count once
+    new_plant = np.r_[True, plants[1:] != plants[:-1]]
+    keep = new_plant | np.r_[True, np.diff(days).astype('int64') != 0]
+    plants, days, new_plant = plants[keep], days[keep], new_plant[keep]
+
+    starts = np.flatnonzero(new_plant)
+    ends = np.r_[starts[1:], len(days)]
+    groups = len(starts)
+    group = np.cumsum(new_plant) - 1
+
+    # days between consecutive waterings of the same plant
+    same = ~new_plant[1:]
+    intervals = np.diff(days).astype('int64')[same].astype(float)
+    interval_group = group[1:][same]
+
+    n = np.bincount(interval_group, minlength=groups)
+    total = np.bincount(interval_group, weights=intervals, minlength=groups)
+    squares = np.bincount(interval_group, weights=intervals ** 2, minlength=groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / n
+        std = np.sqrt(np.maximum(squares / n - mean ** 2, 0))
+        cv = std / mean
+
+    # intervals are already grouped by plant; sort within each group for median/min/max
+    median = low = high = np.full(groups, np.nan)
+    if len(intervals):
+        ordered = intervals[np.lexsort((intervals, interval_group))]
+        first = np.r_[0, np.cumsum(n)[:-1]]
+        has = n > 0
+
+        def at(offset):
+            return np.where(has, ordered[np.minimum(first + offset, len(ordered) - 1)], np.nan)
+
+        median = (at((n - 1) // 2) + at(n // 2)) / 2
+        low, high = at(0), at(n - 1)
+
+    last = days[ends - 1]
+    next_due = last + np.where(np.isnan(median), 0, np.rint(median)).astype('timedelta64[D]')
+
+    return {
+        int(plants[start]): {
+            'plant_id': int(plants[start]),
+            'plant_name': names.get(int(plants[start])),
+            'waterings': int(ends[i] - start),
+            'last_watered': str(last[i]),
+            'mean_interval_days': _number(mean[i], 2),
+            'median_interval_days': _number(median[i], 2),
+            'min_interval_days': _number(low[i], 2),
+            'max_interval_days': _number(high[i], 2),
+            'interval_std_days': _number(std[i], 2),
+            'interval_cv': _number(cv[i], 3),  # 0 is perfectly regular
+            'next_watering': str(next_due[i]) if n[i] else None,
+        } for i, start in enumerate(starts)
+    }
+
+
+def _plants_changed_since(user_id, change_id):
+    # ids of plants whose waterings changed after change_id, or None if we can't
+    # tell (waterings deleted, or so many changes that recomputing is simpler)
+    changes = changes_since(user_id, change_id, STATS_MAX_CHANGES)
+    if changes is None:
+        return None
+    _, upserts, deletes = changes
+    if deletes.get('watering_entries'):
+        return None
+    plants = set(upserts.get('plants', [])) | set(deletes.get('plants', []))
+    entries = upserts.get('watering_entries')
+    if entries:
+        plants.update(plant for plant, in user_db.session.query(PlantWaterEntry.plant_id)
+                      .filter(PlantWaterEntry.id.in_(entries)).distinct())
+    return plants
+
+
+def watering_stats(user_id):
+    # plant id -> stats for every plant with waterings, from cache where we can
+    change_id = latest_change_id(user_id)
+    cached, stale, seen, version = watering_cache.get(user_id)
+    if cached is not None and seen != change_id:
+        # written since, by this process or another one
+        changed = _plants_changed_since(user_id, seen)
+        if changed is None:
+            cached = None
+        else:
+            stale |= changed
+    if cached is None:
+        stats = watering_intervals(*watering_series(user_id))
+        watering_cache.put(user_id, stats, version, change_id)
+        return stats
+    if stale or seen != change_id:
+        fresh = watering_intervals(*watering_series(user_id, sorted(stale))) if stale else {}
+        watering_cache.put(user_id, fresh, version, change_id, replace=stale)
+        for plant_id in stale:
+            cached.pop(plant_id, None)
+        cached.update(fresh)
+    return cached
+
+
+def watering_schedule(user_id, due_within=None, today=None):
+    # per-plant stats soonest due first, with days until due relative to today;
+    # due_within keeps only plants due in that many days (overdue included)
+    today = np.datetime64(today or date.today(), 'D')
+    schedule = []
+    for stats in watering_stats(user_id).values():
+        entry = dict(stats)
+        due = entry['next_watering']
+        entry['days_until_due'] = int((np.datetime64(due, 'D') - today).astype('int64')) if due else None
+        entry['overdue'] = entry['days_until_due'] is not None and entry['days_until_due'] < 0
+        if due_within is not None and (entry['days_until_due'] is None or entry['days_until_due'] > due_within):
+            continue
+        schedule.append(entry)
+    schedule.sort(key=lambda e: (e['next_watering'] is None, e['next_watering'] or '', e['plant_name']))
+    return schedule
@@ -0,0 +1,131 @@
+# Content-addressed on-disk store for uploaded photo bytes.
+# A blob's key is the SHA-256 of its contents and it lives at
+# <root>/<first two hex chars>/<key>, so uploading the same image twice keeps
+# one copy. Uploads are streamed to a temp file in chunks while hashing and then
+# renamed into place, so memory use doesn't depend on the image size.
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+CHUNK_SIZE = 64 * 1024
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# leading magic bytes -> mimetype; anything else is rejected
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+class BlobError(ValueError):
+    pass
+
+
+class BlobTooLarge(BlobError):
+    pass
+
+
+class NotAnImage(BlobError):
+    pass
+
+
+def sniff_mimetype(head):
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def is_valid_key(key):
+    return bool(KEY_PATTERN.match(key or ''))
+
+
+class BlobStore:
+    def __init__(self, root=None, max_bytes=10 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def init_app(self, app):
+        self.root = app.config.get('PHOTO_STORE_PATH') or os.path.join(app.instance_path, 'photos')
+        self.max_bytes = app.config.get('PHOTO_MAX_BYTES', self.max_bytes)
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        app.extensions['blob_store'] = self
+
+    def path(self, key):
+        if not is_valid_key(key):
+            raise BlobError(f'Invalid blob key: {key!r}')
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key):
+        return is_valid_key(key) and os.path.exists(self.path(key))
+
+    def put_stream(self, stream):
+        # returns (key, mimetype); raises NotAnImage / BlobTooLarge
+        digest = hashlib.sha256()
+        size = 0
+        mimetype = None
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size == 0:
+                        mimetype = sniff_mimetype(chunk[:16])
+                        if mimetype is None:
+                            raise NotAnImage('Unsupported image format')
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f'Photos are limited to {self.max_bytes} bytes')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            if size == 0:
+                raise NotAnImage('Empty upload')
+
+            key = digest.hexdigest()
+            final_path = self.path(key)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)  # already stored, keep the existing copy
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return key, mimetype
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_bytes(self, data):
+        return self.put_stream(BytesIO(data))
+
+    def put_data_url(self, data_url):
+        # 'data:image/png;base64,....' as sent by the old FileReader upload flow
+        header, _, encoded = data_url.partition(',')
+        if not header.startswith('data:image') or ';base64' not in header:
+            raise NotAnImage('Expected a base64 image data URL')
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise NotAnImage('Malformed base64 image data')
+        return self.put_bytes(data)
+
+    def mimetype(self, key):
+        with open(self.path(key), 'rb') as f:
+            return sniff_mimetype(f.read(16)) or 'application/octet-stream'
+
+
+blob_store = BlobStore()
+
+
+def blob_url(key):
+    return f'/api/blobs/{key}'
@@ -0,0 +1,247 @@
+# In-process caches.
+# SnapshotCache holds serialized /api/session snapshots, one entry per user.
+# Entries are evicted least-recently-used first once either the entry count or
+# the total payload size goes over the configured limit. Mutating routes call
+# invalidate() after they commit so the next load rebuilds from the database.
+#
+# PageCache holds small query results shared by every user (e.g. the first
+# page of the user directory) and is dropped as a whole on invalidate().
+#
+# PlantStatsCache holds per-plant analytics for each user and is invalidated
+# one plant at a time, so a new watering only recomputes that plant.
+#
+# invalidate() only reaches the process it runs in, and production runs several
+# worker processes. So every entry is also stored with a version read from the
+# database, which any process's write moves forward: the user's latest
+# change_log id for snapshots and plant stats, the newest user id for directory
+# pages. Readers look the version up (one indexed query) and pass it to get();
+# an entry stored under another version is a miss.
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class SnapshotCache:
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # user_id -> (bytes, change id it was built at)
+        self._versions = {}            # user_id -> int, bumped on every invalidate
+        self._size = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('SNAPSHOT_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('SNAPSHOT_CACHE_MAX_BYTES', self.max_bytes)
+        app.extensions['snapshot_cache'] = self
+        self.clear()  # a new app (e.g. in tests) may point at a different database
+
+    def get(self, user_id, change_id):
+        # change_id: the user's latest change_log id (changes.latest_change_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] != change_id:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def version(self, user_id):
+        # read this before building a snapshot and pass it back to put(), so a
+        # write that lands while we were building isn't hidden by a stale entry
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def put(self, user_id, payload, version, change_id):
+        # change_id as read before building the payload
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return False
+            if len(payload) > self.max_bytes:
+                return False
+            self._discard(user_id)
+            self._entries[user_id] = (payload, change_id)
+            self._size += len(payload)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._discard(user_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._size = 0
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+class PageCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (cached value, shared version it was read at)
+        self._version = 0              # bumped on every invalidate
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('DIRECTORY_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['directory_cache'] = self
+        self.clear()
+
+    def get(self, key, shared_version):
+        # (cached value or None, version to pass back to put())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != shared_version:
+                self.misses += 1
+                return None, self._version
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], self._version
+
+    def put(self, key, value, version, shared_version):
+        with self._lock:
+            if version != self._version:
+                return False
+            self._entries[key] = (value, shared_version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class PlantStatsCache:
+    def __init__(self, max_users=4096):
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user_id -> {'plants': {plant_id: stats}, 'stale': set of plant ids,
+                                       #             'change_id': latest change id the stats account for}
+        self._versions = {}            # user_id -> int, bumped on every invalidate
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recomputed = 0
+
+    def init_app(self, app):
+        self.max_users = app.config.get('PLANT_STATS_CACHE_MAX_USERS', self.max_users)
+        app.extensions['watering_cache'] = self
+        self.clear()
+
+    def get(self, user_id):
+        # (cached stats by plant id or None if nothing is cached, stale plant ids,
+        #  change id the stats account for, version for put()); plants changed
+        #  after that change id (maybe by another process) are for the caller to find
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None, set(), None, version
+            self._entries.move_to_end(user_id)
+            if entry['stale']:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return dict(entry['plants']), set(entry['stale']), entry['change_id'], version
+
+    def put(self, user_id, plants, version, change_id, replace=None):
+        # store the full per-plant stats, or if replace is a set of plant ids,
+        # swap in fresh stats for just those plants; either way they now
+        # account for every change up to change_id
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return False
+            entry = self._entries.get(user_id)
+            if replace is None or entry is None:
+                entry = {'plants': dict(plants), 'stale': set(), 'change_id': change_id}
+            else:
+                for plant_id in replace:
+                    entry['plants'].pop(plant_id, None)
+                entry['plants'].update(plants)
+                entry['stale'] -= replace
+                entry['change_id'] = change_id
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            self.recomputed += len(plants) if replace is None else len(replace)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, user_id, *plant_ids):
+        # with no plant ids the user's whole entry goes
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if plant_ids:
+                entry['stale'].update(plant_ids)
+            else:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'max_users': self.max_users,
+                'hits': self.hits,
+                'misses': self.misses,
+                'recomputed': self.recomputed
+            }
+
+
+snapshot_cache = SnapshotCache()
+directory_cache = PageCache()
+watering_cache = PlantStatsCache()
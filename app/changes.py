@@ -0,0 +1,205 @@
+# Change tracking for incremental /api/session?since=<cursor> syncs.
+# Every ORM flush that touches a snapshot row writes a ChangeLog entry for the
+# user that owns the row. Code that bypasses the ORM (bulk Core statements)
+# has to call log_changes() itself.
+#
+# The log doesn't grow forever: prune_changes() keeps only the newest entry per
+# row and drops entries older than CHANGE_LOG_RETENTION_DAYS, moving the sync
+# horizon past them. A cursor from before the horizon, or one that is more than
+# SYNC_MAX_CHANGES changes behind, gets {"resync": true} and the client goes
+# back to a full snapshot. ChangeLogRetention runs the pruning in a background
+# thread every CHANGE_LOG_PRUNE_SECONDS.
+
+import base64
+import binascii
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock, Thread
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, func, insert, delete, select
+from sqlalchemy.exc import OperationalError
+
+from .logs import log
+from .models import (
+    user_db,
+    ChangeLog,
+    SyncHorizon,
+    User,
+    UserSettings,
+    FriendsList,
+    Plants,
+    PlantGrowthEntry,
+    PlantWaterEntry,
+    uploadedPics,
+    SharedPlant,
+    Notification,
+)
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# model -> (snapshot section, owner of the row, key the client merges on)
+TRACKED = {
+    User: ('profile', lambda r: r.id, lambda r: r.id),
+    UserSettings: ('settings', lambda r: r.user_id, lambda r: r.user_id),
+    FriendsList: ('friends', lambda r: r.user_id, lambda r: r.friend_id),
+    Plants: ('plants', lambda r: r.user_id, lambda r: r.id),
+    PlantGrowthEntry: ('growth_entries', lambda r: r.user_id, lambda r: r.id),
+    PlantWaterEntry: ('watering_entries', lambda r: r.user_id, lambda r: r.id),
+    uploadedPics: ('photos', lambda r: r.user_id, lambda r: r.photo_id),
+    SharedPlant: ('shared_plants', lambda r: r.shared_with, lambda r: r.id),
+    Notification: ('notifications', lambda r: r.receiver_id, lambda r: r.id),
+}
+
+
+def change_row(user_id, section, row_id, op=UPSERT):
+    return {'user_id': int(user_id), 'section': section, 'row_id': int(row_id), 'op': op}
+
+
+def log_changes(connection, rows):
+    if rows:
+        connection.execute(insert(ChangeLog.__table__), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    rows = []
+    for op, objects in ((UPSERT, session.new), (UPSERT, session.dirty), (DELETE, session.deleted)):
+        for obj in objects:
+            tracked = TRACKED.get(type(obj))
+            if tracked is None:
+                continue
+            if op == UPSERT and obj in session.dirty and not session.is_modified(obj):
+                continue
+            section, owner, key = tracked
+            rows.append(change_row(owner(obj), section, key(obj), op))
+    log_changes(session.connection(), rows)
+
+
+def sync_horizon():
+    return user_db.session.query(SyncHorizon.pruned_through).scalar() or 0
+
+
+def latest_change_id(user_id):
+    # never behind the horizon, or a user with no recent changes would resync on every load
+    newest = select(func.max(ChangeLog.id)).where(ChangeLog.user_id == user_id).scalar_subquery()
+    horizon = select(SyncHorizon.pruned_through).scalar_subquery()
+    return user_db.session.query(func.max(func.coalesce(newest, 0), func.coalesce(horizon, 0))).scalar()
+
+
+def changes_since(user_id, since, limit=None):
+    # None when the client has to start over from a full snapshot: the changes
+    # after its cursor were pruned, or there are more than `limit` of them
+    if since < sync_horizon():
+        return None
+    query = (user_db.session.query(ChangeLog.id, ChangeLog.section, ChangeLog.row_id, ChangeLog.op)
+             .filter(ChangeLog.user_id == user_id, ChangeLog.id > since)
+             .order_by(ChangeLog.id))
+    rows = query.limit(limit + 1).all() if limit else query.all()
+    if limit and len(rows) > limit:
+        return None
+
+    # collapse to the last operation per row, keyed by section
+    latest = {}
+    cursor = since
+    for change_id, section, row_id, op in rows:
+        latest[(section, row_id)] = op
+        cursor = change_id
+
+    upserts, deletes = {}, {}
+    for (section, row_id), op in latest.items():
+        (upserts if op == UPSERT else deletes).setdefault(section, []).append(row_id)
+    return cursor, upserts, deletes
+
+
+def prune_changes(session, older_than, users_per_batch=1000, rows_per_batch=10000):
+    # one transaction per batch so the write lock is never held for long
+    # 1. keep only the newest change per (user, section, row); a delta collapses
+    #    to the last operation per row anyway, so this can't change one
+    compacted = 0
+    last_user = session.query(func.max(ChangeLog.user_id)).scalar() or 0
+    for start in range(0, last_user + 1, users_per_batch):
+        in_batch = ChangeLog.user_id.between(start, start + users_per_batch - 1)
+        newest = (select(func.max(ChangeLog.id)).where(in_batch)
+                  .group_by(ChangeLog.user_id, ChangeLog.section, ChangeLog.row_id))
+        compacted += session.execute(delete(ChangeLog).where(in_batch, ChangeLog.id.not_in(newest))).rowcount
+        session.commit()
+
+    # 2. drop everything older than `older_than`. The newest row always stays:
+    #    SQLite hands out max(id) + 1, and a reused id would hide changes from cursors
+    expired, newest_id = session.query(
+        func.max(ChangeLog.id).filter(ChangeLog.changed_at < older_than), func.max(ChangeLog.id)).one()
+    through = min(expired or 0, (newest_id or 0) - 1)
+    horizon = session.get(SyncHorizon, 1)
+    pruned = 0
+    if through > (horizon.pruned_through if horizon else 0):
+        # move the horizon first, a cursor between it and the rows still being deleted just resyncs early
+        if horizon is None:
+            session.add(SyncHorizon(id=1, pruned_through=through))
+        else:
+            horizon.pruned_through = through
+        session.commit()
+        first = session.query(func.min(ChangeLog.id)).scalar() or through
+        for start in range(first, through + 1, rows_per_batch):
+            pruned += session.execute(delete(ChangeLog).where(
+                ChangeLog.id.between(start, min(start + rows_per_batch - 1, through)))).rowcount
+            session.commit()
+    return compacted, pruned
+
+
+class ChangeLogRetention:
+    def __init__(self):
+        self.retention_days = 30
+        self.interval = None
+        self._next_run = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.retention_days = app.config.get('CHANGE_LOG_RETENTION_DAYS', self.retention_days)
+        self.interval = app.config.get('CHANGE_LOG_PRUNE_SECONDS')
+        app.extensions['change_retention'] = self
+        if self.interval:
+            app.after_request(self._maybe_prune)
+
+    def _maybe_prune(self, response):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_run:
+                return response
+            self._next_run = now + self.interval
+        Thread(target=self.run, args=(current_app._get_current_object(),), daemon=True).start()
+        return response
+
+    def run(self, app):
+        with app.app_context():
+            try:
+                # changed_at is CURRENT_TIMESTAMP, i.e. UTC
+                cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=self.retention_days)
+                compacted, pruned = prune_changes(user_db.session, cutoff)
+                log.info('change_log_pruned', compacted=compacted, pruned=pruned)
+            except OperationalError as e:
+                # locked by a long write, the next run picks it up
+                user_db.session.rollback()
+                log.warning('change_log_prune_failed', error=str(e))
+            finally:
+                user_db.session.remove()
+
+
+change_retention = ChangeLogRetention()
+
+
+# Cursors are opaque to the client so the encoding can change later
+def encode_cursor(change_id):
+    return base64.urlsafe_b64encode(f'c{change_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not raw.startswith('c') or not raw[1:].isdigit():
+        return None
+    return int(raw[1:])
@@ -0,0 +1,123 @@
+# Configuration profiles for create_app().
+# create_app('production') / create_app('test') / create_app(SomeConfigClass);
+# with no argument the PLANTLY_CONFIG environment variable picks the profile,
+# falling back to development.
+#
+# SQLite engine profile: every new connection gets SQLITE_PRAGMAS and
+# SQLITE_BUSY_TIMEOUT (see app/engine.py). WAL lets readers carry on while a
+# write commits, and the busy timeout makes a second writer wait for the lock
+# instead of failing straight away with "database is locked". Writes that
+# still hit a lock are retried WRITE_RETRIES times by @retry_on_locked.
+# Safe requests read through a separate read-only pool (app/replicas.py).
+
+import os
+
+
+class Config:
+    SECRET_KEY = 'AgileWeb_group82' # secret key for encryption and security
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///user.db' # create database called 'users.db' in this folder to store user accounts
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # database engine
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',     # readers don't block the writer and vice versa
+        'synchronous': 'normal',   # safe with WAL, fsync at checkpoints instead of every commit
+        'cache_size': -64000,      # negative is KiB, so ~64MB of page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'memory',
+    }
+    SQLITE_BUSY_TIMEOUT = 5 # seconds a connection waits for a lock before "database is locked"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,       # open connections kept around, one per busy request thread
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_pre_ping': False,  # local file, connections don't go stale
+    }
+    WRITE_RETRIES = 3 # extra attempts for a write request that still found the database locked
+    WRITE_RETRY_BACKOFF = 0.05 # seconds, doubled after every attempt
+    READ_ROUTING = True # False sends every query to the primary
+    SQLALCHEMY_READ_URI = None # replica for GET requests; None reads the primary file through read-only connections
+    READ_ENGINE_OPTIONS = {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 10}
+    READ_YOUR_WRITES_SECONDS = 5 # after a user's own write their reads stay on the primary this long
+
+    # caches
+    SNAPSHOT_CACHE_MAX_ENTRIES = 1024 # cached /api/session payloads, least recently used dropped first
+    SNAPSHOT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    PLANT_STATS_CACHE_MAX_USERS = 4096 # users whose per-plant watering stats are kept
+    DIRECTORY_CACHE_MAX_ENTRIES = 256 # cached first pages of /api/users (per prefix and page size)
+
+    # delta sync (/api/session?since=)
+    SYNC_MAX_CHANGES = 5000 # a cursor further behind than this gets a resync, a full snapshot is cheaper
+    CHANGE_LOG_RETENTION_DAYS = 30 # older change_log rows are pruned, their cursors resync
+    CHANGE_LOG_PRUNE_SECONDS = 3600 # how often each process compacts/prunes change_log; None turns it off
+
+    # uploads and photos
+    PHOTO_MAX_BYTES = 10 * 1024 * 1024 # per photo, checked while the upload streams to disk
+    MAX_CONTENT_LENGTH = 32 * 1024 * 1024 # hard cap on any request body
+    IMPORT_MAX_BYTES = 256 * 1024 * 1024 # /api/import streams its body, so it gets a higher cap
+    DERIVATIVE_WORKERS = 2 # threads resizing photos into thumb/card/full variants
+    DERIVATIVE_MAX_PENDING = 256
+    USE_X_SENDFILE = False # set True behind nginx/Apache so they stream photo files themselves
+
+    # notifications
+    NOTIFICATION_STREAM_HEARTBEAT = 15 # seconds between keep-alive comments on /api/notifications/stream
+    NOTIFICATION_STREAM_LIFETIME = 300 # close streams after this long, the browser reconnects
+
+    # logging and metrics
+    LOG_LEVEL = 'INFO' # DEBUG, INFO, WARNING, ERROR; anything below is skipped before formatting
+    LOG_FORMAT = 'json' # or 'text' for reading in a terminal
+    METRICS_ENABLED = True # per-endpoint latency, SQL and size stats at /metrics
+    METRICS_N_PLUS_ONE_THRESHOLD = 10 # same statement this many times in one request is logged as an N+1
+    METRICS_PUBLIC = False # True serves /metrics and /api/cache-stats to any address, not just this host
+
+    # passwords
+    PASSWORD_HASH_METHOD = 'scrypt' # werkzeug method string, older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS = 2 # threads hashing passwords for login/register
+    PASSWORD_MAX_QUEUE = 16 # hashes allowed to wait for a worker before login/register return 503
+    PASSWORD_RETRY_AFTER = 2 # seconds, sent as Retry-After with those 503s
+
+
+class DevelopmentConfig(Config):
+    pass
+
+
+class ProductionConfig(Config):
+    SECRET_KEY = os.environ.get('SECRET_KEY', Config.SECRET_KEY)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', Config.SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL')
+    PASSWORD_HASH_WORKERS = os.cpu_count() or 2
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory DB
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'test_secret'
+    # an in-memory database is one shared connection, so no WAL and no pool sizing
+    SQLITE_PRAGMAS = {'temp_store': 'memory'}
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WRITE_RETRIES = 0
+    LOG_LEVEL = 'WARNING'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1' # fast hashes, these aren't real passwords
+    DERIVATIVE_WORKERS = 1
+    CHANGE_LOG_PRUNE_SECONDS = None # tests prune explicitly
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'test': TestConfig,
+    'testing': TestConfig,
+}
+
+
+def get_config(name=None):
+    # a profile name, or a config object/class passed straight through
+    if name is None:
+        name = os.environ.get('PLANTLY_CONFIG', 'development')
+    if not isinstance(name, str):
+        return name
+    try:
+        return configs[name]
+    except KeyError:
+        raise ValueError(f"Unknown config {name!r}, expected one of {', '.join(configs)}")
@@ -0,0 +1,135 @@
+# Resized copies of uploaded photos and plant avatars.
+# After an upload the original is queued on a small thread pool, which writes
+# one re-encoded JPEG per size variant next to it (<blob>.thumb.jpg, ...).
+# Avatars ship inside app/static, so theirs go under the photo store instead.
+# Serving routes ask for a variant and get the original until it exists, so a
+# slow or failed resize never blocks or breaks a request. Pillow is optional:
+# without it every variant falls back to the original file.
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # resizing disabled, originals are served as-is
+    Image = None
+
+# variant -> longest edge in pixels
+VARIANTS = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1280,
+}
+JPEG_QUALITY = 82
+
+
+def variant_path(prefix, variant):
+    return f'{prefix}.{variant}.jpg'
+
+
+def render_variants(source_path, prefix, variants=VARIANTS):
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            # flatten transparency onto white, JPEG has no alpha
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.convert('RGBA').getchannel('A'))
+            img = background
+
+        for variant, edge in variants.items():
+            resized = img.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(prefix), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    resized.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp_path, variant_path(prefix, variant))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+
+class DerivativePipeline:
+    def __init__(self, workers=2, max_pending=256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = {}  # source path -> future, so a file is only queued once
+        self._broken = set()  # sources Pillow couldn't read, not retried
+        self._lock = Lock()
+        self.generated = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.workers = app.config.get('DERIVATIVE_WORKERS', self.workers)
+        self.max_pending = app.config.get('DERIVATIVE_MAX_PENDING', self.max_pending)
+        if self._executor is None and self.enabled:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='derivatives')
+        app.extensions['derivatives'] = self
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def submit(self, source_path, prefix=None):
+        # queue resizing of source_path into <prefix>.<variant>.jpg (prefix defaults to the
+        # source path); returns the future, or None if it was not queued
+        prefix = prefix or source_path
+        if not self.enabled or self._executor is None:
+            return None
+        with self._lock:
+            if source_path in self._broken:
+                return None
+            if source_path in self._pending:
+                return self._pending[source_path]
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1  # picked up again the next time someone asks for a variant
+                return None
+            future = self._executor.submit(self._run, source_path, prefix)
+            self._pending[source_path] = future
+            return future
+
+    def _run(self, source_path, prefix):
+        try:
+            render_variants(source_path, prefix)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+                self._broken.add(source_path)
+            raise
+        else:
+            with self._lock:
+                self.generated += 1
+        finally:
+            with self._lock:
+                self._pending.pop(source_path, None)
+
+    def resolve(self, source_path, variant, prefix=None):
+        # path to serve for a requested variant: the resized file if it's ready, else the original
+        if variant not in VARIANTS:
+            return source_path
+        path = variant_path(prefix or source_path, variant)
+        if os.path.exists(path):
+            return path
+        self.submit(source_path, prefix)
+        return source_path
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'pending': pending,
+            'generated': self.generated,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
+
+
+derivatives = DerivativePipeline()
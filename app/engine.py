@@ -0,0 +1,72 @@
+# SQLite connection setup and lock handling.
+# init_engines() hooks every engine Flask-SQLAlchemy creates so each new
+# connection gets the busy timeout and the SQLITE_PRAGMAS from the config
+# before it is used. journal_mode=wal is stored in the database file, the
+# rest only last for the connection, hence doing it on every connect.
+#
+# retry_on_locked wraps write routes: if the request still hits
+# "database is locked" after the busy timeout, the session is rolled back and
+# the whole view runs again after a short backoff, up to WRITE_RETRIES times,
+# then the client gets a 503 with Retry-After instead of a 500.
+
+import functools
+import sqlite3
+import time
+
+from flask import current_app, jsonify
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from .models import user_db
+
+
+def pragma_listener(busy_timeout, pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout * 1000)}')
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def init_engines(app):
+    busy_timeout = app.config.get('SQLITE_BUSY_TIMEOUT', 5)
+    pragmas = app.config.get('SQLITE_PRAGMAS', {})
+    with app.app_context():
+        engines = list(user_db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', pragma_listener(busy_timeout, pragmas))
+
+
+def is_locked(error):
+    # true for sqlite's "database is locked" / "database table is locked"
+    orig = getattr(error, 'orig', error)
+    return isinstance(orig, sqlite3.OperationalError) and 'locked' in str(orig)
+
+
+def retry_on_locked(view):
+    # only for views that can safely run twice: request bodies must be JSON or
+    # form data (cached by Flask), not streams read straight off the socket
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        retries = current_app.config.get('WRITE_RETRIES', 0)
+        delay = current_app.config.get('WRITE_RETRY_BACKOFF', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                user_db.session.rollback()
+                if not is_locked(e):
+                    raise
+                if attempt < retries:
+                    time.sleep(delay * 2 ** attempt)
+
+        response = jsonify({'error': 'Database is busy, please try again'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return wrapper
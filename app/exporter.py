@@ -0,0 +1,171 @@
+# Per-user data export for GET /api/export.
+# Every section is read with yield_per, so rows come off a database cursor a
+# few hundred at a time and are written out as they arrive. The response is a
+# generator, so memory use stays flat however large the account is. Formats:
+#   ndjson  one {"section": ..., "data": {...}} object per line, any sections
+#   csv     a single section as a spreadsheet-friendly table
+#   zip     one CSV per section plus the original photo files, built as a
+#           streaming zip (entries use data descriptors, nothing is seeked)
+
+import csv
+import io
+import json
+import mimetypes
+import zipfile
+from datetime import date, datetime
+from urllib.parse import quote
+
+from werkzeug.utils import secure_filename
+
+from .models import (
+    user_db,
+    Plants,
+    PlantGrowthEntry,
+    PlantWaterEntry,
+    uploadedPics,
+    FriendsList,
+    Notification,
+)
+from .snapshot import (serialize_plant, serialize_growth, serialize_watering, serialize_photo,
+                       serialize_friend, serialize_notification, friends_query, notifications_query)
+from .blobstore import blob_store, CHUNK_SIZE
+
+YIELD_PER = 500  # rows per database fetch
+FLUSH_BYTES = 64 * 1024  # text is handed to the server in chunks about this big
+
+SECTIONS = ('plants', 'growth_entries', 'watering_entries', 'photos', 'friends', 'notifications')
+FORMATS = ('ndjson', 'csv', 'zip')
+
+
+def content_disposition(filename, fallback):
+    # headers have to be latin-1, so usernames like 植物 or a"b can't go in as they are:
+    # an ASCII filename= for old clients, and the real name in filename*= (RFC 5987, as send_file does)
+    simple = filename if secure_filename(filename) == filename else fallback
+    return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _queries(user_id):
+    # section -> (query in a stable order, row serializer)
+    return {
+        'plants': (Plants.query.filter_by(user_id=user_id).order_by(Plants.id), serialize_plant),
+        'growth_entries': (PlantGrowthEntry.query.filter_by(user_id=user_id).order_by(PlantGrowthEntry.id),
+                           serialize_growth),
+        'watering_entries': (PlantWaterEntry.query.filter_by(user_id=user_id).order_by(PlantWaterEntry.id),
+                             lambda w: {**serialize_watering(w), 'ml_watered': w.ml_watered}),
+        'photos': (uploadedPics.query.filter_by(user_id=user_id).order_by(uploadedPics.photo_id),
+                   lambda pic: {**serialize_photo(pic), 'blob_key': pic.blob_key}),
+        'friends': (friends_query(user_id).order_by(FriendsList.friend_id),
+                    lambda row: serialize_friend(*row)),
+        'notifications': (notifications_query(user_id).order_by(Notification.id),
+                          lambda row: serialize_notification(*row)),
+    }
+
+
+def export_rows(user_id, section):
+    query, serialize = _queries(user_id)[section]
+    for row in query.yield_per(YIELD_PER):
+        yield serialize(row)
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _chunked(pieces):
+    # join small strings into roughly FLUSH_BYTES sized chunks
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(user_id, sections=SECTIONS):
+    for section in sections:
+        for row in export_rows(user_id, section):
+            yield json.dumps({'section': section, 'data': row}, default=_plain) + '\n'
+
+
+def csv_lines(user_id, section):
+    # header comes from the first row, so an empty section is an empty file
+    out = io.StringIO()
+    writer = None
+    for row in export_rows(user_id, section):
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow({key: _plain(value) if isinstance(value, (date, datetime)) else value
+                         for key, value in row.items()})
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+def export_ndjson(user_id, sections=SECTIONS):
+    for chunk in _chunked(ndjson_lines(user_id, sections)):
+        yield chunk.encode()
+
+
+def export_csv(user_id, section):
+    for chunk in _chunked(csv_lines(user_id, section)):
+        yield chunk.encode()
+
+
+class _Pipe(io.RawIOBase):
+    # write-only, unseekable sink: zipfile writes into it and we hand the bytes on
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_zip(user_id):
+    # an empty chunk would end a chunked HTTP response early, so skip those
+    return (chunk for chunk in _zip_chunks(user_id) if chunk)
+
+
+def _zip_chunks(user_id):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for section in SECTIONS:
+            with archive.open(f'{section}.csv', 'w', force_zip64=True) as entry:
+                for chunk in _chunked(csv_lines(user_id, section)):
+                    entry.write(chunk.encode())
+                    yield pipe.drain()
+
+        # original photo files; older inline photos are only in photos.csv as data URLs
+        photos = (user_db.session.query(uploadedPics.photo_id, uploadedPics.blob_key)
+                  .filter(uploadedPics.user_id == user_id, uploadedPics.blob_key.isnot(None))
+                  .order_by(uploadedPics.photo_id).yield_per(YIELD_PER))
+        for photo_id, key in photos:
+            if not blob_store.exists(key):
+                continue
+            extension = mimetypes.guess_extension(blob_store.mimetype(key)) or ''
+            info = zipfile.ZipInfo(f'photos/{photo_id}{extension}',
+                                   date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED  # already compressed images
+            with archive.open(info, 'w', force_zip64=True) as entry, open(blob_store.path(key), 'rb') as f:
+                while True:
+                    block = f.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    entry.write(block)
+                    yield pipe.drain()
+    yield pipe.drain()  # central directory, written on close
@@ -0,0 +1,60 @@
+# Social feed for /api/update-social.
+# The friends feed is materialized: when a photo is saved, one feed_entries row
+# is written for each follower of the uploader in the same transaction
+# (fan-out on write). Following someone backfills their recent photos and
+# unfollowing removes them, so reading a feed is a single range scan over
+# (owner_id, datetime_uploaded) instead of a join across every upload.
+
+from sqlalchemy import delete, insert, literal, select, true, func
+
+from .models import user_db, FeedEntry, FriendsList, uploadedPics, User, UserSettings
+
+BACKFILL_LIMIT = 50  # photos copied into a feed when you follow someone
+
+
+def fan_out_photo(photo_id):
+    # every follower of the uploader gets the photo; call before committing the photo
+    followers = (select(FriendsList.user_id, uploadedPics.user_id, uploadedPics.photo_id,
+                        uploadedPics.datetime_uploaded)
+                 .join(FriendsList, FriendsList.friend_id == uploadedPics.user_id)
+                 .where(uploadedPics.photo_id == photo_id))
+    user_db.session.execute(
+        insert(FeedEntry).from_select(['owner_id', 'author_id', 'photo_id', 'datetime_uploaded'], followers))
+
+
+def backfill_follow(owner_id, author_id, limit=BACKFILL_LIMIT):
+    recent = (select(literal(owner_id), uploadedPics.user_id, uploadedPics.photo_id,
+                     uploadedPics.datetime_uploaded)
+              .where(uploadedPics.user_id == author_id)
+              .order_by(uploadedPics.datetime_uploaded.desc())
+              .limit(limit))
+    user_db.session.execute(
+        insert(FeedEntry).prefix_with('OR IGNORE')
+        .from_select(['owner_id', 'author_id', 'photo_id', 'datetime_uploaded'], recent))
+
+
+def prune_follow(owner_id, author_id):
+    user_db.session.execute(
+        delete(FeedEntry).where(FeedEntry.owner_id == owner_id, FeedEntry.author_id == author_id))
+
+
+def remove_photos(photo_ids):
+    # deleted photos leave every follower's feed; call before deleting the photos
+    user_db.session.execute(delete(FeedEntry).where(FeedEntry.photo_id.in_(photo_ids)))
+
+
+def friends_feed_query(owner_id):
+    # (photo, author username) rows, page with keyset_page on FeedEntry.datetime_uploaded / photo_id
+    return (user_db.session.query(uploadedPics, User.username)
+            .select_from(FeedEntry)
+            .join(uploadedPics, uploadedPics.photo_id == FeedEntry.photo_id)
+            .join(User, User.id == FeedEntry.author_id)
+            .filter(FeedEntry.owner_id == owner_id))
+
+
+def public_feed_query():
+    # newest photos from users whose profile is public (no settings row means public)
+    return (user_db.session.query(uploadedPics, User.username)
+            .join(User, User.id == uploadedPics.user_id)
+            .outerjoin(UserSettings, UserSettings.user_id == uploadedPics.user_id)
+            .filter(func.coalesce(UserSettings.is_profile_public, true()) == true()))
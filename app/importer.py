@@ -0,0 +1,264 @@
+# Bulk import of growth and watering history from CSV or NDJSON.
+# The upload is parsed as a stream, a batch of rows at a time: every row in a
+# batch is validated, rows already in the database (same plant and date) or
+# repeated earlier in the file are skipped, and the rest go in with a single
+# executemany INSERT per batch, committed batch by batch. A bad row (or a line
+# the CSV parser can't read) only adds an entry to the error report; it never
+# aborts the rest of the file. Rows name their plant by plant_id or, as exported
+# from a spreadsheet, plant_name.
+#
+# Two things do stop an import early, keeping the batches already committed:
+# bytes that aren't UTF-8, and a batch the database won't take even after
+# WRITE_RETRIES (report['stopped_at'] is then the first line not imported).
+# Sending the same file again is safe, rows already stored count as duplicates.
+#
+# Used by POST /api/import/<kind> and the import_history.py script.
+
+import csv
+import io
+import json
+import math
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from .models import user_db, Plants, PlantGrowthEntry, PlantWaterEntry
+from .changes import change_row, log_changes
+from .cache import snapshot_cache, watering_cache
+from .engine import is_locked
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# kind -> (model, date column, value column, snapshot section, accepted names for date / value)
+KINDS = {
+    'growth': (PlantGrowthEntry, 'date_recorded', 'cm_grown', 'growth_entries',
+               ('date_recorded', 'date'), ('cm_grown', 'height', 'cm')),
+    'watering': (PlantWaterEntry, 'date_watered', 'ml_watered', 'watering_entries',
+                 ('date_watered', 'date'), ('ml_watered', 'ml')),
+}
+FORMATS = ('csv', 'ndjson')
+
+
+def read_csv(stream):
+    # (line number, row dict or error message); first line is the header
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # the reader has dropped the bad line (not counted in line_num yet) and carries on after it
+            yield reader.line_num + 1, f'Malformed CSV: {e}'
+            continue
+        yield reader.line_num, row
+
+
+def read_ndjson(stream):
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, f'Invalid JSON: {e}'
+            continue
+        yield line_num, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+def guess_format(filename=None, mimetype=None):
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    if mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json'):
+        return 'ndjson'
+    if mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    return None
+
+
+def read_rows(binary_stream, fmt):
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    return read_csv(text) if fmt == 'csv' else read_ndjson(text)
+
+
+def _field(row, names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _plant(row, plants, plant_ids):
+    # the user's plant id for a row that names its plant by plant_id or plant_name
+    plant_id = _field(row, ('plant_id',))
+    if plant_id is not None:
+        # a whole number, or its digits from a CSV cell; int() would also take true or 1.5
+        if isinstance(plant_id, str) and plant_id.strip().isdecimal():
+            plant_id = int(plant_id)
+        elif not isinstance(plant_id, int) or isinstance(plant_id, bool):
+            raise ValueError(f'Invalid plant_id: {plant_id}')
+        if plant_id not in plants:
+            raise ValueError(f'Unknown plant_id: {plant_id}')
+        return plant_id
+
+    plant_name = _field(row, ('plant_name', 'plant'))
+    if not plant_name:
+        raise ValueError('Missing plant_name')
+    plant_name = str(plant_name).strip()
+    if plant_name not in plant_ids:
+        raise ValueError(f'Unknown plant: {plant_name}')
+    return plant_ids[plant_name]
+
+
+def _validate(row, kind, plants, plant_ids):
+    # the row's (plant_id, date, value), or raises ValueError with a message for the report
+    _, _, _, _, date_names, value_names = KINDS[kind]
+    if isinstance(row, str):
+        raise ValueError(row)
+
+    plant_id = _plant(row, plants, plant_ids)
+
+    date_str = _field(row, date_names)
+    if not date_str:
+        raise ValueError('Missing date')
+    try:
+        day = datetime.strptime(str(date_str).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'Invalid date: {date_str}. Use YYYY-MM-DD')
+
+    value = _field(row, value_names)
+    if value is None:
+        if kind == 'growth':
+            raise ValueError('Missing height')
+        value = 0.0  # watering amount is optional, same as add-watering
+    if isinstance(value, bool):
+        raise ValueError(f'Invalid number: {value}')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid number: {value}')
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f'Invalid number: {value}')
+
+    return plant_id, day, value
+
+
+def _existing_keys(user_id, kind, keys):
+    # (plant_id, date) pairs among keys that are already stored, one range scan per batch
+    model, date_col, _, _, _, _ = KINDS[kind]
+    date_column = getattr(model, date_col)
+    plants = {plant for plant, _ in keys}
+    days = [day for _, day in keys]
+    rows = (user_db.session.query(model.plant_id, date_column)
+            .filter(model.user_id == user_id, model.plant_id.in_(plants),
+                    date_column.between(min(days), max(days)))
+            .distinct().all())
+    return {(plant, day) for plant, day in rows}
+
+
+def _insert_batch(user_id, kind, batch, plants):
+    model, date_col, value_col, section, _, _ = KINDS[kind]
+    params = [{'user_id': user_id, 'plant_id': plant, 'plant_name': plants[plant], date_col: day, value_col: value}
+              for plant, day, value in batch]
+    ids = user_db.session.scalars(insert(model).returning(model.id), params).all()
+    # bulk INSERT skips the flush hook, so log the new rows for delta sync ourselves
+    log_changes(user_db.session.connection(), [change_row(user_id, section, row_id) for row_id in ids])
+    user_db.session.commit()
+
+
+def _insert_batch_retrying(user_id, kind, batch, plants):
+    # same backoff as @retry_on_locked, but for one batch instead of the whole request
+    retries = current_app.config.get('WRITE_RETRIES', 0)
+    delay = current_app.config.get('WRITE_RETRY_BACKOFF', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            return _insert_batch(user_id, kind, batch, plants)
+        except OperationalError as e:
+            user_db.session.rollback()
+            if not is_locked(e) or attempt == retries:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def import_rows(user_id, kind, rows, batch_size=BATCH_SIZE):
+    # rows: iterable of (line number, dict or error message); returns the report
+    if kind not in KINDS:
+        raise ValueError(f'Unknown import kind: {kind}')
+
+    plants = dict(user_db.session.query(Plants.id, Plants.plant_name)
+                  .filter(Plants.user_id == user_id).order_by(Plants.id))  # id -> name
+    plant_ids = {}  # name -> id, the oldest plant if a name is used twice
+    for plant_id, name in plants.items():
+        plant_ids.setdefault(name, plant_id)
+    seen = set()  # (plant id, date) already taken in this file
+    touched = set()
+    report = {'inserted': 0, 'duplicates': 0, 'error_count': 0, 'errors': []}
+
+    def error(line_num, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_num, 'error': message})
+
+    def flush(pending):
+        # False if the batch couldn't be written and the import has to stop
+        if not pending:
+            return True
+        try:
+            existing = _existing_keys(user_id, kind, [(plant, day) for _, plant, day, _ in pending])
+            batch, keys, duplicates = [], set(), 0
+            for line_num, plant, day, value in pending:
+                key = (plant, day)
+                if key in existing or key in seen or key in keys:
+                    duplicates += 1
+                    continue
+                keys.add(key)
+                batch.append((plant, day, value))
+            if batch:
+                _insert_batch_retrying(user_id, kind, batch, plants)
+        except OperationalError as e:
+            user_db.session.rollback()
+            report['stopped_at'] = pending[0][0]
+            error(pending[0][0], f'Database error, nothing from this line on was imported: {e.orig}')
+            return False
+        seen.update(keys)
+        report['duplicates'] += duplicates
+        report['inserted'] += len(batch)
+        touched.update(plant for plant, _, _ in batch)
+        return True
+
+    pending = []
+    line_num = 0
+    try:
+        for line_num, row in rows:
+            try:
+                plant, day, value = _validate(row, kind, plants, plant_ids)
+            except ValueError as e:
+                error(line_num, str(e))
+                continue
+            pending.append((line_num, plant, day, value))
+            if len(pending) >= batch_size:
+                if not flush(pending):
+                    break
+                pending = []
+        else:
+            flush(pending)
+    except UnicodeDecodeError:
+        # the lines read before it still go in
+        error(line_num + 1, 'File is not valid UTF-8, stopped reading before this line')
+        if flush(pending):
+            report['stopped_at'] = line_num + 1
+    finally:
+        user_db.session.rollback()  # anything left over from a failed batch
+        if touched:
+            snapshot_cache.invalidate(user_id)
+            if kind == 'watering':
+                watering_cache.invalidate(user_id, *touched)
+
+    return report
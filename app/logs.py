@@ -0,0 +1,84 @@
+# Structured logging.
+#   log.info('photo_uploaded', user_id=1, plant_id=7)
+# writes one line per event to stderr, JSON by default:
+#   {"ts": "...", "level": "info", "event": "photo_uploaded", "method": "POST",
+#    "path": "/api/upload-photo", "user_id": 1, "plant_id": 7}
+# or with LOG_FORMAT = 'text':
+#   2025-01-01T10:00:00.000+00:00 INFO photo_uploaded user_id=1 plant_id=7
+#
+# LOG_LEVEL gates everything. A call below the level returns after one cached
+# level check, before any formatting, so debug lines can stay in hot paths.
+# Arguments are still evaluated by the caller: pass ids and short strings,
+# not whole sessions or payloads.
+
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+
+
+def _timestamp(record):
+    return datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'ts': _timestamp(record), 'level': record.levelname.lower(), 'event': record.getMessage()}
+        if has_request_context():
+            entry['method'] = request.method
+            entry['path'] = request.path
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = ' '.join(f'{key}={value}' for key, value in getattr(record, 'fields', {}).items())
+        line = f'{_timestamp(record)} {record.levelname} {record.getMessage()} {fields}'.rstrip()
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class StructuredLogger:
+    def __init__(self, name='plantly'):
+        self._logger = logging.getLogger(name)
+        self._logger.addHandler(logging.NullHandler())  # quiet until init_app
+
+    def init_app(self, app):
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(TextFormatter() if app.config.get('LOG_FORMAT') == 'text' else JSONFormatter())
+        self._logger.handlers[:] = [handler]
+        self._logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+        self._logger.propagate = False
+        app.extensions['log'] = self
+
+    def enabled(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        # error level plus the traceback of the exception being handled
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+log = StructuredLogger()
@@ -0,0 +1,198 @@
+# Request and SQL instrumentation, exposed at /metrics in Prometheus text format.
+# For every request except static files we record, per endpoint:
+#   plantly_request_seconds          latency histogram (streamed responses: until the stream ends)
+#   plantly_requests_total           count by method and status
+#   plantly_response_bytes           size histogram (streamed responses have no size, so are left out)
+#   plantly_sql_statements           statements per request histogram
+#   plantly_sql_seconds_total        time spent in the database
+#   plantly_n_plus_one_total         requests that ran one statement METRICS_N_PLUS_ONE_THRESHOLD+ times
+# SQL is counted with before/after_cursor_execute hooks on every engine,
+# including the read-only pool (and handle_error, so a failing statement counts
+# too). Statements are parameterized, so the same text repeated within one
+# request is a query in a loop; those requests are counted and logged with the
+# statement so they can be fixed.
+#
+# The /metrics route also folds in the stats() of the caches, photo
+# derivatives, notification broker, password hasher and read replicas. It is
+# only served to this host unless METRICS_PUBLIC is set (see visible()).
+
+import time
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from .logs import log
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {round(self.sum, 6)}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    def __init__(self, n_plus_one_threshold=10):
+        self.enabled = True
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self._latency = {}      # endpoint -> Histogram
+        self._sizes = {}        # endpoint -> Histogram
+        self._statements = {}   # endpoint -> Histogram
+        self._sql_seconds = Counter()
+        self._requests = Counter()  # (endpoint, method, status) -> count
+        self._n_plus_one = Counter()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        app.extensions['metrics'] = self
+        with self._lock:
+            self.clear()
+        if not self.enabled:
+            return
+        with app.app_context():
+            engines = list(app.extensions['sqlalchemy'].engines.values())
+        replicas = app.extensions.get('read_replicas')
+        if replicas is not None and replicas.engine is not None:
+            engines.append(replicas.engine)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_execute)
+            event.listen(engine, 'handle_error', self._failed_execute)
+        app.before_request(self._start)
+        app.after_request(self._response)
+        app.teardown_request(self._finish)
+
+    # SQL hooks, only counted inside a request. The start time lives on the
+    # statement's execution context, so a statement that fails (no
+    # after_cursor_execute) can't leave it behind for the next one to pick up.
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and 'metrics_started' in g:
+            context.metrics_query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record(context, statement)
+
+    def _failed_execute(self, exception_context):
+        self._record(exception_context.execution_context, exception_context.statement)
+
+    def _record(self, context, statement):
+        started = getattr(context, 'metrics_query_start', None)
+        if started is None or not has_request_context() or 'metrics_started' not in g:
+            return
+        del context.metrics_query_start
+        g.metrics_sql_seconds += time.perf_counter() - started
+        g.metrics_statements[statement] += 1
+
+    @staticmethod
+    def visible(app, request):
+        # only to this host (a local Prometheus or the benchmark), unless
+        # METRICS_PUBLIC; behind a proxy every request comes from loopback, so
+        # one carrying X-Forwarded-For counts as remote
+        if app.config.get('METRICS_PUBLIC', False):
+            return True
+        return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+    # request hooks
+    def _start(self):
+        if request.endpoint is None or request.endpoint == 'static':
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_seconds = 0.0
+        g.metrics_statements = Counter()
+
+    def _response(self, response):
+        if 'metrics_started' in g:
+            g.metrics_status = response.status_code
+            g.metrics_size = None if response.is_streamed else response.calculate_content_length()
+        return response
+
+    def _finish(self, error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint
+        statements = g.metrics_statements
+        status = g.get('metrics_status', 500)
+        size = g.get('metrics_size')
+        repeated = [(sql, count) for sql, count in statements.items() if count >= self.n_plus_one_threshold]
+
+        with self._lock:
+            self._latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self._statements.setdefault(endpoint, Histogram(STATEMENT_BUCKETS)).observe(sum(statements.values()))
+            if size is not None:
+                self._sizes.setdefault(endpoint, Histogram(SIZE_BUCKETS)).observe(size)
+            self._sql_seconds[endpoint] += g.metrics_sql_seconds
+            self._requests[(endpoint, request.method, status)] += 1
+            if repeated:
+                self._n_plus_one[endpoint] += 1
+
+        for sql, count in repeated:
+            log.warning('n_plus_one', endpoint=endpoint, count=count, statement=' '.join(sql.split())[:300])
+
+    def render(self, components=None):
+        # Prometheus text exposition; components: {name: stats dict} folded in as plain values
+        lines = []
+        with self._lock:
+            for name, help_text, histograms in (
+                    ('plantly_request_seconds', 'Request latency', self._latency),
+                    ('plantly_response_bytes', 'Response body size', self._sizes),
+                    ('plantly_sql_statements', 'SQL statements per request', self._statements)):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for endpoint, histogram in sorted(histograms.items()):
+                    lines += histogram.lines(name, f'endpoint="{_label(endpoint)}"')
+
+            lines += ['# HELP plantly_requests_total Requests by endpoint, method and status',
+                      '# TYPE plantly_requests_total counter']
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'plantly_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            for name, help_text, counter in (
+                    ('plantly_sql_seconds_total', 'Time spent running SQL', self._sql_seconds),
+                    ('plantly_n_plus_one_total', 'Requests that repeated one statement in a loop',
+                     self._n_plus_one)):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, value in sorted(counter.items()):
+                    lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {round(value, 6)}')
+
+        for component, stats in (components or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    name = f'plantly_{component}_{key}'
+                    lines += [f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,176 @@
+# Versioned schema migrations for existing user.db files.
+# The schema version lives in SQLite's PRAGMA user_version. Each migration is a
+# list of steps (SQL strings, or functions taking the connection for anything
+# that needs a check or a backfill) and runs in its own transaction, so a failed
+# migration leaves the database at the previous version.
+#
+# Fresh databases get the same indexes from create_all() via the models, which
+# is why every step has to be safe to run against an already up to date schema.
+
+from .search import SEARCH_DDL, REBUILD as REBUILD_SEARCH
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+
+
+def add_column(table, column, ddl):
+    def step(conn):
+        if column not in column_names(conn, table):
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {ddl}')
+    return step
+
+
+MIGRATIONS = [
+    (1, 'indexes on hot foreign key and sort columns', [
+        'CREATE INDEX IF NOT EXISTS ix_plants_user_id ON plants (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_growth_user_plant_date ON plant_growth_entry (user_id, plant_name, date_recorded)',
+        'CREATE INDEX IF NOT EXISTS ix_water_user_plant_date ON plant_water_entry (user_id, plant_name, date_watered)',
+        'CREATE INDEX IF NOT EXISTS ix_notifications_receiver_timestamp ON notifications (receiver_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_shared_plants_shared_with ON shared_plants (shared_with)',
+        'CREATE INDEX IF NOT EXISTS ix_uploaded_pics_user_uploaded ON uploaded_pics (user_id, datetime_uploaded)',
+        'CREATE INDEX IF NOT EXISTS ix_friends_list_friend_id ON friends_list (friend_id)',
+        'CREATE INDEX IF NOT EXISTS ix_change_log_user_id ON change_log (user_id, id)',
+    ]),
+    (2, 'uploaded_pics.blob_key for photos kept in the blob store', [
+        add_column('uploaded_pics', 'blob_key', 'blob_key VARCHAR(64)'),
+    ]),
+    # feed_entries itself comes from create_all(); fill it from the existing follows
+    (3, 'materialized friends feed', [
+        'CREATE INDEX IF NOT EXISTS ix_uploaded_pics_uploaded ON uploaded_pics (datetime_uploaded)',
+        'INSERT OR IGNORE INTO feed_entries (owner_id, author_id, photo_id, datetime_uploaded) '
+        'SELECT f.user_id, p.user_id, p.photo_id, p.datetime_uploaded '
+        'FROM friends_list f JOIN uploaded_pics p ON p.user_id = f.friend_id',
+    ]),
+    (4, 'user.unread_notifications counter', [
+        add_column('user', 'unread_notifications', "unread_notifications INTEGER NOT NULL DEFAULT '0'"),
+        'UPDATE "user" SET unread_notifications = (SELECT count(*) FROM notifications n '
+        'WHERE n.receiver_id = "user".id AND n.is_read IS NOT 1)',
+    ]),
+    (5, 'username search index', [
+        'CREATE INDEX IF NOT EXISTS ix_user_username_nocase ON "user" (username COLLATE NOCASE)',
+        *SEARCH_DDL,
+        REBUILD_SEARCH,
+    ]),
+    # plant_id gets filled in afterwards by backfill_plant_ids(), in batches
+    (6, 'growth/watering entries keyed by plant_id', [
+        add_column('plant_growth_entry', 'plant_id', 'plant_id INTEGER REFERENCES plants (id)'),
+        add_column('plant_water_entry', 'plant_id', 'plant_id INTEGER REFERENCES plants (id)'),
+        'CREATE INDEX IF NOT EXISTS ix_growth_user_plant_id_date ON plant_growth_entry (user_id, plant_id, date_recorded)',
+        'CREATE INDEX IF NOT EXISTS ix_water_user_plant_id_date ON plant_water_entry (user_id, plant_id, date_watered)',
+        'DROP INDEX IF EXISTS ix_growth_user_plant_date',
+        'DROP INDEX IF EXISTS ix_water_user_plant_date',
+    ]),
+    # how far change_log has been pruned; no row means nothing has been yet
+    (7, 'sync horizon for change_log retention', [
+        'CREATE TABLE IF NOT EXISTS sync_horizon (id INTEGER NOT NULL, pruned_through INTEGER NOT NULL, PRIMARY KEY (id))',
+    ]),
+    # every open notification stream looks for newer ids on each heartbeat
+    (8, 'notifications by receiver and id', [
+        'CREATE INDEX IF NOT EXISTS ix_notifications_receiver_id ON notifications (receiver_id, id)',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def upgrade(engine, target=LATEST_VERSION):
+    # returns the (version, description) pairs that were applied
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version > target:
+            break
+        with engine.begin() as conn:
+            if current_version(conn) >= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.exec_driver_sql(step)
+            conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+        applied.append((version, description))
+    return applied
+
+
+PLANT_ID_TABLES = ('plant_growth_entry', 'plant_water_entry')
+BACKFILL_BATCH = 5000
+
+
+def backfill_plant_ids(engine, batch_size=BACKFILL_BATCH):
+    # Point growth/watering rows from before migration 6 at their plant by
+    # (user_id, plant_name), batch_size ids per transaction so the app can keep
+    # writing in between. Safe to stop and run again. Rows whose plant no longer
+    # exists keep a NULL plant_id. Returns table -> (rows filled, rows without a plant).
+    results = {}
+    for table in PLANT_ID_TABLES:
+        with engine.connect() as conn:
+            todo = conn.exec_driver_sql(f'SELECT count(*) FROM {table} WHERE plant_id IS NULL').scalar()
+            last_id, max_id = conn.exec_driver_sql(
+                f'SELECT coalesce(min(id) - 1, 0), coalesce(max(id), 0) FROM {table} WHERE plant_id IS NULL').one()
+        while last_id < max_id:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f'UPDATE {table} SET plant_id = (SELECT min(p.id) FROM plants p '
+                    f'WHERE p.user_id = {table}.user_id AND p.plant_name = {table}.plant_name) '
+                    f'WHERE id > ? AND id <= ? AND plant_id IS NULL', (last_id, last_id + batch_size))
+            last_id += batch_size
+        with engine.connect() as conn:
+            missing = conn.exec_driver_sql(f'SELECT count(*) FROM {table} WHERE plant_id IS NULL').scalar()
+        results[table] = (todo - missing, missing)
+    return results
+
+
+# Hot queries and the index each one must use. Run through EXPLAIN QUERY PLAN
+# by check_query_plans() so a missing or unusable index shows up as a failure
+# instead of as a slow dashboard.
+HOT_QUERIES = [
+    ('plants by owner', 'ix_plants_user_id',
+     'SELECT id, plant_name FROM plants WHERE user_id = ?', (1,)),
+    ('growth chart for a plant', 'ix_growth_user_plant_id_date',
+     'SELECT date_recorded, cm_grown FROM plant_growth_entry WHERE user_id = ? AND plant_id = ? '
+     'ORDER BY date_recorded', (1, 1)),
+    ('watering history for a plant', 'ix_water_user_plant_id_date',
+     'SELECT date_watered FROM plant_water_entry WHERE user_id = ? AND plant_id = ? '
+     'ORDER BY date_watered', (1, 1)),
+    ('notifications page', 'ix_notifications_receiver_timestamp',
+     'SELECT id, message FROM notifications WHERE receiver_id = ? '
+     'ORDER BY timestamp DESC, id DESC LIMIT 50', (1,)),
+    ('notifications newer than a stream has seen', 'ix_notifications_receiver_id',
+     'SELECT id, message FROM notifications WHERE receiver_id = ? AND id > ? ORDER BY id LIMIT 50', (1, 0)),
+    ('plants shared with a user', 'ix_shared_plants_shared_with',
+     'SELECT plant_id FROM shared_plants WHERE shared_with = ?', (1,)),
+    ('photo timeline', 'ix_uploaded_pics_user_uploaded',
+     'SELECT photo_id, image_url FROM uploaded_pics WHERE user_id = ? '
+     'ORDER BY datetime_uploaded DESC, photo_id DESC LIMIT 50', (1,)),
+    ('friends feed page', 'ix_feed_entries_owner_uploaded',
+     'SELECT photo_id FROM feed_entries WHERE owner_id = ? '
+     'ORDER BY datetime_uploaded DESC, photo_id DESC LIMIT 9', (1,)),
+    ('followers of a user', 'ix_friends_list_friend_id',
+     'SELECT user_id FROM friends_list WHERE friend_id = ?', (1,)),
+    ('short username search', 'ix_user_username_nocase',
+     'SELECT id, username FROM "user" WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE '
+     'ORDER BY username COLLATE NOCASE LIMIT 20', ('ab', 'ab\U0010ffff')),
+    ('changes since a sync cursor', 'ix_change_log_user_id',
+     'SELECT id, section, row_id, op FROM change_log WHERE user_id = ? AND id > ? ORDER BY id', (1, 0)),
+]
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    # returns (name, plan) for every query that doesn't use its index or still sorts in a temp b-tree
+    failures = []
+    for name, index, sql, params in queries:
+        plan = explain(conn, sql, params)
+        uses_index = any(f'INDEX {index} ' in f'{detail} ' for detail in plan)
+        sorts = any('TEMP B-TREE' in detail for detail in plan)
+        if not uses_index or sorts:
+            failures.append((name, plan))
+    return failures
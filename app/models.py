@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from .replicas import RoutingSession
 
-user_db = SQLAlchemy()
+user_db = SQLAlchemy(session_options={'class_': RoutingSession}) # GET requests read from the read-only pool, see app/replicas.py
 
 from datetime import date
 
@@ -18,6 +19,10 @@ class User(user_db.Model):
   password = user_db.Column(user_db.String(120), nullable = False) # cant be left blank, also.
   last_login_date = user_db.Column(user_db.Date, nullable=True)
   login_streak = user_db.Column(user_db.Integer, default=0)
+  unread_notifications = user_db.Column(user_db.Integer, nullable=False, default=0, server_default='0') # kept in step by app/notifications.py
+
+# case-insensitive prefix search on usernames (short queries in app/search.py)
+user_db.Index('ix_user_username_nocase', user_db.collate(User.username, 'NOCASE'))
 
 #User Settings: table in user_db
 # user_id: foreign key to User table, links to the id of the user
@@ -41,7 +46,7 @@ class UserSettings(user_db.Model):
 class FriendsList(user_db.Model):
   __tablename__ = 'friends_list'
   user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), primary_key=True)
-  friend_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), primary_key=True)
+  friend_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), primary_key=True, index=True) # followers lookup
   status = user_db.Column(user_db.String(20), nullable=False, default='pending')
 
 # Plants: table in user_db
@@ -53,7 +58,7 @@ class FriendsList(user_db.Model):
 class Plants(user_db.Model):
   __tablename__ = 'plants'
   id = user_db.Column(user_db.Integer, primary_key=True)
-  user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
+  user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False, index=True)
   plant_name = user_db.Column(user_db.String(100), nullable=False) #100 characters max
   chosen_image_url = user_db.Column(user_db.String(255)) #255 characters max
   plant_type = user_db.Column(user_db.String(50)) #50 characters max
@@ -63,6 +68,8 @@ class Plants(user_db.Model):
 
 class Notification(user_db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (user_db.Index('ix_notifications_receiver_timestamp', 'receiver_id', 'timestamp'),
+                      user_db.Index('ix_notifications_receiver_id', 'receiver_id', 'id'))
     id = user_db.Column(user_db.Integer, primary_key=True)
     receiver_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
     sender_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
@@ -76,7 +83,7 @@ class SharedPlant(user_db.Model):
     id = user_db.Column(user_db.Integer, primary_key=True)
     plant_id = user_db.Column(user_db.Integer, user_db.ForeignKey('plants.id'), nullable=False)
     shared_by = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
-    shared_with = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
+    shared_with = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False, index=True)
     datetime_shared = user_db.Column(user_db.DateTime, default=user_db.func.now())
 
 # uploadedPics: table in user_db
@@ -84,33 +91,87 @@ class SharedPlant(user_db.Model):
 # user_id: foreign key to User table, links to the id of the user who uploaded the photo
 # (will also factor into the public/private setting of the user later on on shareboard page)
 # plant_id: foreign key to Plants table, links to the id of the plant, required
-# image_url: string, URL of the uploaded image, required
+# image_url: string, URL of the uploaded image, required (/api/blobs/<blob_key> for photos kept in the blob store)
+# blob_key: string, sha256 of the image bytes in the on-disk blob store, optional (older rows kept a data URL in image_url)
 # caption: string, optional caption for the image, optional
 # datetime_uploaded: date and time when the image was uploaded, default is the current date and time
 # (this will be used to sort the images in the shareboard page, so that the most recent ones are at the top)
 
 class uploadedPics(user_db.Model):
   __tablename__ = 'uploaded_pics'
+  __table_args__ = (
+    user_db.Index('ix_uploaded_pics_user_uploaded', 'user_id', 'datetime_uploaded'),
+    user_db.Index('ix_uploaded_pics_uploaded', 'datetime_uploaded'), # public feed, newest first
+  )
   photo_id = user_db.Column(user_db.Integer, primary_key=True)
   user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
   plant_id = user_db.Column(user_db.Integer, user_db.ForeignKey('plants.id'), nullable=False)
   image_url = user_db.Column(user_db.String(255), nullable=False)
+  blob_key = user_db.Column(user_db.String(64), nullable=True)
   caption = user_db.Column(user_db.String(255))
   datetime_uploaded = user_db.Column(user_db.DateTime, default=user_db.func.now())
 
+# FeedEntry: table in user_db, materialized friends feed written when a photo is uploaded (fan-out on write)
+# owner_id: the follower whose feed this row is in
+# author_id: the user who uploaded the photo
+# photo_id: foreign key to uploadedPics
+# datetime_uploaded: copied from the photo so a feed page is one range scan on (owner_id, datetime_uploaded)
+
+class FeedEntry(user_db.Model):
+  __tablename__ = 'feed_entries'
+  __table_args__ = (
+    user_db.UniqueConstraint('owner_id', 'photo_id', name='uq_feed_entries_owner_photo'),
+    user_db.Index('ix_feed_entries_owner_uploaded', 'owner_id', 'datetime_uploaded', 'photo_id'),
+    user_db.Index('ix_feed_entries_owner_author', 'owner_id', 'author_id'),
+  )
+  id = user_db.Column(user_db.Integer, primary_key=True)
+  owner_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
+  author_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
+  photo_id = user_db.Column(user_db.Integer, user_db.ForeignKey('uploaded_pics.photo_id'), nullable=False)
+  datetime_uploaded = user_db.Column(user_db.DateTime, nullable=False)
+
 class PlantGrowthEntry(user_db.Model):
   __tablename__ = 'plant_growth_entry'
+  __table_args__ = (user_db.Index('ix_growth_user_plant_id_date', 'user_id', 'plant_id', 'date_recorded'),)
   id = user_db.Column(user_db.Integer, primary_key=True)
   user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
-  plant_name = user_db.Column(user_db.String(100), nullable=False)  # same as JS `plantName`
+  plant_id = user_db.Column(user_db.Integer, user_db.ForeignKey('plants.id'), nullable=True) # NULL only for old rows whose plant was deleted before plant ids
+  plant_name = user_db.Column(user_db.String(100), nullable=False)  # same as JS `plantName`, copied from the plant for display
   date_recorded = user_db.Column(user_db.Date, nullable=False)      # same as JS `plantDate`
   cm_grown = user_db.Column(user_db.Float, nullable=False)          # same as JS `plantHeight`
 
 class PlantWaterEntry(user_db.Model):
   __tablename__ = 'plant_water_entry'
+  __table_args__ = (user_db.Index('ix_water_user_plant_id_date', 'user_id', 'plant_id', 'date_watered'),)
   
   id = user_db.Column(user_db.Integer, primary_key=True)
   user_id = user_db.Column(user_db.Integer, user_db.ForeignKey('user.id'), nullable=False)
-  plant_name = user_db.Column(user_db.String(100), nullable=False)  # same as JS `plantName`
+  plant_id = user_db.Column(user_db.Integer, user_db.ForeignKey('plants.id'), nullable=True) # NULL only for old rows whose plant was deleted before plant ids
+  plant_name = user_db.Column(user_db.String(100), nullable=False)  # same as JS `plantName`, copied from the plant for display
   date_watered = user_db.Column(user_db.Date, nullable=False)       # same as JS `plantDate`
-  ml_watered = user_db.Column(user_db.Float, nullable=False)        # same as JS `plantWater` or similar
\ No newline at end of file
+  ml_watered = user_db.Column(user_db.Float, nullable=False)        # same as JS `plantWater` or similar
+
+# ChangeLog: table in user_db, one row per insert/update/delete of a row that shows up in a user's snapshot
+# id: increasing change id, used as the sync cursor for /api/session?since=
+# user_id: the user whose snapshot the row belongs to (plant owner, notification receiver, ...)
+# section: snapshot key of the row, e.g. 'plants' or 'notifications'
+# row_id: primary key of the changed row (friend_id for friends_list)
+# op: 'upsert' or 'delete'
+
+class ChangeLog(user_db.Model):
+  __tablename__ = 'change_log'
+  __table_args__ = (user_db.Index('ix_change_log_user_id', 'user_id', 'id'),)
+  id = user_db.Column(user_db.Integer, primary_key=True)
+  user_id = user_db.Column(user_db.Integer, nullable=False)
+  section = user_db.Column(user_db.String(32), nullable=False)
+  row_id = user_db.Column(user_db.Integer, nullable=False)
+  op = user_db.Column(user_db.String(8), nullable=False)
+  changed_at = user_db.Column(user_db.DateTime, default=user_db.func.now())
+
+# SyncHorizon: table in user_db with a single row, how far change_log has been pruned
+# pruned_through: change ids up to here may be gone, so an older sync cursor gets a full snapshot instead
+
+class SyncHorizon(user_db.Model):
+  __tablename__ = 'sync_horizon'
+  id = user_db.Column(user_db.Integer, primary_key=True)
+  pruned_through = user_db.Column(user_db.Integer, nullable=False, default=0)
@@ -0,0 +1,62 @@
+# Notification writes and the per-user unread counter.
+# user.unread_notifications is kept in step with the notifications table by
+# every write in here, so the badge is a primary key lookup instead of a count
+# over the whole history. Bulk read/dismiss are one UPDATE/DELETE ... RETURNING
+# each; they bypass the ORM, so they log their own ChangeLog rows. Callers
+# commit and invalidate the snapshot cache.
+
+from sqlalchemy import delete, func, update
+
+from .models import user_db, Notification, User
+from .changes import change_row, log_changes, UPSERT, DELETE
+
+MAX_BULK_IDS = 500  # ids per dismiss request, keeps us under SQLite's bound parameter limit
+
+
+def adjust_unread(user_id, delta):
+    user_db.session.execute(
+        update(User).where(User.id == user_id)
+        .values(unread_notifications=func.max(User.unread_notifications + delta, 0))
+        .execution_options(synchronize_session=False))
+
+
+def notify(receiver_id, sender_id, message, plant_id=None):
+    notif = Notification(receiver_id=receiver_id, sender_id=sender_id, plant_id=plant_id, message=message)
+    user_db.session.add(notif)
+    adjust_unread(receiver_id, 1)
+    return notif
+
+
+def unread_count(user_id):
+    return user_db.session.query(User.unread_notifications).filter(User.id == user_id).scalar() or 0
+
+
+def mark_all_read(user_id):
+    # returns how many notifications changed
+    ids = user_db.session.execute(
+        update(Notification)
+        .where(Notification.receiver_id == user_id, Notification.is_read.isnot(True))
+        .values(is_read=True)
+        .returning(Notification.id)
+        .execution_options(synchronize_session=False)).scalars().all()
+    log_changes(user_db.session.connection(),
+                [change_row(user_id, 'notifications', notif_id, UPSERT) for notif_id in ids])
+    user_db.session.execute(
+        update(User).where(User.id == user_id).values(unread_notifications=0)
+        .execution_options(synchronize_session=False))
+    return len(ids)
+
+
+def dismiss(user_id, notification_ids):
+    # delete the user's own notifications among notification_ids, returns how many went
+    rows = user_db.session.execute(
+        delete(Notification)
+        .where(Notification.receiver_id == user_id, Notification.id.in_(notification_ids))
+        .returning(Notification.id, Notification.is_read)
+        .execution_options(synchronize_session=False)).all()
+    log_changes(user_db.session.connection(),
+                [change_row(user_id, 'notifications', notif_id, DELETE) for notif_id, _ in rows])
+    unread = sum(1 for _, is_read in rows if not is_read)
+    if unread:
+        adjust_unread(user_id, -unread)
+    return len(rows)
@@ -0,0 +1,74 @@
+# Keyset (seek) pagination for long per-user histories.
+# Pages are ordered newest first by (sort column, id) and the cursor holds the
+# last (sort value, id) the client saw, so page N is the same indexed range
+# scan as page 1 instead of an OFFSET that has to skip every earlier row.
+
+import base64
+import binascii
+import json
+
+from flask import request
+from sqlalchemy import String, tuple_, type_coerce
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def page_args(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE, cursor_arg='cursor'):
+    # (cursor values or None, page size) from ?cursor=&limit=
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    limit = max(1, min(limit, maximum))
+
+    cursor = request.args.get(cursor_arg)
+    return (decode_cursor(cursor) if cursor else None), limit
+
+
+def keyset_page(query, sort_col, id_col, cursor, limit):
+    # Compare on the column's stored text: SQLite keeps DATETIME values as
+    # strings, and rows written by func.now() have no microseconds, so binding
+    # a parsed datetime back would not compare equal to the row it came from.
+    sort_key = type_coerce(sort_col, String)
+    width = len(query.column_descriptions)
+
+    if cursor is not None:
+        # anything else would reach the driver as a bind parameter it can't handle (a 500)
+        if (len(cursor) != 2 or not isinstance(cursor[0], (str, int, float)) or isinstance(cursor[0], bool)
+                or not isinstance(cursor[1], int) or isinstance(cursor[1], bool)):
+            raise InvalidCursor(cursor)
+        query = query.filter(tuple_(sort_key, id_col) < tuple_(
+            type_coerce(cursor[0], String), type_coerce(cursor[1], id_col.type)))
+
+    rows = (query.add_columns(sort_key, id_col)
+            .order_by(sort_col.desc(), id_col.desc())
+            .limit(limit + 1).all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    return items, next_cursor
@@ -0,0 +1,131 @@
+# Admission control for password hashing.
+# generate_password_hash / check_password_hash are slow on purpose, so a burst
+# of logins used to run as many hashes at once as there were request threads.
+# Here they run on a small thread pool (hashlib's scrypt and pbkdf2 release the
+# GIL, so the workers hash in parallel): at most PASSWORD_HASH_WORKERS hashes
+# use the CPU at a time, and login/register are turned away with 503 and
+# Retry-After once more than PASSWORD_MAX_QUEUE hashes are already waiting,
+# instead of piling up behind each other.
+#
+# This is not offloading. The request thread still blocks on the result, so a
+# login holds its worker thread for the wait plus the hash; what the pool buys
+# is a bounded amount of hashing work and a fast 503 instead of a slow timeout.
+#
+# PASSWORD_HASH_METHOD is any werkzeug method string. Hashes stored with an
+# older method are upgraded the next time that user logs in.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'password hashing queue is full, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=2, max_queue=16, retry_after=2):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = Lock()
+        self._in_flight = 0
+        self._prefix = None  # what werkzeug writes in front of a hash made with method, e.g. 'scrypt:32768:8:1'
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_queue = app.config.get('PASSWORD_MAX_QUEUE', self.max_queue)
+        self.retry_after = app.config.get('PASSWORD_RETRY_AFTER', self.retry_after)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='passwords')
+        # werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'), so ask it now rather than on a login
+        self._prefix = self._method_prefix(self.method)
+        app.extensions['password_hasher'] = self
+
+    @staticmethod
+    def _method_prefix(method):
+        return generate_password_hash('', method).split('$', 1)[0]
+
+    def _run(self, fn, *args):
+        # admission control: count everything queued or running, refuse past the limit
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.retry_after)
+            self._in_flight += 1
+        queued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                    waited, took = started - queued, finished - started
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                    self.hash_seconds += took
+                    self.max_hash_seconds = max(self.max_hash_seconds, took)
+
+        if self._executor is None:  # not attached to an app (scripts), hash inline
+            return timed()
+        try:
+            return self._executor.submit(timed).result()
+        except RuntimeError:  # executor shut down at exit
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    def hash(self, password):
+        result = self._run(generate_password_hash, password, self.method)
+        with self._lock:
+            self.hashed += 1
+        return result
+
+    def verify(self, pwhash, password):
+        result = self._run(check_password_hash, pwhash, password)
+        with self._lock:
+            self.verified += 1
+        return result
+
+    def needs_rehash(self, pwhash):
+        # true if pwhash was made with different parameters than the configured method
+        if self._prefix is None:  # not attached to an app (scripts)
+            self._prefix = self._method_prefix(self.method)
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            jobs = self.hashed + self.verified
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'rejected': self.rejected,
+                'avg_hash_ms': round(self.hash_seconds / jobs * 1000, 2) if jobs else 0,
+                'max_hash_ms': round(self.max_hash_seconds * 1000, 2),
+                'avg_wait_ms': round(self.wait_seconds / jobs * 1000, 2) if jobs else 0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 2)
+            }
+
+
+password_hasher = PasswordHasher()
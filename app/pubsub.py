@@ -0,0 +1,74 @@
+# In-process publish/subscribe for waking open notification streams.
+# Each open /api/notifications/stream connection subscribes a small bounded
+# queue for its user; share_plant() publishes to every queue of the receiver.
+# A publish only reaches streams in the same process, so the stream treats it
+# as a wake-up and reads what to send from the database, which it also checks
+# on every heartbeat for notifications written by other worker processes.
+
+from collections import defaultdict
+from queue import Queue, Full, Empty
+from threading import Lock
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class NotificationBroker:
+    def __init__(self, max_queue=100, max_per_user=5):
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._subscribers = defaultdict(set)  # user_id -> {Queue}
+        self._lock = Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.max_queue = app.config.get('NOTIFICATION_STREAM_QUEUE', self.max_queue)
+        self.max_per_user = app.config.get('NOTIFICATION_STREAMS_PER_USER', self.max_per_user)
+        app.extensions['notification_broker'] = self
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if len(self._subscribers[user_id]) >= self.max_per_user:
+                raise TooManySubscribers(user_id)
+            queue = Queue(maxsize=self.max_queue)
+            self._subscribers[user_id].add(queue)
+            return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, message):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+            self.published += 1
+        for queue in queues:
+            while True:
+                try:
+                    queue.put_nowait(message)
+                    break
+                except Full:
+                    # slow client: drop its oldest message, it can re-sync from the database
+                    try:
+                        queue.get_nowait()
+                        self.dropped += 1
+                    except Empty:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'streams': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped
+            }
+
+
+notification_broker = NotificationBroker()
@@ -0,0 +1,99 @@
+# Read/write routing for user_db.session.
+# GET/HEAD/OPTIONS requests read through a separate pool of read-only
+# connections, so endpoints like /api/session, /api/notifications and
+# /api/search-users stop queuing for the same connections the writers use.
+# Everything else, and anything that flushes, stays on the primary.
+#
+# The read pool is SQLALCHEMY_READ_URI if set (a replica), otherwise the
+# primary SQLite file opened with mode=ro. With an in-memory database, or a
+# non-SQLite primary and no replica URL, all queries go to the primary.
+#
+# Read-your-writes: after a user's own successful POST the session cookie
+# carries the time of that write, and for READ_YOUR_WRITES_SECONDS their reads
+# stay on the primary, so a replica that lags behind can't hide what they just
+# saved. Other users may see it a moment later, including through the shared
+# caches if a lagging replica fills them.
+
+import time
+
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # bind/self.bind are set when the session joins an outside connection (tests)
+        if bind is None and self.bind is None and not self._flushing and has_request_context():
+            replicas = current_app.extensions.get('read_replicas')
+            if replicas is not None and replicas.engine is not None and replicas.use_replica():
+                replicas.routed += 1
+                return replicas.engine
+        # Flask-SQLAlchemy's get_bind only looks at its engines, so pass a joined connection through
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind if bind is not None else self.bind, **kwargs)
+
+
+class ReadReplicas:
+    def __init__(self, window=5):
+        self.window = window
+        self.engine = None
+        self.routed = 0  # statements sent to the read pool
+        self.sticky = 0  # statements from safe requests kept on the primary after the user's own write
+
+    def init_app(self, app):
+        self.window = app.config.get('READ_YOUR_WRITES_SECONDS', self.window)
+        self.engine = None
+        url = self._read_url(app)
+        if url is not None:
+            options = app.config.get('READ_ENGINE_OPTIONS', {})
+            self.engine = create_engine(url, **options)
+            if self.engine.dialect.name == 'sqlite':
+                from .engine import pragma_listener  # engine.py imports models, which imports this module
+                pragmas = {name: value for name, value in app.config.get('SQLITE_PRAGMAS', {}).items()
+                           if name != 'journal_mode'}  # a read-only connection can't change it
+                event.listen(self.engine, 'connect',
+                             pragma_listener(app.config.get('SQLITE_BUSY_TIMEOUT', 5), pragmas))
+            app.after_request(self._remember_write)
+        app.extensions['read_replicas'] = self
+
+    def _read_url(self, app):
+        if not app.config.get('READ_ROUTING', True):
+            return None
+        if app.config.get('SQLALCHEMY_READ_URI'):
+            return make_url(app.config['SQLALCHEMY_READ_URI'])
+        with app.app_context():
+            primary = app.extensions['sqlalchemy'].engine
+        path = primary.url.database
+        if primary.dialect.name != 'sqlite' or not path or path == ':memory:' or path.startswith('file:'):
+            return None
+        return URL.create('sqlite', database=f'file:{path}', query={'mode': 'ro', 'uri': 'true'})
+
+    def use_replica(self):
+        if request.method not in SAFE_METHODS:
+            return False
+        wrote_at = session.get('wrote_at')
+        if wrote_at is not None and time.time() - wrote_at < self.window:
+            self.sticky += 1
+            return False
+        return True
+
+    def _remember_write(self, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and session.get('user_id'):
+            session['wrote_at'] = time.time()
+        return response
+
+    def stats(self):
+        return {
+            'enabled': self.engine is not None,
+            'url': self.engine.url.render_as_string(hide_password=True) if self.engine is not None else None,
+            'window_seconds': self.window,
+            'pool': self.engine.pool.status() if self.engine is not None else None,
+            'routed_statements': self.routed,
+            'sticky_statements': self.sticky
+        }
+
+
+read_replicas = ReadReplicas()
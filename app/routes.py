@@ -1,21 +1,85 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_file, stream_with_context
 from .models import *
+from .snapshot import (build_snapshot, build_delta, friends_query, notifications_query,
+                       serialize_notification, serialize_photo, serialize_growth, serialize_watering,
+                       serialize_post)
+from .feed import fan_out_photo, backfill_follow, prune_follow, remove_photos, friends_feed_query, public_feed_query
+from .pagination import page_args, keyset_page, InvalidCursor
+from .blobstore import blob_store, blob_url, BlobError, BlobTooLarge
+from .derivatives import derivatives
+from .pubsub import notification_broker, TooManySubscribers
+from .notifications import notify, unread_count, mark_all_read, dismiss, MAX_BULK_IDS
+from .analytics import growth_analytics, watering_schedule, PERIODS, DEFAULT_POINTS, MAX_POINTS
+from .importer import import_rows, read_rows, guess_format, KINDS as IMPORT_KINDS, FORMATS as IMPORT_FORMATS
+from .exporter import (export_ndjson, export_csv, export_zip, content_disposition,
+                       SECTIONS as EXPORT_SECTIONS, FORMATS as EXPORT_FORMATS)
+from .search import (find_users, directory_page, DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT,
+                     MAX_LIMIT as MAX_SEARCH_LIMIT, DIRECTORY_PAGE, MAX_DIRECTORY_PAGE)
+from .changes import decode_cursor, change_row, log_changes, latest_change_id, DELETE
+from .cache import snapshot_cache, watering_cache, directory_cache
 from flask import session
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import password_hasher, Overloaded
+from .engine import retry_on_locked, is_locked
+from .replicas import read_replicas
+from .metrics import metrics
+from .logs import log
 from datetime import date, timedelta, datetime
+from sqlalchemy import delete, func, select, update
+import os
+import time
+from queue import Empty
+from werkzeug.utils import safe_join
 
 from flask_wtf.csrf import generate_csrf
 from flask_wtf.csrf import validate_csrf, CSRFError
 
 routes_bp = Blueprint('routes', __name__) # connect all related routes for later
 
+@routes_bp.route('/', methods = ['GET'])
+def index():
+    # same page as /static/index.html; its css/js paths are relative, so point them at /static/
+    with open(os.path.join(current_app.static_folder, 'index.html'), encoding='utf-8') as f:
+        page = f.read()
+    return page.replace('<head>', '<head>\n    <base href="/static/">', 1)
+
+
 @routes_bp.route('/api/csrf-token', methods = ['GET'])
 def get_csrf():
     token = generate_csrf()
     return jsonify({'csrf_token': token })
 
 
+def component_stats():
+    return {
+        'snapshot_cache': snapshot_cache.stats(),
+        'watering_cache': watering_cache.stats(),
+        'directory_cache': directory_cache.stats(),
+        'passwords': password_hasher.stats(),
+        'derivatives': derivatives.stats(),
+        'notification_streams': notification_broker.stats(),
+        'read_replicas': read_replicas.stats()
+    }
+
+
+# Both are for operators: anyone but this host gets a 404 unless METRICS_PUBLIC is set
+@routes_bp.route('/api/cache-stats', methods = ['GET'])
+def cache_stats():
+    if not metrics.visible(current_app, request):
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(component_stats()), 200
+
+
+# Prometheus scrape target: per-endpoint latency, SQL and size histograms plus the component stats above
+@routes_bp.route('/metrics', methods = ['GET'])
+def metrics_endpoint():
+    if not metrics.visible(current_app, request):
+        return jsonify({'error': 'Not found'}), 404
+    return current_app.response_class(metrics.render(component_stats()),
+                                      mimetype='text/plain; version=0.0.4')
+
+
 @routes_bp.route('/api/register', methods=['POST']) #post route to /api/register - user sending user and pass data
+@retry_on_locked
 def register(): # run once fetch request added, once POST to /api/register
     data = request.get_json()
     username = data.get('username')
@@ -31,12 +95,16 @@ def register(): # run once fetch request added, once POST to /api/register
     if User.query.filter_by(email = email).first():
         return jsonify({'error': 'Email already registered'})
 
-    hashed_pass = generate_password_hash(password)
+    try:
+        hashed_pass = password_hasher.hash(password)
+    except Overloaded as e:
+        return busy(e)
 
 
     new_user = User(username=username, email=email, password=hashed_pass) # user is added to our 'user.db' database
     user_db.session.add(new_user)
     user_db.session.commit()
+    directory_cache.invalidate() # new name in the shared directory pages
 
     return jsonify({'message': 'User created'}), 201 # 201 is code for created, use to send back to frontend that somethign was created.
 
@@ -48,7 +116,15 @@ def register(): # run once fetch request added, once POST to /api/register
   # 401: no authorisation 
   # 409: conflict
 
+def busy(overloaded):
+    # password hashing is at capacity, ask the client to come back shortly
+    response = jsonify({'error': 'Server is busy, please try again in a moment'})
+    response.headers['Retry-After'] = str(overloaded.retry_after)
+    return response, 503
+
+
 @routes_bp.route('/api/login', methods=['POST'])
+@retry_on_locked
 def login():
     data = request.get_json()
     username = data.get('username')
@@ -59,10 +135,22 @@ def login():
     
     user = User.query.filter_by(username=username).first()
 
-    if user and check_password_hash(user.password, password):
+    try:
+        valid = user is not None and password_hasher.verify(user.password, password)
+    except Overloaded as e:
+        return busy(e)
+
+    if valid:
         session['user_id'] = user.id
         session['username'] = user.username
 
+        # upgrade hashes made with older parameters while we have the plain password
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(password)
+            except Overloaded:
+                pass  # try again next login
+
         # Daily login streak logic
         today = date.today()
         if user.last_login_date == today:
@@ -75,82 +163,13 @@ def login():
             user.last_login_date = today
 
         user_db.session.commit()
+        snapshot_cache.invalidate(user.id)
 
-        # Fetch related data (as in the original route)
-        settings = UserSettings.query.filter_by(user_id=user.id).first()
-        friends = FriendsList.query.filter_by(user_id=user.id).all()
-        plants = Plants.query.filter_by(user_id=user.id).all()
-        growth_entries = PlantGrowthEntry.query.filter_by(user_id=user.id).all()
-        photos = uploadedPics.query.filter_by(user_id=user.id).all()
-        shared_entries = SharedPlant.query.filter_by(shared_with=user.id).all()
-        notifications = Notification.query.filter_by(receiver_id=user.id).order_by(Notification.timestamp.desc()).all()
-
-        plant_data = [{
-            'plant_name': plant.plant_name,
-            'plant_type': plant.plant_type,
-            'chosen_image_url': plant.chosen_image_url,
-            'plant_category': plant.plant_category,
-            'date_created': plant.date_created,
-            'id': plant.id
-        } for plant in plants]
-
-        growth_data = [{
-            'plant_name': entry.plant_name,
-            'date_recorded': entry.date_recorded,
-            'cm_grown': entry.cm_grown
-        } for entry in growth_entries]
-
-        friends_data = [{
-            'user_id': friend.user_id,
-            'friend_id': friend.friend_id,
-            'friend_username': User.query.get(friend.friend_id).username,
-            'status': friend.status
-        } for friend in friends]
-
-        photo_data = [{
-            'photo_id': pic.photo_id,
-            'plant_id': pic.plant_id,
-            'image_url': pic.image_url,
-            'caption': pic.caption,
-            'datetime_uploaded': pic.datetime_uploaded
-        } for pic in photos]
-
-        shared_plant_data = [{
-            'plant_id': shared.plant_id,
-            'plant_name': Plants.query.get(shared.plant_id).plant_name,
-            'shared_by': User.query.get(shared.shared_by).username,
-            'datetime_shared': shared.datetime_shared.strftime('%Y-%m-%d %H:%M')
-        } for shared in shared_entries]
-
-        notifications_data = [{
-            'id': notif.id,
-            'sender': User.query.get(notif.sender_id).username,
-            'message': notif.message,
-            'timestamp': notif.timestamp.strftime('%Y-%m-%d %H:%M'),
-            'plant_id': notif.plant_id,
-            'is_read': notif.is_read
-        } for notif in notifications]
-
-
-        settings_data = {
-            'is_profile_public': settings.is_profile_public if settings else True,
-            'allow_friend_requests': settings.allow_friend_requests if settings else True
-        }
+        snapshot = build_snapshot(user)
 
         return jsonify({
             'message': 'Login successful',
-            'username': user.username,
-            'email': user.email,
-            'user_id': user.id,
-            'plants': plant_data,
-            'growth_entries': growth_data,
-            'friends': friends_data,
-            'photos': photo_data,
-            'settings': settings_data,
-            'streak': user.login_streak,
-            'shared_plants': shared_plant_data,
-            'notifications': notifications_data,
-            'last_login_date': str(user.last_login_date)
+            **snapshot
         }), 200
     else:
         return jsonify({'error': 'Invalid credentials'}), 401
@@ -160,115 +179,60 @@ def login():
 
 @routes_bp.route('/api/session', methods = ['GET'])
 def session_data():
-    print("🔍 Session contents:", dict(session))
-    
+    log.debug('session_load', user_id=session.get('user_id'))
+
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'User not logged in'}), 401
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
+    # ?since=<cursor> returns only what changed after that cursor, plus tombstones,
+    # or {"resync": true} when the cursor is too old to answer that way
+    since = request.args.get('since')
+    if since:
+        change_id = decode_cursor(since)
+        if change_id is None:
+            return jsonify({'error': 'Invalid sync cursor'}), 400
 
-    # Query all needed related data
-    settings = UserSettings.query.filter_by(user_id=user.id).first()
-    friends = FriendsList.query.filter_by(user_id=user.id).all()
-    plants = Plants.query.filter_by(user_id=user.id).all()
-    growth_entries = PlantGrowthEntry.query.filter_by(user_id=user.id).all()
-    watering_entries = PlantWaterEntry.query.filter_by(user_id=user.id).all()
-    photos = uploadedPics.query.filter_by(user_id=user.id).all()
-    shared_entries = SharedPlant.query.filter_by(shared_with=user.id).all()
-    notifications = Notification.query.filter_by(receiver_id=user.id).order_by(Notification.timestamp.desc()).all()
-
-
-    # Prepare structured data
-    plant_data = [{
-        'plant_name': p.plant_name,
-        'plant_type': p.plant_type,
-        'chosen_image_url': p.chosen_image_url,
-        'plant_category': p.plant_category,
-        'id': p.id,
-        'date_created': p.date_created
-    } for p in plants]
-
-    growth_data = [{
-        'plant_name': g.plant_name,
-        'date_recorded': g.date_recorded,
-        'cm_grown': g.cm_grown
-    } for g in growth_entries]
-
-    watering_data = [{
-        'plant_name': w.plant_name,
-        'date_watered': w.date_watered.isoformat()
-    } for w in watering_entries]
-
-    photo_data = [{
-        'photo_id': pic.photo_id,
-        'plant_id': pic.plant_id,
-        'image_url': pic.image_url,
-        'caption': pic.caption,
-        'datetime_uploaded': pic.datetime_uploaded
-    } for pic in photos]
-
-    friends_data = [{
-        'user_id': f.user_id,
-        'friend_id': f.friend_id,
-        'friend_username': User.query.get(f.friend_id).username,
-        'status': f.status
-    } for f in friends]
-    shared_plant_data = [{
-        'plant_id': shared.plant_id,
-        'plant_name': Plants.query.get(shared.plant_id).plant_name,
-        'shared_by': User.query.get(shared.shared_by).username,
-        'datetime_shared': shared.datetime_shared.strftime('%Y-%m-%d %H:%M')
-    } for shared in shared_entries]
-
-    notifications_data = [{
-        'id': notif.id,
-        'sender': User.query.get(notif.sender_id).username,
-        'message': notif.message,
-        'timestamp': notif.timestamp.strftime('%Y-%m-%d %H:%M'),
-        'plant_id': notif.plant_id,
-        'is_read': notif.is_read
-    } for notif in notifications]
-
-    settings_data = {
-        'is_profile_public': settings.is_profile_public if settings else True,
-        'allow_friend_requests': settings.allow_friend_requests if settings else True
-    }
+        user = user_db.session.get(User, user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        return jsonify(build_delta(user, change_id, current_app.config.get('SYNC_MAX_CHANGES'))), 200
+
+    # repeat loads are served from the cache after one indexed lookup of the
+    # user's latest change, which also catches writes made by other processes
+    change_id = latest_change_id(user_id)
+    payload = snapshot_cache.get(user_id, change_id)
+    if payload is None:
+        user = user_db.session.get(User, user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
 
-    return jsonify({
-        'username': user.username,
-        'user_id': user.id,
-        'email': user.email,
-        'plants': plant_data,
-        'growth_entries': growth_data,
-        'watering_entries': watering_data,
-        'photos': photo_data,
-        'friends': friends_data,
-        'settings': settings_data,
-        'streak': user.login_streak,
-        'shared_plants': shared_plant_data,
-        'notifications': notifications_data,
-        'last_login_date': str(user.last_login_date)
-        
-    }), 200
+        version = snapshot_cache.version(user_id)
+        payload = current_app.json.dumps(build_snapshot(user, change_id)).encode('utf-8')
+        snapshot_cache.put(user_id, payload, version, change_id)
+
+    return current_app.response_class(payload, mimetype='application/json'), 200
     
     
+# User directory for the friends panel, one page at a time in username order
+# (?limit=&cursor=&prefix=). First pages come from a cache shared by everyone.
 @routes_bp.route('/api/users', methods=['GET'])
 def get_all_users():
     user_id = session.get('user_id')
     if not user_id:
-        print("❌ Not logged in")
         return jsonify({'error': 'Not logged in'}), 401
 
-    users = User.query.filter(User.id != user_id).all()
-
-    user_list = [{'user_id': u.id, 'username': u.username} for u in users]
-    print(f"👥 Found {len(user_list)} users (excluding current user_id {user_id})")
-
-    return jsonify({'users': user_list}), 200
+    prefix = request.args.get('prefix', '').strip()
+    try:
+        cursor, limit = page_args(default=DIRECTORY_PAGE, maximum=MAX_DIRECTORY_PAGE)
+        users, next_cursor = directory_page(user_id, prefix, cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
+    return jsonify({
+        'users': [{'user_id': uid, 'username': username} for uid, username in users],
+        'next_cursor': next_cursor
+    }), 200
 
 
 @routes_bp.route('/api/friends', methods=['GET'])
@@ -277,12 +241,12 @@ def get_friends():
     if not user_id:
         return jsonify({'error': 'Not logged in'}), 401
 
-    friends = FriendsList.query.filter_by(user_id=user_id).all()
+    friends = friends_query(user_id).all()
 
     friend_users = [{
         'friend_id': f.friend_id,
-        'friend_username': User.query.get(f.friend_id).username
-    } for f in friends]
+        'friend_username': friend_username
+    } for f, friend_username in friends]
 
     return jsonify({'friends': friend_users}), 200
     
@@ -291,7 +255,24 @@ def logout():
     session.clear()
     return jsonify({'message': 'Logged out successfully'}), 200
 
+# The plant a request is about: plant_id, or plant_name for clients that only
+# know names. None if neither is given or it isn't this user's plant.
+def find_plant(user_id, values):
+    query = Plants.query.filter_by(user_id=user_id)
+    plant_id = values.get('plant_id')
+    if plant_id not in (None, ''):
+        try:
+            return query.filter_by(id=int(plant_id)).first()
+        except (TypeError, ValueError):
+            return None
+    plant_name = values.get('plant_name')
+    if plant_name:
+        return query.filter_by(plant_name=plant_name).first()
+    return None
+
+
 @routes_bp.route('/api/add-plant', methods=['POST'])
+@retry_on_locked
 def add_plant():
     data = request.get_json()
     user_id = session.get('user_id')
@@ -315,34 +296,62 @@ def add_plant():
     )
     user_db.session.add(new_plant)
     user_db.session.commit()
+    snapshot_cache.invalidate(user_id)
     
 
-    return jsonify({'message': 'Plant added successfully'}), 201
+    return jsonify({'message': 'Plant added successfully', 'plant_id': new_plant.id}), 201
 
 @routes_bp.route('/api/delete-plant', methods = ['POST'])
+@retry_on_locked
 def delete_plant():
     data = request.get_json()
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Plantly doesn`t know you'}), 401
     
-    plant_name = data.get('plant_name')
-    
-    if not plant_name:
+    if not data.get('plant_id') and not data.get('plant_name'):
         return jsonify({'error': "Need plant name"}), 404
     
-    plant = Plants.query.filter_by(user_id = user_id, plant_name = plant_name).first()
+    plant = find_plant(user_id, data)
     if not plant:
         return jsonify({'error': "Plant not found"}), 404
     
+    # its history, photos and shares go with it, notifications about it stay without the link;
+    # bulk statements skip the flush hook, so log them for sync
+    plant_id = plant.id
+    changes = []
+    for model, section in ((PlantGrowthEntry, 'growth_entries'), (PlantWaterEntry, 'watering_entries')):
+        removed = user_db.session.scalars(delete(model).where(model.user_id == user_id, model.plant_id == plant_id)
+                                          .returning(model.id)).all()
+        changes += [change_row(user_id, section, row_id, DELETE) for row_id in removed]
+
+    photos = select(uploadedPics.photo_id).where(uploadedPics.plant_id == plant_id).scalar_subquery()
+    remove_photos(photos)
+    removed = user_db.session.scalars(delete(uploadedPics).where(uploadedPics.plant_id == plant_id)
+                                      .returning(uploadedPics.photo_id)).all()
+    changes += [change_row(user_id, 'photos', photo_id, DELETE) for photo_id in removed]
+
+    shares = user_db.session.execute(delete(SharedPlant).where(SharedPlant.plant_id == plant_id)
+                                     .returning(SharedPlant.id, SharedPlant.shared_with)).all()
+    changes += [change_row(shared_with, 'shared_plants', share_id, DELETE) for share_id, shared_with in shares]
+
+    unlinked = user_db.session.execute(update(Notification).where(Notification.plant_id == plant_id)
+                                       .values(plant_id=None)
+                                       .returning(Notification.id, Notification.receiver_id)).all()
+    changes += [change_row(receiver_id, 'notifications', notification_id) for notification_id, receiver_id in unlinked]
+
+    log_changes(user_db.session.connection(), changes)
     user_db.session.delete(plant)
     user_db.session.commit()
+    snapshot_cache.invalidate(user_id, *{row['user_id'] for row in changes} - {user_id})
+    watering_cache.invalidate(user_id, plant_id)
     
     return jsonify({'message': "Plant has been deleted successfully"}), 200
 
 
 
 @routes_bp.route('/api/add-friend', methods=['POST'])
+@retry_on_locked
 def add_friend():
     try:
         
@@ -358,7 +367,7 @@ def add_friend():
             data = request.get_json()
             
         except Exception as e:
-            print("❌ JSON parse error:", e)
+            log.info('bad_json', error=str(e))
             return jsonify({'error': 'Invalid JSON'}), 400
 
         username = data.get('username')
@@ -382,29 +391,32 @@ def add_friend():
         # Add new friend to DB
         new_friend = FriendsList(user_id=user_id, friend_id=friend.id, status='accepted')
         user_db.session.add(new_friend)
+        backfill_follow(user_id, friend.id) # their recent photos show up in our feed right away
         user_db.session.commit()
+        snapshot_cache.invalidate(user_id)
 
         
         return jsonify({'message': f'{username} added as friend'}), 201
 
     except Exception as e:
+        if is_locked(e):
+            raise  # let retry_on_locked have another go
         # 🛑 Catch and log unexpected errors
-        print("💥 Server error in /api/add-friend route:", e)
+        log.exception('add_friend_failed', user_id=user_id)
         return jsonify({'error': 'Server error. Please try again later.'}), 500
 
 @routes_bp.route('/api/remove-friend', methods=['POST'])
+@retry_on_locked
 def remove_friend():
     from flask import request, session, jsonify
 
     try:
         data = request.get_json(force=True)
-        print("🧪 Received JSON:", data)
     except Exception as e:
-        print("❌ JSON parse error:", e)
+        log.info('bad_json', error=str(e))
         return jsonify({'error': 'Invalid JSON format'}), 400
 
     user_id = session.get('user_id')
-    print("🧪 Session:", dict(session))
 
     if not user_id:
         return jsonify({'error': 'User not logged in'}), 401
@@ -420,16 +432,21 @@ def remove_friend():
             return jsonify({'error': 'Friend not found'}), 404
 
         user_db.session.delete(friend)
+        prune_follow(user_id, friend.friend_id)
         user_db.session.commit()
-        print(f"✅ Friend {friend_id} removed for user {user_id}")
+        snapshot_cache.invalidate(user_id)
+        log.info('friend_removed', user_id=user_id, friend_id=friend_id)
         return jsonify({'message': 'Friend removed successfully'}), 200
 
     except Exception as e:
-        print("❌ Unexpected DB error:", e)
+        if is_locked(e):
+            raise  # let retry_on_locked have another go
+        log.exception('remove_friend_failed', user_id=user_id, friend_id=friend_id)
         return jsonify({'error': 'Server error'}), 500
 
 
 @routes_bp.route('/api/settings', methods=['POST'])
+@retry_on_locked
 def update_settings():
     user_id = session.get('user_id')
     if not user_id:
@@ -454,6 +471,7 @@ def update_settings():
         settings.allow_friend_requests = allow_friend_requests
 
     user_db.session.commit()
+    snapshot_cache.invalidate(user_id)
 
     return jsonify({
         'settings': {
@@ -472,55 +490,151 @@ def search_users():
     if not query:
         return jsonify({'results': []})
 
-    users = User.query.filter(User.username.ilike(f'%{query}%'), User.id != user_id).all()
-
-    current_friends = FriendsList.query.filter_by(user_id=user_id).all()
-    friend_ids = {f.friend_id for f in current_friends}
+    limit = max(1, min(request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT))
 
-    results = []
-    for user in users:
-        results.append({
-            'user_id': user.id,
-            'username': user.username,
-            'is_friend': user.id in friend_ids
-        })
+    # one indexed query, friend flag included
+    results = [{'user_id': uid, 'username': username, 'is_friend': is_friend}
+               for uid, username, is_friend in find_users(user_id, query, limit)]
 
     return jsonify({'results': results})
     
+def save_photo(user_id, plant, image_url, caption, blob_key=None):
+    new_photo = uploadedPics(
+        user_id=user_id,
+        plant_id=plant.id,
+        image_url=image_url,
+        blob_key=blob_key,
+        caption=caption
+    )
+
+    user_db.session.add(new_photo)
+    user_db.session.flush()
+    fan_out_photo(new_photo.photo_id) # into every follower's feed, same transaction
+    user_db.session.commit()
+    snapshot_cache.invalidate(user_id)
+
+    log.info('photo_uploaded', user_id=user_id, plant_id=plant.id, photo_id=new_photo.photo_id)
+    return new_photo
+
+
 @routes_bp.route('/api/add-photo', methods=['POST'])
+@retry_on_locked
 def add_photo():
     user_id = session.get('user_id')
     data = request.get_json()
 
-    plant_name = data.get('plant_name')
     image_url = data.get('image_url')
     caption = data.get('caption', '')
 
-    if not plant_name or not image_url:
+    if not (data.get('plant_id') or data.get('plant_name')) or not image_url:
         return jsonify({'error': 'Missing plant_name or image_url'}), 400
 
-    # Look up the plant using user_id and plant_name
-    plant = user_db.session.query(Plants).filter_by(user_id=user_id, plant_name=plant_name).first()
+    plant = find_plant(user_id, data)
     if not plant:
         return jsonify({'error': 'Plant not found'}), 404
 
-    new_photo = uploadedPics(
-        user_id=user_id,
-        plant_id=plant.id,
-        image_url=image_url,
-        caption=caption
-    )
+    # inline data URLs go to the blob store, the row only keeps the key
+    blob_key = None
+    if image_url.startswith('data:'):
+        try:
+            blob_key, _ = blob_store.put_data_url(image_url)
+        except BlobTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except BlobError as e:
+            return jsonify({'error': str(e)}), 400
+        image_url = blob_url(blob_key)
+        derivatives.submit(blob_store.path(blob_key))
 
-    user_db.session.add(new_photo)
-    user_db.session.commit()
+    new_photo = save_photo(user_id, plant, image_url, caption, blob_key)
+
+    return jsonify({'message': 'Photo saved', 'photo_id': new_photo.photo_id, 'image_url': image_url}), 201
+
+
+# multipart/form-data upload: plant_id (or plant_name), caption and the image in 'photo'
+@routes_bp.route('/api/upload-photo', methods=['POST'])
+def upload_photo():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
 
-    print(f"📸 Uploaded new photo for plant '{plant_name}' (ID {plant.id}) by user {user_id}")
+    caption = request.form.get('caption', '')
+    upload = request.files.get('photo')
 
-    return jsonify({'message': 'Photo saved', 'photo_id': new_photo.photo_id}), 201
+    if not (request.form.get('plant_id') or request.form.get('plant_name')) or not upload:
+        return jsonify({'error': 'Missing plant_name or photo'}), 400
+
+    plant = find_plant(user_id, request.form)
+    if not plant:
+        return jsonify({'error': 'Plant not found'}), 404
+
+    try:
+        blob_key, _ = blob_store.put_stream(upload.stream)
+    except BlobTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except BlobError as e:
+        return jsonify({'error': str(e)}), 415
+
+    image_url = blob_url(blob_key)
+    new_photo = save_photo(user_id, plant, image_url, caption, blob_key)
+    derivatives.submit(blob_store.path(blob_key))
+
+    return jsonify({'message': 'Photo saved', 'photo_id': new_photo.photo_id, 'image_url': image_url}), 201
+
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+# Blob URLs are content addressed, so a response for a given URL never changes:
+# strong ETag from the hash, Cache-Control immutable, and a 304 answered before
+# touching the disk. send_file() handles Range requests (206) and hands the file
+# to the server's wsgi.file_wrapper / X-Sendfile (USE_X_SENDFILE) for zero-copy.
+# ?size=thumb|card|full picks a resized variant; the original is served until it's ready
+@routes_bp.route('/api/blobs/<key>', methods=['GET'])
+def get_blob(key):
+    size = request.args.get('size')
+    etag = f'{key}-{size}' if size else key
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = ONE_YEAR
+        response.cache_control.immutable = True
+        return response
+
+    if not blob_store.exists(key):
+        return jsonify({'error': 'Photo not found'}), 404
+
+    original = blob_store.path(key)
+    path = derivatives.resolve(original, size)
+    if path != original or not size:
+        response = send_file(path, mimetype='image/jpeg' if size else blob_store.mimetype(key),
+                             etag=etag, max_age=ONE_YEAR)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        # variant still being generated: send the original, but don't let it be cached under this URL
+        response = send_file(path, mimetype=blob_store.mimetype(key), etag=key)
+        response.cache_control.no_cache = True
+    return response
+
+
+@routes_bp.route('/api/avatars/<path:filename>', methods=['GET'])
+def get_avatar(filename):
+    avatars_dir = os.path.join(current_app.static_folder, 'assets', 'Flower_Avatars')
+    original = safe_join(avatars_dir, filename)
+    if original is None or not os.path.isfile(original):
+        return jsonify({'error': 'Avatar not found'}), 404
+
+    prefix = os.path.join(blob_store.root, 'avatars', filename)
+    path = derivatives.resolve(original, request.args.get('size'), prefix)
+    # not content addressed, so revalidate daily via the mtime/size ETag instead of immutable
+    return send_file(path, mimetype='image/jpeg', max_age=24 * 3600)
 
 
 
 @routes_bp.route('/api/share_plant', methods=['POST'])
+@retry_on_locked
 def share_plant():
     user_id = session.get('user_id')
     data = request.get_json()
@@ -531,26 +645,34 @@ def share_plant():
     if not user_id or not plant_id or not shared_with:
         return jsonify({'error': 'Missing required fields'}), 400
 
+    # the recipient by user id, or by username as the share dialog sends it;
+    # checked before anything is written
+    if isinstance(shared_with, int) and not isinstance(shared_with, bool):
+        recipient = user_db.session.get(User, shared_with)
+    elif isinstance(shared_with, str):
+        recipient = User.query.filter_by(username=shared_with.strip()).first()
+    else:
+        return jsonify({'error': 'shared_with must be a user id or username'}), 400
+    if not recipient:
+        return jsonify({'error': 'User not found'}), 404
+    shared_with = recipient.id
+
     # Ensure user owns the plant
-    plant = Plants.query.filter_by(id=plant_id, user_id=user_id).first()
+    plant = find_plant(user_id, {'plant_id': plant_id})
     if not plant:
         return jsonify({'error': 'You can only share your own plants'}), 403
 
     # Record the share
-    new_share = SharedPlant(plant_id=plant_id, shared_by=user_id, shared_with=shared_with)
+    new_share = SharedPlant(plant_id=plant.id, shared_by=user_id, shared_with=shared_with)
     user_db.session.add(new_share)
 
-    # Add a notification for the recipient
-    sender = User.query.get(user_id)
+    # Add a notification for the recipient (bumps their unread counter too)
+    sender = user_db.session.get(User, user_id)
     message = f"{sender.username} shared a plant with you!"
-    notif = Notification(
-        receiver_id=shared_with,
-        sender_id=user_id,
-        plant_id=plant_id,
-        message=message
-    )
-    user_db.session.add(notif)
+    notif = notify(shared_with, user_id, message, plant_id=plant.id)
     user_db.session.commit()
+    snapshot_cache.invalidate(shared_with) # recipient gets a new shared plant and notification
+    notification_broker.publish(shared_with, serialize_notification(notif, sender.username))
 
     return jsonify({'message': 'Plant shared and notification sent!'}), 200
 
@@ -560,49 +682,355 @@ def get_notifications():
     if not user_id:
         return jsonify({'error': 'Not logged in'}), 401
 
-    notifs = Notification.query.filter_by(receiver_id=user_id).order_by(Notification.timestamp.desc()).all()
-    notifications = []
+    # newest first, one page at a time (?limit=&cursor=)
+    try:
+        cursor, limit = page_args()
+        notifs, next_cursor = keyset_page(notifications_query(user_id), Notification.timestamp,
+                                          Notification.id, cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    notifications = [serialize_notification(n, sender) for n, sender in notifs]
 
-    for n in notifs:
-        notifications.append({
-            'id': n.id,
-            'sender': User.query.get(n.sender_id).username,
-            'message': n.message,
-            'timestamp': n.timestamp.strftime('%Y-%m-%d %H:%M'),
-            'plant_id': n.plant_id,
-            'is_read': n.is_read
-        })
+    return jsonify({
+        'notifications': notifications,
+        'next_cursor': next_cursor,
+        'unread': unread_count(user_id)
+    }), 200
+
+
+# Badge count, read from the counter on the user row
+@routes_bp.route('/api/notifications/unread-count', methods=['GET'])
+def get_unread_count():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
 
-    return jsonify({'notifications': notifications}), 200
+    return jsonify({'unread': unread_count(user_id)}), 200
 
 
-#FOR FLASK SHAREBOARD PAGE - HASNOT BEEN TESTED PROPERLY!!!!!!!!
- #NOTE: limit is hard coded for now, may be changed later (current only collects 9 posts)
+@routes_bp.route('/api/notifications/mark-all-read', methods=['POST'])
+@retry_on_locked
+def mark_notifications_read():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    updated = mark_all_read(user_id)
+    user_db.session.commit()
+    if updated:
+        snapshot_cache.invalidate(user_id)
+
+    return jsonify({'updated': updated, 'unread': 0}), 200
+
+
+# Dismiss one notification ({notification_id}) or several at once ({ids: [...]})
+@routes_bp.route('/api/dismiss-notification', methods=['POST'])
+@routes_bp.route('/api/notifications/dismiss', methods=['POST'])
+@retry_on_locked
+def dismiss_notifications():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is None and data.get('notification_id') is not None:
+        ids = [data['notification_id']]
+    # ints only: int() would also take true, 1.5 or "7"
+    if (not isinstance(ids, list) or not ids
+            or any(not isinstance(i, int) or isinstance(i, bool) for i in ids)):
+        return jsonify({'error': 'Expected a list of notification ids'}), 400
+    if len(ids) > MAX_BULK_IDS:
+        return jsonify({'error': f'At most {MAX_BULK_IDS} ids per request'}), 400
+
+    dismissed = dismiss(user_id, ids)
+    user_db.session.commit()
+    if dismissed:
+        snapshot_cache.invalidate(user_id)
+
+    return jsonify({'dismissed': dismissed, 'unread': unread_count(user_id)}), 200
+
+
+# Server-Sent Events stream of new notifications, replacing the 30s polling.
+# What gets sent always comes from the database, by id: a publish in this
+# process wakes the stream right away, and every heartbeat it looks again, so
+# notifications written by other worker processes arrive within one heartbeat.
+# A reconnecting EventSource sends Last-Event-ID and gets whatever it missed.
+# Streams end after NOTIFICATION_STREAM_LIFETIME seconds so worker threads are
+# recycled; EventSource reconnects on its own.
+@routes_bp.route('/api/notifications/stream', methods=['GET'])
+def stream_notifications():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    try:
+        queue = notification_broker.subscribe(user_id)
+    except TooManySubscribers:
+        return jsonify({'error': 'Too many open notification streams'}), 429
+
+    # subscribe before reading the newest id so nothing falls in between;
+    # without Last-Event-ID the stream starts after what the user already has
+    try:
+        last_sent = int(request.headers.get('Last-Event-ID') or request.args.get('last_id') or 0)
+    except ValueError:
+        last_sent = 0
+    if not last_sent:
+        last_sent = (user_db.session.query(func.max(Notification.id))
+                     .filter(Notification.receiver_id == user_id).scalar() or 0)
+
+    dumps = current_app.json.dumps
+    heartbeat = current_app.config.get('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    lifetime = current_app.config.get('NOTIFICATION_STREAM_LIFETIME', 300)
+    batch = 50
+
+    def event(payload):
+        return f"id: {payload['id']}\nevent: notification\ndata: {dumps(payload)}\n\n"
+
+    def generate():
+        sent = last_sent
+        try:
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + lifetime
+            while True:
+                # one lookup on (receiver_id, id)
+                rows = (notifications_query(user_id).filter(Notification.id > sent)
+                        .order_by(Notification.id).limit(batch).all())
+                payloads = [serialize_notification(n, sender) for n, sender in rows]
+                user_db.session.rollback()  # don't keep a read transaction open between checks
+                for payload in payloads:
+                    sent = payload['id']
+                    yield event(payload)
+                if len(payloads) == batch:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    queue.get(timeout=min(heartbeat, remaining))
+                except Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                while True:  # any other publishes are covered by the same lookup
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        break
+        finally:
+            notification_broker.unsubscribe(user_id, queue)
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let a proxy buffer the stream
+    })
+
+
+# Paged history endpoints, newest first. Same ?limit=&cursor= contract as /api/notifications.
+@routes_bp.route('/api/photos', methods=['GET'])
+def get_photos():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    query = uploadedPics.query.filter_by(user_id=user_id)
+    plant_id = request.args.get('plant_id', type=int)
+    if plant_id:
+        query = query.filter_by(plant_id=plant_id)
+
+    try:
+        cursor, limit = page_args()
+        photos, next_cursor = keyset_page(query, uploadedPics.datetime_uploaded, uploadedPics.photo_id,
+                                          cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({'photos': [serialize_photo(p) for p in photos], 'next_cursor': next_cursor}), 200
+
+
+@routes_bp.route('/api/growth', methods=['GET'])
+def get_growth_history():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    query = PlantGrowthEntry.query.filter_by(user_id=user_id)
+    if request.args.get('plant_id') or request.args.get('plant_name'):
+        plant = find_plant(user_id, request.args)
+        if not plant:
+            return jsonify({'error': 'Plant not found'}), 404
+        query = query.filter_by(plant_id=plant.id)
+
+    try:
+        cursor, limit = page_args()
+        entries, next_cursor = keyset_page(query, PlantGrowthEntry.date_recorded, PlantGrowthEntry.id,
+                                           cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({'growth_entries': [serialize_growth(g) for g in entries], 'next_cursor': next_cursor}), 200
+
+
+# Bulk import of growth or watering history: POST a CSV or NDJSON body (or a
+# multipart 'file') to /api/import/growth or /api/import/watering. Columns are
+# plant_id or plant_name, date and height (growth) or ml (watering, optional).
+# Responds with counts and a per-line error report; bad lines don't stop the import.
+# A database error or bad encoding does, and the partial report says where (stopped_at).
+@routes_bp.route('/api/import/<kind>', methods=['POST'])
+def import_history(kind):
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+    if kind not in IMPORT_KINDS:
+        return jsonify({'error': f"Can only import {', '.join(IMPORT_KINDS)}"}), 404
+
+    # imports may be bigger than the usual request cap
+    request.max_content_length = current_app.config.get('IMPORT_MAX_BYTES')
+
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, fmt = upload.stream, guess_format(upload.filename, upload.mimetype)
+    else:
+        stream, fmt = request.stream, guess_format(mimetype=request.mimetype)
+    fmt = request.args.get('format', fmt)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': 'Send CSV or NDJSON (set ?format=csv or ?format=ndjson)'}), 400
+
+    report = import_rows(user_id, kind, read_rows(stream, fmt))
+    return jsonify(report), 200
+
+
+# Download everything in your account, streamed as it is read:
+#   ?format=ndjson[&sections=plants,photos]   (default, all sections)
+#   ?format=csv&section=growth_entries        (one section)
+#   ?format=zip                               (a CSV per section plus photo files)
+@routes_bp.route('/api/export', methods=['GET'])
+def export_data():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    if fmt == 'csv':
+        sections = [request.args.get('section')]
+    else:
+        sections = request.args.get('sections', ','.join(EXPORT_SECTIONS)).split(',')
+    unknown = [s for s in sections if s not in EXPORT_SECTIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown section {unknown[0]!r}, expected one of {', '.join(EXPORT_SECTIONS)}"}), 400
+
+    user = user_db.session.get(User, user_id)
+    filename = f"plantly-{user.username}-{date.today()}"
+    if fmt == 'csv':
+        body, mimetype, extension = export_csv(user_id, sections[0]), 'text/csv', f'-{sections[0]}.csv'
+    elif fmt == 'zip':
+        body, mimetype, extension = export_zip(user_id), 'application/zip', '.zip'
+    else:
+        body, mimetype, extension = export_ndjson(user_id, sections), 'application/x-ndjson', '.ndjson'
+
+    # stream_with_context keeps the request (and its database session) alive while the body is sent
+    return current_app.response_class(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': content_disposition(filename + extension,
+                                                   f'plantly-{user_id}-{date.today()}{extension}'),
+        'Cache-Control': 'no-store'
+    })
+
+
+# Chart data for one plant: calendar rollups, growth rate, moving average and
+# a downsampled series (?plant_id= or ?plant_name=, &period=day|week|month&points=&window=)
+@routes_bp.route('/api/growth/analytics', methods=['GET'])
+def get_growth_analytics():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    if not (request.args.get('plant_id') or request.args.get('plant_name')):
+        return jsonify({'error': 'plant_id or plant_name is required'}), 400
+    plant = find_plant(user_id, request.args)
+    if not plant:
+        return jsonify({'error': 'Plant not found'}), 404
+
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+
+    points = max(3, min(request.args.get('points', DEFAULT_POINTS, type=int), MAX_POINTS))
+    window = max(1, min(request.args.get('window', 7, type=int), 365))
+
+    return jsonify(growth_analytics(plant, period, points, window)), 200
+
+
+# Watering intervals and predicted next watering for every plant, soonest due
+# first; ?due_within=N keeps plants due in the next N days (and overdue ones)
+@routes_bp.route('/api/watering/analytics', methods=['GET'])
+def get_watering_analytics():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    due_within = request.args.get('due_within', type=int)
+    return jsonify({'today': str(date.today()), 'plants': watering_schedule(user_id, due_within)}), 200
+
+
+@routes_bp.route('/api/watering', methods=['GET'])
+def get_watering_history():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    query = PlantWaterEntry.query.filter_by(user_id=user_id)
+    if request.args.get('plant_id') or request.args.get('plant_name'):
+        plant = find_plant(user_id, request.args)
+        if not plant:
+            return jsonify({'error': 'Plant not found'}), 404
+        query = query.filter_by(plant_id=plant.id)
+
+    try:
+        cursor, limit = page_args()
+        entries, next_cursor = keyset_page(query, PlantWaterEntry.date_watered, PlantWaterEntry.id,
+                                           cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return jsonify({'watering_entries': [serialize_watering(w) for w in entries], 'next_cursor': next_cursor}), 200
+
+
+# Shareboard feed: newest public posts plus posts from people you follow.
+# Friends posts come from the materialized feed_entries table (see feed.py).
+# Each list pages separately with ?public_cursor= / ?friends_cursor= and ?limit= (default 9)
 @routes_bp.route('/api/update-social', methods=['GET'])
 def updateFeed():
     #get the current user's id
     user_id = session.get("user_id")
 
-    # Fetch 9 most recent public posts
-    public_posts = user_db.session.query(uploadedPics).order_by(uploadedPics.datetime_uploaded.desc()).limit(9).all()
+    try:
+        public_cursor, limit = page_args(default=9, maximum=50, cursor_arg='public_cursor')
+        friends_cursor, _ = page_args(default=9, maximum=50, cursor_arg='friends_cursor')
+
+        public_posts, public_next = keyset_page(public_feed_query(), uploadedPics.datetime_uploaded,
+                                                uploadedPics.photo_id, public_cursor, limit)
 
-    # Fetch 9 posts from friends
-    #link friend ID to the user ID in photoTable (uploaded friend photos)
-    #also ensures friend list is specific to the current user
-    friends_posts = user_db.session.query(uploadedPics).join(FriendsList, (FriendsList.friend_id == uploadedPics.user_id)
-    & (FriendsList.user_id == user_id)).order_by(uploadedPics.datetime_uploaded.desc()).limit(9).all()
+        friends_posts, friends_next = [], None
+        if user_id:
+            friends_posts, friends_next = keyset_page(friends_feed_query(user_id), FeedEntry.datetime_uploaded,
+                                                      FeedEntry.photo_id, friends_cursor, limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-    #returning a jsonified object with the public and friends posts for now
-    #may need to be changed later
-    #possible that datetime may cause errors - althought I am unsure (to_dict() could cause issues??)
     return jsonify({
-        'public_posts': [post.to_dict() for post in public_posts],
-        'friends_posts': [post.to_dict() for post in friends_posts]
+        'public_posts': [serialize_post(pic, username) for pic, username in public_posts],
+        'friends_posts': [serialize_post(pic, username) for pic, username in friends_posts],
+        'public_next_cursor': public_next,
+        'friends_next_cursor': friends_next
     }), 200
 
 from datetime import datetime  # Add this import at the top
 
 @routes_bp.route('/api/add-growth', methods=['POST'])
+@retry_on_locked
 def add_growth_data():
     user_id = session.get('user_id')
     if not user_id:
@@ -610,12 +1038,11 @@ def add_growth_data():
 
     try:
         data = request.get_json()
-        plant_name = data.get('plant_name')
         date_str = data.get('date')
         height = float(data.get('height'))
 
         # Validate required fields
-        if not all([plant_name, date_str, height]):
+        if not all([data.get('plant_id') or data.get('plant_name'), date_str, height]):
             return jsonify({'error': 'Missing required fields'}), 400
 
         # Convert date string to Python date object
@@ -624,20 +1051,31 @@ def add_growth_data():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
+        plant = find_plant(user_id, data)
+        if not plant:
+            return jsonify({'error': 'Plant not found'}), 404
+        plant_id, plant_name = plant.id, plant.plant_name  # plain values, the commit expires the row
+
         # Create new growth entry
         new_entry = PlantGrowthEntry(
             user_id=user_id,
+            plant_id=plant_id,
             plant_name=plant_name,
             date_recorded=date_recorded,  # Now using proper date object
             cm_grown=height
         )
 
         user_db.session.add(new_entry)
+        user_db.session.flush()
+        entry_id = new_entry.id
         user_db.session.commit()
+        snapshot_cache.invalidate(user_id)
 
         return jsonify({
             'message': 'Growth data added successfully',
             'entry': {
+                'id': entry_id,
+                'plant_id': plant_id,
                 'plant_name': plant_name,
                 'date_recorded': date_str,  # Return the original string format for the frontend
                 'cm_grown': height
@@ -645,50 +1083,52 @@ def add_growth_data():
         }), 201
 
     except Exception as e:
-        print(f"Error adding growth data: {str(e)}")
+        if is_locked(e):
+            raise  # let retry_on_locked have another go
+        log.exception('add_growth_failed', user_id=user_id)
         user_db.session.rollback()
         return jsonify({'error': 'Failed to save growth data'}), 500
     
 
 @routes_bp.route('/api/add-watering', methods=['POST'])
+@retry_on_locked
 def add_watering_data():
     user_id = session.get('user_id')
     if not user_id:
-        print("401 Not logged in")
         return jsonify({'error': 'Not logged in'}), 401
 
     try:
         data = request.get_json()
-        print('Received JSON data:', data)
 
         if not data:
-            print("400 Missing JSON body")
             return jsonify({'error': 'Missing JSON body'}), 400
 
-        plant_name = data.get('plant_name')
         watering_dates = data.get('watering_dates')  # List of date strings
 
-        print(f"plant_name: {plant_name}, watering_dates: {watering_dates} (type: {type(watering_dates)})")
+        log.debug('add_watering', user_id=user_id, plant_id=data.get('plant_id'), plant_name=data.get('plant_name'),
+                  dates=len(watering_dates) if isinstance(watering_dates, list) else None)
 
         # Validate required fields
-        if not plant_name:
-            print("400 Missing plant_name")
+        if not (data.get('plant_id') or data.get('plant_name')):
             return jsonify({'error': 'Missing plant_name'}), 400
         if not isinstance(watering_dates, list):
-            print("400 watering_dates is not a list")
             return jsonify({'error': 'watering_dates must be a list'}), 400
 
+        plant = find_plant(user_id, data)
+        if not plant:
+            return jsonify({'error': 'Plant not found'}), 404
+        plant_id, plant_name = plant.id, plant.plant_name  # plain values, the commit expires the row
+
         entries = []
         for date_str in watering_dates:
-            print(f"Processing date: '{date_str}'")
             try:
                 date_watered = datetime.strptime(date_str, '%Y-%m-%d').date()
             except ValueError:
-                print(f"400 Invalid date format: {date_str}")
                 return jsonify({'error': f'Invalid date format: {date_str}. Use YYYY-MM-DD'}), 400
 
             entry = PlantWaterEntry(
                 user_id=user_id,
+                plant_id=plant_id,
                 plant_name=plant_name,
                 date_watered=date_watered,
                 ml_watered=0.0  # Placeholder if quantity is not tracked
@@ -696,17 +1136,24 @@ def add_watering_data():
             entries.append(entry)
 
         user_db.session.add_all(entries)
+        user_db.session.flush()
+        entry_ids = [e.id for e in entries]
         user_db.session.commit()
+        snapshot_cache.invalidate(user_id)
+        watering_cache.invalidate(user_id, plant_id)
 
         return jsonify({
             'message': 'Watering data added successfully',
             'entries': [
-                {'plant_name': plant_name, 'date_watered': d} for d in watering_dates
+                {'id': entry_id, 'plant_id': plant_id, 'plant_name': plant_name, 'date_watered': d}
+                for entry_id, d in zip(entry_ids, watering_dates)
             ]
         }), 201
 
     except Exception as e:
-        print(f"Error adding watering data: {str(e)}")
+        if is_locked(e):
+            raise  # let retry_on_locked have another go
+        log.exception('add_watering_failed', user_id=user_id)
         user_db.session.rollback()
         return jsonify({'error': 'Failed to save watering data'}), 500
 
@@ -0,0 +1,120 @@
+# Username search for /api/search-users.
+# user_search is an SQLite FTS5 table with the trigram tokenizer, built over
+# user.username (external content, so it stores only the index) and kept in
+# sync by triggers on the user table. A trigram MATCH finds any username
+# containing the query as a substring through the index instead of scanning
+# every user. Queries shorter than three characters have no trigram; those
+# fall back to a prefix range scan on ix_user_username_nocase.
+#
+# Fresh databases get the table and triggers from create_all() through the
+# DDL hooks below; existing ones from migration 5.
+#
+# The /api/users directory pages through the same NOCASE index with keyset
+# cursors. First pages are the same for everyone, so they are kept in
+# directory_cache until someone registers.
+
+from sqlalchemy import DDL, collate, event, func, text, tuple_
+
+from .models import user_db, User
+from .cache import directory_cache
+from .pagination import encode_cursor, InvalidCursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+DIRECTORY_PAGE = 50
+MAX_DIRECTORY_PAGE = 200
+
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "username, content='user', content_rowid='id', tokenize='trigram')",
+    'CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON "user" BEGIN '
+    "INSERT INTO user_search (rowid, username) VALUES (new.id, new.username); END",
+    'CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON "user" BEGIN '
+    "INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username); END",
+    'CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username ON "user" BEGIN '
+    "INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username); "
+    "INSERT INTO user_search (rowid, username) VALUES (new.id, new.username); END",
+]
+REBUILD = "INSERT INTO user_search (user_search) VALUES ('rebuild')"
+
+for statement in SEARCH_DDL:
+    event.listen(User.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(User.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS user_search').execute_if(dialect='sqlite'))
+
+
+# exact match first, then names starting with the query, then shortest
+_RANKED = """
+    SELECT u.id, u.username, f.friend_id IS NOT NULL AS is_friend
+    FROM {source}
+    LEFT JOIN friends_list f ON f.user_id = :me AND f.friend_id = u.id
+    WHERE {where} AND u.id != :me
+    ORDER BY lower(u.username) = :lowered DESC,
+             substr(lower(u.username), 1, length(:lowered)) = :lowered DESC,
+             length(u.username), u.username
+    LIMIT :limit
+"""
+
+SUBSTRING_SEARCH = text(_RANKED.format(
+    source='user_search s JOIN "user" u ON u.id = s.rowid',
+    where='user_search MATCH :match'))
+
+# the range scan is already in prefix order, so only the first :limit rows are read
+PREFIX_SEARCH = text("""
+    SELECT u.id, u.username, f.friend_id IS NOT NULL AS is_friend
+    FROM "user" u
+    LEFT JOIN friends_list f ON f.user_id = :me AND f.friend_id = u.id
+    WHERE u.username >= :low COLLATE NOCASE AND u.username < :high COLLATE NOCASE AND u.id != :me
+    ORDER BY u.username COLLATE NOCASE
+    LIMIT :limit
+""")
+
+
+def find_users(user_id, query, limit=DEFAULT_LIMIT):
+    # [(id, username, is_friend)] for users other than user_id whose name contains query
+    query = query.strip()
+    if not query:
+        return []
+    params = {'me': user_id, 'limit': limit, 'lowered': query.lower()}
+    if len(query) >= 3:
+        # a quoted phrase is a plain substring match for the trigram tokenizer
+        params['match'] = '"' + query.replace('"', '""') + '"'
+        rows = user_db.session.execute(SUBSTRING_SEARCH, params)
+    else:
+        rows = user_db.session.execute(PREFIX_SEARCH, dict(params, low=query, high=query + '\U0010ffff'))
+    return [(row.id, row.username, bool(row.is_friend)) for row in rows]
+
+
+def _directory_rows(prefix, after, count):
+    # (id, username) in directory order: username ignoring case, then id
+    name = collate(User.username, 'NOCASE')
+    query = user_db.session.query(User.id, User.username)
+    if prefix:
+        query = query.filter(name >= prefix, name < prefix + '\U0010ffff')
+    if after is not None:
+        query = query.filter(tuple_(name, User.id) > tuple_(after[0], after[1]))
+    return [tuple(row) for row in query.order_by(name, User.id).limit(count)]
+
+
+def directory_page(user_id, prefix='', cursor=None, limit=DIRECTORY_PAGE):
+    # ([(id, username)], next cursor) for everyone but user_id
+    if cursor is not None and (len(cursor) != 2 or not isinstance(cursor[0], str)
+                               or not isinstance(cursor[1], int)):
+        raise InvalidCursor(cursor)
+
+    # one spare row in case the caller is on this page, one more to tell if there's a next page
+    count = limit + 2
+    if cursor is None:
+        # usernames don't change, so the newest user id says whether anyone
+        # registered since, through whichever process
+        newest = user_db.session.query(func.max(User.id)).scalar()
+        rows, version = directory_cache.get((prefix, limit), newest)
+        if rows is None:
+            rows = _directory_rows(prefix, None, count)
+            directory_cache.put((prefix, limit), rows, version, newest)
+    else:
+        rows = _directory_rows(prefix, cursor, count)
+
+    rows = [row for row in rows if row[0] != user_id]
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(rows) > limit else None
+    return page, next_cursor
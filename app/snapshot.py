@@ -0,0 +1,283 @@
+# Dashboard snapshot shared by /api/login and /api/session
+# Every section is fetched with one query (joins instead of a .get() per row),
+# so the number of queries stays the same no matter how much data a user has.
+# Growth, watering and photo history is capped at the newest HISTORY_PER_PLANT
+# rows of each plant; history_cursors holds a /api/growth, /api/watering or
+# /api/photos cursor for each plant that has older rows, and the growth chart
+# switches to /api/growth/analytics for those. Notifications are the newest
+# page of /api/notifications, with notifications_cursor for the next one.
+
+from sqlalchemy import String, func, select, type_coerce
+
+from .models import (
+    user_db,
+    User,
+    UserSettings,
+    FriendsList,
+    Plants,
+    PlantGrowthEntry,
+    PlantWaterEntry,
+    uploadedPics,
+    SharedPlant,
+    Notification,
+)
+from .changes import latest_change_id, changes_since, encode_cursor
+from .pagination import keyset_page, encode_cursor as encode_page_cursor
+
+HISTORY_PER_PLANT = 50  # newest growth/watering/photo rows per plant in a snapshot
+NOTIFICATIONS_PER_SNAPSHOT = 50  # newest notifications in a snapshot
+
+
+def serialize_plant(p):
+    return {
+        'plant_name': p.plant_name,
+        'plant_type': p.plant_type,
+        'chosen_image_url': p.chosen_image_url,
+        'plant_category': p.plant_category,
+        'id': p.id,
+        'date_created': p.date_created
+    }
+
+
+def serialize_growth(g):
+    return {
+        'id': g.id,
+        'plant_id': g.plant_id,
+        'plant_name': g.plant_name,
+        'date_recorded': g.date_recorded,
+        'cm_grown': g.cm_grown
+    }
+
+
+def serialize_watering(w):
+    return {
+        'id': w.id,
+        'plant_id': w.plant_id,
+        'plant_name': w.plant_name,
+        'date_watered': w.date_watered.isoformat()
+    }
+
+
+def serialize_photo(pic):
+    return {
+        'photo_id': pic.photo_id,
+        'plant_id': pic.plant_id,
+        'image_url': pic.image_url,
+        'caption': pic.caption,
+        'datetime_uploaded': pic.datetime_uploaded
+    }
+
+
+def serialize_post(pic, username):
+    # a photo as shown on the shareboard
+    return {
+        **serialize_photo(pic),
+        'user_id': pic.user_id,
+        'username': username
+    }
+
+
+def serialize_friend(f, friend_username):
+    return {
+        'user_id': f.user_id,
+        'friend_id': f.friend_id,
+        'friend_username': friend_username,
+        'status': f.status
+    }
+
+
+def serialize_shared(shared, plant_name, shared_by):
+    return {
+        'id': shared.id,
+        'plant_id': shared.plant_id,
+        'plant_name': plant_name,
+        'shared_by': shared_by,
+        'datetime_shared': shared.datetime_shared.strftime('%Y-%m-%d %H:%M')
+    }
+
+
+def serialize_notification(notif, sender):
+    return {
+        'id': notif.id,
+        'sender': sender,
+        'message': notif.message,
+        'timestamp': notif.timestamp.strftime('%Y-%m-%d %H:%M'),
+        'plant_id': notif.plant_id,
+        'is_read': notif.is_read
+    }
+
+
+def serialize_settings(settings):
+    return {
+        'is_profile_public': settings.is_profile_public if settings else True,
+        'allow_friend_requests': settings.allow_friend_requests if settings else True
+    }
+
+
+# Query helpers for the sections that need a name from another table.
+# Each one is a single joined SELECT.
+
+def friends_query(user_id):
+    return (user_db.session.query(FriendsList, User.username)
+            .join(User, User.id == FriendsList.friend_id)
+            .filter(FriendsList.user_id == user_id))
+
+
+def shared_plants_query(user_id):
+    return (user_db.session.query(SharedPlant, Plants.plant_name, User.username)
+            .join(Plants, Plants.id == SharedPlant.plant_id)
+            .join(User, User.id == SharedPlant.shared_by)
+            .filter(SharedPlant.shared_with == user_id))
+
+
+def notifications_query(user_id):
+    return (user_db.session.query(Notification, User.username)
+            .join(User, User.id == Notification.sender_id)
+            .filter(Notification.receiver_id == user_id))
+
+
+def recent_per_plant(model, sort_col, id_col, user_id, limit=HISTORY_PER_PLANT):
+    # (the newest `limit` rows of each plant in id order, {plant_id: cursor for the older rows});
+    # the cursor is the one keyset_page would return after the last row kept
+    rank = func.row_number().over(partition_by=model.plant_id, order_by=(sort_col.desc(), id_col.desc()))
+    ranked = (select(id_col.label('row_id'), type_coerce(sort_col, String).label('sort_key'), rank.label('rank'))
+              .where(model.user_id == user_id).subquery())
+    rows = (user_db.session.query(model, ranked.c.sort_key, ranked.c.rank)
+            .join(ranked, id_col == ranked.c.row_id)
+            .filter(ranked.c.rank <= limit + 1)
+            .order_by(id_col).all())
+
+    kept, last, more = [], {}, set()
+    for row, sort_key, row_rank in rows:
+        if row_rank > limit:
+            more.add(row.plant_id)
+            continue
+        kept.append(row)
+        if row_rank == limit:
+            last[row.plant_id] = (sort_key, getattr(row, id_col.key))
+    return kept, {plant: encode_page_cursor(*last[plant]) for plant in more if plant is not None}
+
+
+def build_snapshot(user, cursor=None):
+    # read the cursor first: anything that changes while we build is sent
+    # again on the next delta, which is harmless since deltas are upserts
+    if cursor is None:
+        cursor = latest_change_id(user.id)
+
+    # one query per section, 8 in total
+    settings = UserSettings.query.filter_by(user_id=user.id).first()
+    plants = Plants.query.filter_by(user_id=user.id).all()
+    growth_entries, older_growth = recent_per_plant(PlantGrowthEntry, PlantGrowthEntry.date_recorded,
+                                                    PlantGrowthEntry.id, user.id)
+    watering_entries, older_watering = recent_per_plant(PlantWaterEntry, PlantWaterEntry.date_watered,
+                                                        PlantWaterEntry.id, user.id)
+    photos, older_photos = recent_per_plant(uploadedPics, uploadedPics.datetime_uploaded,
+                                            uploadedPics.photo_id, user.id)
+    friends = friends_query(user.id).all()
+    shared_entries = shared_plants_query(user.id).all()
+    notifications, notifications_cursor = keyset_page(notifications_query(user.id), Notification.timestamp,
+                                                      Notification.id, None, NOTIFICATIONS_PER_SNAPSHOT)
+
+    history_cursors = {}
+    for section, older in (('growth_entries', older_growth), ('watering_entries', older_watering),
+                           ('photos', older_photos)):
+        for plant_id, page_cursor in older.items():
+            history_cursors.setdefault(plant_id, {})[section] = page_cursor
+
+    return {
+        'full': True,
+        'username': user.username,
+        'user_id': user.id,
+        'email': user.email,
+        'plants': [serialize_plant(p) for p in plants],
+        'growth_entries': [serialize_growth(g) for g in growth_entries],
+        'watering_entries': [serialize_watering(w) for w in watering_entries],
+        'photos': [serialize_photo(pic) for pic in photos],
+        'history_cursors': history_cursors,
+        'friends': [serialize_friend(f, name) for f, name in friends],
+        'settings': serialize_settings(settings),
+        'streak': user.login_streak,
+        'shared_plants': [serialize_shared(s, plant_name, shared_by)
+                          for s, plant_name, shared_by in shared_entries],
+        'notifications': [serialize_notification(n, sender) for n, sender in notifications],
+        'notifications_cursor': notifications_cursor,
+        'unread_notifications': user.unread_notifications,
+        'last_login_date': str(user.last_login_date),
+        'cursor': encode_cursor(cursor)
+    }
+
+
+DELTA_CHUNK = 500  # keys per IN (...) so we stay under SQLite's bound parameter limit
+
+
+# section -> (fetch the user's rows in that section for a list of keys, key of a fetched row, serializer)
+def _delta_sections(user_id):
+    return {
+        'plants': (
+            lambda ids: Plants.query.filter(Plants.user_id == user_id, Plants.id.in_(ids)).all(),
+            lambda p: p.id,
+            serialize_plant),
+        'growth_entries': (
+            lambda ids: PlantGrowthEntry.query.filter(PlantGrowthEntry.user_id == user_id,
+                                                      PlantGrowthEntry.id.in_(ids)).all(),
+            lambda g: g.id,
+            serialize_growth),
+        'watering_entries': (
+            lambda ids: PlantWaterEntry.query.filter(PlantWaterEntry.user_id == user_id,
+                                                     PlantWaterEntry.id.in_(ids)).all(),
+            lambda w: w.id,
+            serialize_watering),
+        'photos': (
+            lambda ids: uploadedPics.query.filter(uploadedPics.user_id == user_id,
+                                                  uploadedPics.photo_id.in_(ids)).all(),
+            lambda pic: pic.photo_id,
+            serialize_photo),
+        'friends': (
+            lambda ids: friends_query(user_id).filter(FriendsList.friend_id.in_(ids)).all(),
+            lambda row: row[0].friend_id,
+            lambda row: serialize_friend(*row)),
+        'shared_plants': (
+            lambda ids: shared_plants_query(user_id).filter(SharedPlant.id.in_(ids)).all(),
+            lambda row: row[0].id,
+            lambda row: serialize_shared(*row)),
+        'notifications': (
+            lambda ids: notifications_query(user_id).filter(Notification.id.in_(ids)).all(),
+            lambda row: row[0].id,
+            lambda row: serialize_notification(*row)),
+    }
+
+
+def build_delta(user, since, limit=None):
+    changes = changes_since(user.id, since, limit)
+    if changes is None:
+        # too old or too far behind, the client reloads the full snapshot
+        return {'user_id': user.id, 'full': False, 'resync': True}
+    cursor, upserts, deletes = changes
+
+    changed = {}
+    tombstones = {section: list(ids) for section, ids in deletes.items()}
+    for section, (fetch, key, serialize) in _delta_sections(user.id).items():
+        ids = upserts.get(section, [])
+        found = set()
+        for start in range(0, len(ids), DELTA_CHUNK):
+            for row in fetch(ids[start:start + DELTA_CHUNK]):
+                found.add(key(row))
+                changed.setdefault(section, []).append(serialize(row))
+        # logged as changed but gone now (e.g. removed by a bulk delete)
+        missing = [row_id for row_id in ids if row_id not in found]
+        if missing:
+            tombstones.setdefault(section, []).extend(missing)
+
+    settings = UserSettings.query.filter_by(user_id=user.id).first()
+    return {
+        'user_id': user.id,
+        'full': False,
+        'cursor': encode_cursor(cursor),
+        'changed': changed,
+        'tombstones': {section: ids for section, ids in tombstones.items()
+                       if section not in ('profile', 'settings')},
+        'settings': serialize_settings(settings),
+        'streak': user.login_streak,
+        'unread_notifications': user.unread_notifications,
+        'last_login_date': str(user.last_login_date)
+    }
@@ -9,6 +9,36 @@ let globalPlants = {};
 let growthChart = null;
 let waterChart = null;
 
+// Ask the server for a resized copy (thumb | card | full) of a stored photo or
+// plant avatar instead of the original file; other URLs are left alone
+function sizedImageUrl(src, size) {
+  if (!src) return src;
+  if (src.startsWith('/api/blobs/')) {
+    return `${src.split('?')[0]}?size=${size}`;
+  }
+  const avatar = src.match(/(?:^|\/)assets\/Flower_Avatars\/([^?]+)$/);
+  if (avatar) {
+    return `/api/avatars/${avatar[1]}?size=${size}`;
+  }
+  return src;
+}
+
+// Plants with more growth points than this get a server-downsampled series
+const GROWTH_CHART_POINTS = 300;
+
+async function fetchGrowthSeries(plantName) {
+  try {
+    const params = new URLSearchParams({ plant_name: plantName, points: GROWTH_CHART_POINTS });
+    const response = await fetch(`/api/growth/analytics?${params}`, { credentials: 'include' });
+    if (!response.ok) return null;
+    const result = await response.json();
+    return result.points.map(p => ({ date: p.date, height: p.cm }));
+  } catch (err) {
+    console.error('❌ Could not load growth analytics:', err);
+    return null;
+  }
+}
+
 // Draw growth graph for selected plant
 
 function drawGraph(plantName) {
@@ -19,7 +49,7 @@ function drawGraph(plantName) {
       clearTimeout(window.drawGraphTimeout);
   }
 
-  window.drawGraphTimeout = setTimeout(() => {
+  window.drawGraphTimeout = setTimeout(async () => {
       const chartCanvas = document.getElementById('plantGrowthGraph');
       if (!chartCanvas) {
           console.error('❌ Canvas element not found');
@@ -33,7 +63,12 @@ function drawGraph(plantName) {
           window.growthChart = null;
       }
 
-      const data = globalPlants.growthData?.[plantName] || [];
+      let data = globalPlants.growthData?.[plantName] || [];
+      // Long histories (or ones the snapshot only has the newest part of):
+      // chart the server's downsampled series instead of every row
+      if (data.length > GROWTH_CHART_POINTS || globalPlants[plantName]?.olderHistory?.growth_entries) {
+          data = (await fetchGrowthSeries(plantName)) || data;
+      }
       console.log('📊 Growth data array:', data);
       console.log('📊 Number of data points:', data.length);
       console.log('📊 Raw data points:', JSON.stringify(data, null, 2));
@@ -475,6 +510,7 @@ function loginForm() {
         }
 
         localStorage.setItem('user_profile', JSON.stringify(slimProfile));
+        localStorage.removeItem(SNAPSHOT_KEY); // may belong to another account
 
 
         // Redirect to dashboard
@@ -624,11 +660,15 @@ async function loadNotifications() {
     const data = await response.json();
     console.log("🔔 Notifications received:", data.notifications);
 
+    // Keep the list so streamed notifications can be added to it
+    window.currentNotifications = data.notifications || [];
+
     // Render notifications
-    renderNotifications(data.notifications || []);
+    renderNotifications(window.currentNotifications);
     
-    // Update notification badge
-    updateNotificationBadge((data.notifications || []).length);
+    // Update notification badge from the server's unread counter
+    window.unreadNotifications = data.unread || 0;
+    updateNotificationBadge(window.unreadNotifications);
     
   } catch (err) {
     console.error("❌ Notification load error:", err);
@@ -1020,9 +1060,12 @@ function removeFriend(friendId) {
   });
 }
 
-async function loadAllUsers() {
+// Directory of other users, one page at a time; "Show more" fetches the next page
+async function loadAllUsers(cursor = null) {
   try {
-    const response = await fetch('/api/users', {
+    const params = new URLSearchParams({ limit: 50 });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`/api/users?${params}`, {
       credentials: 'include'
     });
     if (!response.ok) throw new Error("Failed to fetch users");
@@ -1030,9 +1073,10 @@ async function loadAllUsers() {
     const data = await response.json();
     const searchResults = document.getElementById('searchResults');
     const noResultsMessage = document.getElementById('noSearchResultsMessage');
-    searchResults.innerHTML = '';
+    if (!cursor) searchResults.innerHTML = '';
+    searchResults.querySelector('.load-more-users')?.remove();
 
-    if (data.users.length === 0) {
+    if (!cursor && data.users.length === 0) {
       noResultsMessage.style.display = 'block';
       return;
     } else {
@@ -1048,6 +1092,14 @@ async function loadAllUsers() {
       `;
       searchResults.appendChild(listItem);
     });
+
+    if (data.next_cursor) {
+      const more = document.createElement('li');
+      more.className = 'list-group-item text-center load-more-users';
+      more.innerHTML = `<button class="btn btn-sm btn-outline-secondary">Show more</button>`;
+      more.querySelector('button').addEventListener('click', () => loadAllUsers(data.next_cursor));
+      searchResults.appendChild(more);
+    }
   } catch (err) {
     console.error("Error loading users:", err);
   }
@@ -1061,6 +1113,7 @@ async function logout() {
     credentials: 'include'
   });
   localStorage.removeItem('user_profile');
+  localStorage.removeItem(SNAPSHOT_KEY);
   window.location.href = 'index.html';
 }
 
@@ -1071,17 +1124,73 @@ window.addEventListener('DOMContentLoaded', async () => {
 });
 
 
-// load user sessions 
-async function loadSession() {
-  const load = await fetch('/api/session', {
+// Delta sync: keep the last full snapshot and its cursor in localStorage and
+// only ask the server for what changed since then (/api/session?since=cursor)
+const SNAPSHOT_KEY = 'session_snapshot';
+const SNAPSHOT_SECTION_KEYS = {
+  plants: 'id',
+  growth_entries: 'id',
+  watering_entries: 'id',
+  photos: 'photo_id',
+  friends: 'friend_id',
+  shared_plants: 'id',
+  notifications: 'id'
+};
+
+function applySessionDelta(snapshot, delta) {
+  Object.entries(SNAPSHOT_SECTION_KEYS).forEach(([section, key]) => {
+    const rows = new Map((snapshot[section] || []).map(row => [row[key], row]));
+    (delta.tombstones[section] || []).forEach(id => rows.delete(id));
+    (delta.changed[section] || []).forEach(row => rows.set(row[key], row));
+    snapshot[section] = Array.from(rows.values());
+  });
+  snapshot.notifications.sort((a, b) => b.timestamp.localeCompare(a.timestamp) || b.id - a.id);
+  snapshot.settings = delta.settings;
+  snapshot.streak = delta.streak;
+  snapshot.last_login_date = delta.last_login_date;
+  snapshot.cursor = delta.cursor;
+  return snapshot;
+}
+
+async function fetchSessionSnapshot() {
+  const cached = JSON.parse(localStorage.getItem(SNAPSHOT_KEY) || 'null');
+  const url = cached ? `/api/session?since=${encodeURIComponent(cached.cursor)}` : '/api/session';
+  const load = await fetch(url, {
     method: 'GET',
     headers: {
       'X-CSRFToken': csrfToken
     },
     credentials: 'include'
   });
-  if (load.ok) {
-    const user = await load.json();
+  if (!load.ok) {
+    if (cached) {
+      // bad or foreign cursor, start again from a full snapshot
+      localStorage.removeItem(SNAPSHOT_KEY);
+      return fetchSessionSnapshot();
+    }
+    return null;
+  }
+
+  const body = await load.json();
+  // resync: the cursor is older than the server's change log, or too far behind
+  if (cached && !body.full && (body.resync || body.user_id !== cached.user_id)) {
+    localStorage.removeItem(SNAPSHOT_KEY);
+    return fetchSessionSnapshot();
+  }
+  const snapshot = body.full ? body : applySessionDelta(cached, body);
+  try {
+    localStorage.setItem(SNAPSHOT_KEY, JSON.stringify(snapshot));
+  } catch (err) {
+    // quota exceeded (large inline photos), fall back to full loads
+    localStorage.removeItem(SNAPSHOT_KEY);
+  }
+  return JSON.parse(JSON.stringify(snapshot));
+}
+
+// load user sessions 
+async function loadSession() {
+  const user = await fetchSessionSnapshot();
+  if (user) {
 
     console.log("🧪 Raw user data from /api/session:", user);
     console.log("🌱 user.plants:", user.plants?.length);
@@ -1225,7 +1334,9 @@ async function loadDashboard() {
       creationDate: new Date().toISOString(),
       lastUpdated: new Date().toISOString(),
       photos: [], // Add this line to store plant photos
-      waterData: [] // Add this line to store water data
+      waterData: [], // Add this line to store water data
+      // cursors for history older than what the snapshot carries
+      olderHistory: (profile.history_cursors || {})[plant.id] || {}
     };
 
     if (!globalPlants.growthData) globalPlants.growthData = {};
@@ -1409,7 +1520,7 @@ function renderPlantTab ({
   newTabContent.role = "tabpanel";
   newTabContent.innerHTML = `
     <div class="text-center flower-avatar-container">
-      <img src="${avatarImageSrc}" class="img-fluid text-center avatar">
+      <img src="${sizedImageUrl(avatarImageSrc, 'card')}" class="img-fluid text-center avatar">
       <div class="input-group input-group-sm justify-content-center">
         <span class="input-group-text mt-2 text-light bg-success">${plantCategory}: ${plantType}</span>
       </div>
@@ -1641,7 +1752,7 @@ function initialisePlantManagement() {
       if (shareContent) {
         shareContent.innerHTML = `
           <h3 class="text-white"> Share Your Plant! </h3>
-          <img src="${avatarImageSrc}" class="img-fluid text-center share-avatar">
+          <img src="${sizedImageUrl(avatarImageSrc, 'card')}" class="img-fluid text-center share-avatar">
           <div class="share-controls text-center mt-4">
               <a class="btn btn-success btn-lg" href="shareBoard.html">
                 <i class="bi bi-share me-2"></i> Share Plant
@@ -1726,7 +1837,7 @@ function initialisePlantManagement() {
     if (shareContent && plantData.avatarSrc) {
       shareContent.innerHTML = `
         <h3 class="text-white"> Share Your Plant! </h3>
-        <img src="${plantData.avatarSrc}" class="img-fluid text-center share-avatar">
+        <img src="${sizedImageUrl(plantData.avatarSrc, 'card')}" class="img-fluid text-center share-avatar">
         <div class="share-controls text-center mt-4">
           <a class="btn btn-success btn-lg" href="shareBoard.html">
             <i class="bi bi-share me-2"></i> Share Plant
@@ -1766,7 +1877,7 @@ function initialisePhotoUpload() {
   const display = document.getElementById('latestPhotoContainer');
   if (!photoForm || !input || !display) return;
 
-  photoForm.addEventListener('submit', function (e) {
+  photoForm.addEventListener('submit', async function (e) {
     e.preventDefault();
     e.stopPropagation();
 
@@ -1784,72 +1895,66 @@ function initialisePhotoUpload() {
     console.log("📤 Upload started for plant:", currentPlant);
     console.log("📝 Comments:", comments);
 
-    const reader = new FileReader();
-    reader.onload = async function (event) {
-      const imgSrc = event.target.result;
-      const date = new Date().toLocaleString(undefined, {
-        hour: 'numeric',
-        minute: 'numeric',
-        day: '2-digit',
-        month: '2-digit',
-        year: '2-digit',
-      });
+    // Send the file itself as multipart/form-data; the server stores the bytes
+    // and hands back a short URL instead of us posting a base64 data URL
+    const date = new Date().toLocaleString(undefined, {
+      hour: 'numeric',
+      minute: 'numeric',
+      day: '2-digit',
+      month: '2-digit',
+      year: '2-digit',
+    });
 
-      // Create photo object
-      const photoData = {
-        src: imgSrc,
-        date: date,
-        comments: comments || '',
-      };
+    const formData = new FormData();
+    formData.append('plant_name', currentPlant);
+    formData.append('caption', comments || '');
+    formData.append('photo', file);
 
-      // Add to plant's photos array
-      if (!globalPlants[currentPlant].photos) {
-        globalPlants[currentPlant].photos = [];
-      }
-      globalPlants[currentPlant].photos.push(photoData); // Add new photo at the beginning
-
-      console.log("✅ Photo added to globalPlants:", photoData);
-      console.log("📸 Total photos now:", globalPlants[currentPlant].photos.length);
-      console.log("📦 Uploading to backend:", {
-        plant_name: currentPlant,
-        image_url: imgSrc,
-        caption: comments || ''
+    let imgSrc = URL.createObjectURL(file);
+    try {
+      const response = await fetch('/api/upload-photo', {
+        method: 'POST',
+        headers: {
+          'X-CSRFToken': csrfToken
+        },
+        credentials: 'include',
+        body: formData
       });
-
-      try {
-        const response = await fetch('/api/add-photo', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': csrfToken
-          },
-          credentials: 'include',
-          body: JSON.stringify({
-            plant_name: currentPlant,
-            image_url: imgSrc,
-            caption: comments || ''
-          })
-        });
-    
-        const result = await response.json();
-        if (response.ok) {
-          console.log("✅ Photo saved to backend:", result);
-        } else {
-          console.error("❌ Upload failed:", result);
-        }
-      } catch (err) {
-        console.error("⚠️ Error uploading photo:", err);
+  
+      const result = await response.json();
+      if (response.ok) {
+        console.log("✅ Photo saved to backend:", result);
+        imgSrc = result.image_url;
+      } else {
+        console.error("❌ Upload failed:", result);
       }
+    } catch (err) {
+      console.error("⚠️ Error uploading photo:", err);
+    }
 
-      // Update display
-      updatePhotoDisplay(currentPlant);
-
-      photoForm.reset();
-      const modal = bootstrap.Modal.getInstance(document.getElementById('pictureModal'));
-      modal.hide();
-      document.activeElement?.blur(); 
+    // Create photo object
+    const photoData = {
+      src: imgSrc,
+      date: date,
+      comments: comments || '',
     };
-    reader.readAsDataURL(file);
+
+    // Add to plant's photos array
+    if (!globalPlants[currentPlant].photos) {
+      globalPlants[currentPlant].photos = [];
+    }
+    globalPlants[currentPlant].photos.push(photoData);
+
+    console.log("✅ Photo added to globalPlants:", photoData);
+    console.log("📸 Total photos now:", globalPlants[currentPlant].photos.length);
+
+    // Update display
+    updatePhotoDisplay(currentPlant);
+
+    photoForm.reset();
+    const modal = bootstrap.Modal.getInstance(document.getElementById('pictureModal'));
+    modal.hide();
+    document.activeElement?.blur(); 
   });
 }
 
@@ -1876,13 +1981,14 @@ function updatePhotoDisplay(currentPlant) {
       <div class="card photo-card mb-3 bg-light text-dark">
         <div class="card-body text-center">
           <p class="card-text"><small>${photo.date}</small></p>
-          <img src="${photo.src}" class="card-img-top photo-img mb-2" alt="Plant photo ${photos.length - i}">
+          <img src="${sizedImageUrl(photo.src, 'full')}" class="card-img-top photo-img mb-2" alt="Plant photo ${photos.length - i}">
           ${photo.comments ? `<p class="card-text"><strong>Comments:</strong> ${photo.comments}</p>` : ''}
         </div>
       </div>
     </div>
   `).join('');
 
+  const olderCursor = globalPlants[currentPlant].olderHistory?.photos;
   picDiv.innerHTML = `
     <div id="photoCarousel" class="carousel slide" data-bs-ride="carousel">
       <div class="carousel-inner">
@@ -1895,7 +2001,35 @@ function updatePhotoDisplay(currentPlant) {
         <span class="carousel-control-next-icon"></span>
       </button>
     </div>
+    ${olderCursor ? '<button id="olderPhotosBtn" class="btn btn-sm btn-outline-light mt-2">Load older photos</button>' : ''}
   `;
+  if (olderCursor) {
+    document.getElementById('olderPhotosBtn').addEventListener('click', () => loadOlderPhotos(currentPlant));
+  }
+}
+
+// The snapshot only carries each plant's newest photos; page in the rest from /api/photos
+async function loadOlderPhotos(plantName) {
+  const plant = globalPlants[plantName];
+  const cursor = plant?.olderHistory?.photos;
+  if (!cursor) return;
+  try {
+    const params = new URLSearchParams({ plant_id: plant.id, cursor });
+    const response = await fetch(`/api/photos?${params}`, { credentials: 'include' });
+    if (!response.ok) return;
+    const page = await response.json();
+    // the page is newest first, plant.photos is oldest first
+    const older = page.photos.reverse().map(photo => ({
+      src: photo.image_url,
+      date: new Date(photo.datetime_uploaded).toLocaleString(),
+      comments: photo.caption || ''
+    }));
+    plant.photos = older.concat(plant.photos);
+    plant.olderHistory.photos = page.next_cursor;
+    updatePhotoDisplay(plantName);
+  } catch (err) {
+    console.error('❌ Could not load older photos:', err);
+  }
 }
 
 // Add this function after the updatePhotoDisplay function
@@ -1926,7 +2060,7 @@ function updateShareContent(plantName, avatarImageSrc) {
   
   shareContent.innerHTML = `
     <h3 class="text-white">Share Your Plant!</h3>
-    <img src="${avatarImageSrc}" class="img-fluid text-center share-avatar">
+    <img src="${sizedImageUrl(avatarImageSrc, 'card')}" class="img-fluid text-center share-avatar">
     <div class="share-controls text-center mt-4">
       <a class="btn btn-success btn-lg" href="shareBoard.html">
         <i class="bi bi-share me-2"></i> Share Plant
@@ -2028,10 +2162,12 @@ function dismissNotification(notificationId, notifElement) {
     
     // Remove notification from UI
     notifElement.remove();
+    window.currentNotifications = (window.currentNotifications || []).filter(n => n.id !== notificationId);
     
     // Update count
     const remainingCount = document.querySelectorAll('#notification-container li').length - 1;
-    updateNotificationBadge(remainingCount > 0 ? remainingCount : 0);
+    window.unreadNotifications = data.unread || 0;
+    updateNotificationBadge(window.unreadNotifications);
     
     // Show "no notifications" message if all dismissed
     if (remainingCount <= 0) {
@@ -2052,13 +2188,38 @@ function dismissNotification(notificationId, notifElement) {
   });
 }
 
-// Add polling for notifications
-// Add notification polling
+// New notifications are pushed over Server-Sent Events; the browser reconnects
+// by itself and the server replays anything missed since the last event id.
+// Falls back to polling every 30 seconds where EventSource isn't available.
 function startNotificationPolling() {
+  // Called from more than one DOMContentLoaded handler, only start once
+  if (window.notificationStream || window.notificationInterval) return;
+
   // Check for notifications immediately
-  loadNotifications();
-  
-  // Then set up interval to check periodically (every 30 seconds)
+  loadNotifications().then(() => {
+    if (!window.EventSource) return;
+
+    // Start the stream after the newest notification we already have
+    const known = window.currentNotifications || [];
+    const lastId = known.reduce((max, n) => Math.max(max, n.id), 0);
+    const stream = new EventSource(`/api/notifications/stream?last_id=${lastId}`, { withCredentials: true });
+    window.notificationStream = stream;
+
+    stream.addEventListener('notification', (event) => {
+      const notif = JSON.parse(event.data);
+      const list = window.currentNotifications || [];
+      if (list.some(n => n.id === notif.id)) return; // replayed after a reconnect
+
+      window.currentNotifications = [notif, ...list];
+      renderNotifications(window.currentNotifications);
+      window.unreadNotifications = (window.unreadNotifications || 0) + 1;
+      updateNotificationBadge(window.unreadNotifications);
+    });
+  });
+
+  if (window.EventSource) return;
+
+  // No EventSource: poll every 30 seconds while the page is visible
   const pollInterval = 30000; // 30 seconds
   
   // Create and store the interval
@@ -2090,9 +2251,37 @@ document.addEventListener('DOMContentLoaded', function() {
       // Reload notifications when modal is opened
       loadNotifications();
     });
+
+    // Everything in the list has been seen once the modal closes
+    notificationsModal.addEventListener('hidden.bs.modal', function() {
+      if (window.unreadNotifications > 0) {
+        markAllNotificationsRead();
+      }
+    });
   }
 });
 
+// Clear the unread counter in one request
+async function markAllNotificationsRead() {
+  try {
+    const response = await fetch('/api/notifications/mark-all-read', {
+      method: 'POST',
+      credentials: 'include',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': csrfToken
+      }
+    });
+    if (!response.ok) throw new Error('Failed to mark notifications read');
+
+    window.unreadNotifications = 0;
+    (window.currentNotifications || []).forEach(n => { n.is_read = true; });
+    updateNotificationBadge(0);
+  } catch (err) {
+    console.error("❌ Error marking notifications read:", err);
+  }
+}
+
 // Add this to your DOMContentLoaded event
 document.addEventListener('DOMContentLoaded', async () => {
   // ... existing code ...
@@ -0,0 +1,424 @@
+# benchmarks/endpoints.py
+# Latency, throughput and queries per request for the hot endpoints, against
+# generated datasets, compared with a stored baseline:
+#   python benchmarks/endpoints.py                          small dataset, in-process test client
+#   python benchmarks/endpoints.py --dataset medium --concurrency 8
+#   python benchmarks/endpoints.py --server 4               through 4 local HTTP server processes
+#   python benchmarks/endpoints.py --save-baseline          record benchmarks/baselines/<dataset>.json
+#
+# Datasets come from generate_data.py with a fixed seed and date, are built
+# once into benchmarks/.data/ (per schema version, so a migration means a
+# rebuild) and copied fresh for every run, so the writes a run makes never
+# leak into the next one. Request mixes are seeded too.
+#
+# Exits 1 when any endpoint is worse than its baseline by more than the
+# thresholds: p50/p95 latency up by --latency-threshold (and by more than
+# --latency-floor ms), throughput down by
+# --throughput-threshold, or any extra query per request. Query counts are
+# exact and portable; latency baselines only mean something on the machine
+# that recorded them, so re-record them there (CI) with --save-baseline.
+#
+# Queries per request are read from /metrics (summed over every server
+# process with --server), so they count exactly what the app ran.
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.config import Config
+from app.migrations import LATEST_VERSION
+from app.models import user_db
+from app.replicas import read_replicas
+from generate_data import generate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, '.data')
+BASELINE_DIR = os.path.join(HERE, 'baselines')
+
+PASSWORD = 'benchmark'
+DATASET_DATE = date(2025, 6, 1)
+DATASETS = {
+    # name: generate() volumes
+    'small': dict(users=500, plants=3, growth=20, watering=30, photos=2, friends=10, notifications=5),
+    'medium': dict(users=5000, plants=3, growth=20, watering=30, photos=2, friends=10, notifications=5),
+    'large': dict(users=50000, plants=3, growth=20, watering=30, photos=2, friends=10, notifications=5),
+}
+SESSIONS = 50  # logged-in users each run spreads its requests over
+
+# name -> metrics endpoint label
+ENDPOINTS = {
+    'login': 'routes.login',
+    'session': 'routes.session_data',
+    'notifications': 'routes.get_notifications',
+    'search-users': 'routes.search_users',
+    'update-social': 'routes.updateFeed',
+    'add-growth': 'routes.add_growth_data',
+    'add-watering': 'routes.add_watering_data',
+}
+
+
+class BenchConfig(Config):
+    WTF_CSRF_ENABLED = False
+    # measure the endpoints, not the password hash (it has its own pool and stats)
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+    LOG_LEVEL = 'WARNING'
+    CHANGE_LOG_PRUNE_SECONDS = None # no background pruning in the middle of a measurement
+
+
+def bench_config(path):
+    return type('BenchRun', (BenchConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                                             'PHOTO_STORE_PATH': os.path.join(os.path.dirname(path), 'photos')})
+
+
+def dataset_path(name):
+    # build the dataset once, later runs reuse the file
+    path = os.path.join(DATA_DIR, f'{name}-v{LATEST_VERSION}.db')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        building = path + '.building'
+        for leftover in (building, building + '-wal', building + '-shm'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        print(f"Building {name} dataset (once) ...")
+        app = create_app(bench_config(building))
+        with app.app_context():
+            user_db.create_all()
+            with user_db.engine.connect() as conn:
+                password = generate_password_hash(PASSWORD, BenchConfig.PASSWORD_HASH_METHOD)
+                generate(conn, np.random.default_rng(0), password=password, chunk=20000,
+                         today=DATASET_DATE, **DATASETS[name])
+                conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            user_db.engine.dispose()
+        if read_replicas.engine is not None:
+            read_replicas.engine.dispose()
+        os.replace(building, path)
+    return path
+
+
+# clients: the same calls through the Flask test client or real HTTP
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+    def text(self, path):
+        return self.client.get(path).get_data(as_text=True)
+
+
+class HTTPClient:
+    def __init__(self, base):
+        self.base = base
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def text(self, path):
+        with self.opener.open(self.base + path) as response:
+            return response.read().decode()
+
+
+def sql_counts(clients):
+    # {metrics label: [statements, requests]} scraped from /metrics, summed over the given clients
+    totals = {}
+    for client in clients:
+        text = client.text('/metrics')
+        sums = dict(re.findall(r'plantly_sql_statements_sum\{endpoint="([^"]+)"\} (\S+)', text))
+        counts = re.findall(r'plantly_sql_statements_count\{endpoint="([^"]+)"\} (\S+)', text)
+        for label, count in counts:
+            total = totals.setdefault(label, [0.0, 0.0])
+            total[0] += float(sums[label])
+            total[1] += float(count)
+    return totals
+
+
+def request_plan(name, users, rng, count):
+    # (method, path, body) for each request, drawn up front so every run sends the same ones;
+    # request i goes out on session i % len(users), logged in as users[i % len(users)]
+    plan = []
+    for i in range(count):
+        user = users[i % len(users)]
+        day = f'20{rng.integers(10, 25)}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}'
+        if name == 'login':
+            plan.append(('POST', '/api/login', {'username': user['username'], 'password': PASSWORD}))
+        elif name == 'session':
+            plan.append(('GET', '/api/session', None))
+        elif name == 'notifications':
+            plan.append(('GET', '/api/notifications', None))
+        elif name == 'search-users':
+            word = users[rng.integers(len(users))]['username']
+            start = rng.integers(0, max(1, len(word) - 5))
+            plan.append(('GET', f'/api/search-users?q={word[start:start + rng.integers(2, 6)]}', None))
+        elif name == 'update-social':
+            plan.append(('GET', '/api/update-social', None))
+        elif name == 'add-growth':
+            plan.append(('POST', '/api/add-growth',
+                         {'plant_name': user['plant'], 'date': day, 'height': float(rng.integers(1, 100))}))
+        elif name == 'add-watering':
+            plan.append(('POST', '/api/add-watering', {'plant_name': user['plant'], 'watering_dates': [day]}))
+    return plan
+
+
+def run_endpoint(name, clients, plan, concurrency):
+    # plan[i] goes out on session i % len(clients); threads take requests in turn
+    latencies = [None] * len(plan)
+    failures = []
+    position = iter(range(len(plan)))
+    lock = threading.Lock()
+    busy = [threading.Lock() for _ in clients]  # one request per session at a time, like a browser tab
+
+    def worker():
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            method, path, body = plan[i]
+            with busy[i % len(clients)]:
+                started = time.perf_counter()
+                status = clients[i % len(clients)].request(method, path, body)
+                latencies[i] = time.perf_counter() - started
+            if status >= 400:
+                failures.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(plan),
+        'failures': len(failures),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'rps': round(len(plan) / elapsed, 1),
+    }
+
+
+def sample_users(path, count, rng):
+    con = sqlite3.connect(path)
+    rows = con.execute('SELECT u.username, min(p.plant_name) FROM user u JOIN plants p ON p.user_id = u.id '
+                       'GROUP BY u.id ORDER BY u.id').fetchall()
+    con.close()
+    picked = rng.choice(len(rows), size=min(count, len(rows)), replace=False)
+    return [{'username': rows[i][0], 'plant': rows[i][1]} for i in sorted(picked.tolist())]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_servers(path, workers):
+    # one threaded server process per worker, each on its own port; sessions are spread over them
+    processes, bases = [], []
+    for _ in range(workers):
+        port = free_port()
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', path,
+                                           '--port', str(port)],
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        bases.append(f'http://127.0.0.1:{port}')
+    for base in bases:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base + '/api/csrf-token').read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            for process in processes:
+                process.kill()
+            raise RuntimeError(f'benchmark server at {base} did not start')
+    return processes, bases
+
+
+def serve(path, port):
+    from werkzeug.serving import run_simple
+    app = create_app(bench_config(path))
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+
+def run_suite(args):
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix='plantly-endpoints-')
+    path = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(dataset_path(args.dataset), path)
+    users = sample_users(path, SESSIONS, rng)
+
+    processes = []
+    try:
+        if args.server:
+            processes, bases = start_servers(path, args.server)
+            clients = [HTTPClient(bases[i % len(bases)]) for i in range(len(users))]
+        else:
+            app = create_app(bench_config(path))
+            clients = [TestClient(app) for _ in users]
+        scrapers = clients[:max(args.server, 1)]  # one per server process
+
+        # log every session in once (not timed); each endpoint then gets a short warm-up
+        for client, user in zip(clients, users):
+            client.request('POST', '/api/login', {'username': user['username'], 'password': PASSWORD})
+        time.sleep(BenchConfig.READ_YOUR_WRITES_SECONDS if args.wait_for_replica else 0)
+
+        results = {}
+        for name in args.endpoints:
+            plan = request_plan(name, users, np.random.default_rng([args.seed, list(ENDPOINTS).index(name)]),
+                                args.requests)
+            run_endpoint(name, clients, plan[:args.warmup], args.concurrency)
+            before = sql_counts(scrapers).get(ENDPOINTS[name], [0, 0])
+            # best of --repeat passes: a busy neighbour only ever makes a pass slower
+            passes = [run_endpoint(name, clients, plan, args.concurrency) for _ in range(args.repeat)]
+            after = sql_counts(scrapers).get(ENDPOINTS[name], [0, 0])
+            result = {key: min(p[key] for p in passes) for key in ('p50_ms', 'p95_ms', 'p99_ms')}
+            result.update(requests=len(plan), failures=sum(p['failures'] for p in passes),
+                          rps=max(p['rps'] for p in passes))
+            requests = after[1] - before[1]
+            result['queries_per_request'] = round((after[0] - before[0]) / requests, 2) if requests else None
+            results[name] = result
+        return results
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, latency_threshold, throughput_threshold, latency_floor, timings=True):
+    # list of regression messages; timings=False only checks query counts and failures
+    problems = []
+    for name, now in results.items():
+        then = baseline.get('endpoints', {}).get(name)
+        if not then:
+            continue
+        for key in ('p50_ms', 'p95_ms') if timings else ():
+            if now[key] > then[key] * (1 + latency_threshold) and now[key] - then[key] > latency_floor:
+                problems.append(f'{name}: {key} {now[key]} vs baseline {then[key]}')
+        if timings and then['rps'] and now['rps'] < then['rps'] * (1 - throughput_threshold):
+            problems.append(f'{name}: {now["rps"]} req/s vs baseline {then["rps"]}')
+        if then.get('queries_per_request') is not None and now.get('queries_per_request') is not None \
+                and now['queries_per_request'] > then['queries_per_request']:
+            problems.append(f'{name}: {now["queries_per_request"]} queries/request '
+                            f'vs baseline {then["queries_per_request"]}')
+        if now['failures']:
+            problems.append(f'{name}: {now["failures"]} of {now["requests"]} requests failed')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot endpoints against a stored baseline')
+    parser.add_argument('--dataset', choices=DATASETS, default='small')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes per endpoint, the best one counts')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--server', type=int, default=0, metavar='WORKERS',
+                        help='go through this many local HTTP server processes (0: in-process test client)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--wait-for-replica', action='store_true',
+                        help='wait out the read-your-writes window after logging in, so GETs use the read pool')
+    parser.add_argument('--latency-threshold', type=float, default=0.3)
+    parser.add_argument('--latency-floor', type=float, default=1.0,
+                        help='ms; smaller slowdowns never count, sub-millisecond timings are mostly noise')
+    parser.add_argument('--throughput-threshold', type=float, default=0.35)
+    parser.add_argument('--baseline', help='defaults to benchmarks/baselines/<dataset>.json')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', help='also write this run as JSON here')
+    parser.add_argument('--serve', metavar='DB', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    results = run_suite(args)
+    run = {
+        'dataset': args.dataset,
+        'mode': f'server x{args.server}' if args.server else 'test client',
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'repeat': args.repeat,
+        'endpoints': results,
+    }
+
+    print(f"{args.dataset} dataset, {run['mode']}, concurrency {args.concurrency}")
+    print(f"  {'endpoint':<15}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'failed':>8}")
+    for name, r in results.items():
+        queries = '-' if r['queries_per_request'] is None else r['queries_per_request']
+        print(f"  {name:<15}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['rps']:>9}{queries:>9}{r['failures']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'{args.dataset}.json')
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(run, f, indent=2)
+            f.write('\n')
+        print(f"saved baseline {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"no baseline at {baseline_path}, run with --save-baseline to record one")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    # timings from a different mode or concurrency aren't comparable, query counts still are
+    timings = (baseline.get('mode'), baseline.get('concurrency')) == (run['mode'], run['concurrency'])
+    if not timings:
+        print(f"baseline was recorded with {baseline.get('mode')}, concurrency {baseline.get('concurrency')}; "
+              f"comparing query counts only")
+    problems = compare(results, baseline, args.latency_threshold, args.throughput_threshold,
+                       args.latency_floor, timings)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print(f"✅ within thresholds of {baseline_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# benchmarks/sqlite_concurrency.py
+# Mixed read/write load against a throwaway SQLite file, once with the old
+# engine setup and once with the production profile from app/config.py:
+#   python benchmarks/sqlite_concurrency.py
+#   python benchmarks/sqlite_concurrency.py --writers 16 --readers 16 --seconds 10
+#
+# Writer threads POST /api/add-growth, reader threads GET /api/session (every
+# write invalidates that user's cached snapshot, so most reads hit the
+# database). Prints requests per second, latency and how many requests failed.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.config import Config
+from app.models import user_db, User, Plants
+
+
+class LegacyProfile(Config):
+    # what create_app() used to do: rollback journal, driver defaults, no retries, one pool
+    WTF_CSRF_ENABLED = False
+    READ_ROUTING = False
+    SQLITE_PRAGMAS = {}
+    SQLITE_BUSY_TIMEOUT = 5  # sqlite3.connect()'s own default timeout
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WRITE_RETRIES = 0
+
+
+class ProductionProfile(Config):
+    WTF_CSRF_ENABLED = False
+
+
+PROFILES = {'legacy': LegacyProfile, 'production': ProductionProfile}
+
+
+def build_app(profile, workdir, users):
+    path = os.path.join(workdir, f'{profile.__name__}.db')
+    config = type(profile.__name__, (profile,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                                                 'PHOTO_STORE_PATH': os.path.join(workdir, 'photos')})
+    app = create_app(config)
+    with app.app_context():
+        user_db.create_all()
+        password = generate_password_hash('benchmark', 'pbkdf2:sha256:1')
+        for n in range(users):
+            user = User(username=f'bench{n}', email=f'bench{n}@example.com', password=password)
+            user_db.session.add(user)
+            user_db.session.flush()
+            user_db.session.add(Plants(user_id=user.id, plant_name='Fern', plant_type='fern'))
+        user_db.session.commit()
+        ids = [user.id for user in User.query.order_by(User.id)]
+    return app, ids
+
+
+def run(app, user_ids, writers, readers, seconds):
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'write': [], 'read': []}  # (ok, seconds) per request
+
+    def worker(kind, n):
+        client = app.test_client()
+        user_id = user_ids[n % len(user_ids)]
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        day = date(2000, 1, 1) + timedelta(days=n * 100000)
+        timings = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            if kind == 'write':
+                day += timedelta(days=1)
+                response = client.post('/api/add-growth', json={
+                    'plant_name': 'Fern', 'date': day.isoformat(), 'height': 1.5})
+                ok = response.status_code == 201
+            else:
+                response = client.get('/api/session')
+                ok = response.status_code == 200
+            timings.append((ok, time.perf_counter() - started))
+        with lock:
+            results[kind].extend(timings)
+
+    threads = ([threading.Thread(target=worker, args=('write', n)) for n in range(writers)] +
+               [threading.Thread(target=worker, args=('read', n)) for n in range(readers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(timings, seconds):
+    ok = sorted(took for good, took in timings if good)
+    failed = len(timings) - len(ok)
+
+    def pct(p):
+        return ok[min(len(ok) - 1, int(len(ok) * p))] * 1000 if ok else 0.0
+
+    return (f'{len(ok) / seconds:8.1f} ok/s  p50 {pct(0.5):7.1f}ms  p99 {pct(0.99):7.1f}ms  '
+            f'failed {failed} of {len(timings)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite engine profiles under concurrent load')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--profile', choices=PROFILES, action='append',
+                        help='run only these profiles (default: all)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='plantly-bench-')
+    try:
+        for name in args.profile or PROFILES:
+            app, user_ids = build_app(PROFILES[name], workdir, args.users)
+            results = run(app, user_ids, args.writers, args.readers, args.seconds)
+            print(f'{name} ({args.writers} writers, {args.readers} readers, {args.seconds:g}s)')
+            print(f'  add-growth   {summarize(results["write"], args.seconds)}')
+            print(f'  session      {summarize(results["read"], args.seconds)}')
+            with app.app_context():
+                user_db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+# generate_data.py
+# Fills the database with synthetic users for load testing and benchmarks:
+#   python generate_data.py --users 10000
+#   python generate_data.py --users 50000 --growth 30 --watering 40 --seed 7
+# Every generated user can log in with --password (hashed once, shared by all).
+#
+# Rows are built with numpy and written with bulk Core INSERTs on a single
+# connection, committed every --chunk rows. Ids are handed out up front
+# (after whatever is already in the database), so child rows never read
+# anything back. Friends follow a power law: most people follow a few others,
+# a few popular accounts are followed by a large share of everyone. Shares
+# come with their "shared a plant with you!" notification, as in the app.
+# Friends feeds and unread counters are rebuilt at the end with one statement
+# each; the username search index is kept up by its triggers.
+#
+# Bulk rows skip the change log, which only matters to clients already holding
+# a sync cursor: fresh logins load the full snapshot anyway.
+
+import argparse
+import sys
+import time
+from datetime import date
+
+import numpy as np
+from sqlalchemy import func, insert, select, update
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.models import (user_db, User, UserSettings, FriendsList, Plants, Notification, SharedPlant,
+                        uploadedPics, FeedEntry, PlantGrowthEntry, PlantWaterEntry)
+
+# same categories and types as the add-plant form
+PLANT_OPTIONS = {
+    'flowers': ['Lavender', 'Daisy', 'Marigold', 'Petunia', 'Snapdragon', 'Geranium', 'Pansy'],
+    'herbs': ['Basil', 'Parsley', 'Mint', 'Oregano', 'Rosemary', 'Thyme', 'Chives', 'Coriander'],
+    'succulents': ['Aloe Vera', 'Jade Plant', 'Echeveria', 'Sedum', 'Haworthia', 'Crassula', 'Agave'],
+    'trees': ['Jacaranda', 'Paperbark Tree', 'Pine Tree', 'Maple Tree', 'Oak Tree', 'Lemon Tree', 'Fig Tree'],
+    'natives': ['Golden Wattle', 'Grevillea', 'Banksia', 'Kangaroo Paw', 'Eucalyptus', 'Waratah', 'Lilly Pilly'],
+    'grasses': ['Kangaroo Grass', 'Wallaby Grass', 'Lomandra', 'Buffalo Grass', 'Zoysia Grass', 'Tall Fescue'],
+}
+AVATARS = ['bush.jpg', 'cactus.jpg', 'cactus2.jpg', 'cactus 3.jpg', 'flower.jpg', 'houseplant.jpg',
+           'leaves.jpg', 'leaves 2.jpg', 'sapling.jpg', 'tree.jpg']
+ADJECTIVES = ['mossy', 'leafy', 'sunny', 'green', 'dewy', 'wild', 'happy', 'tiny', 'blooming', 'shady']
+NOUNS = ['fern', 'sprout', 'gardener', 'petal', 'root', 'seedling', 'thumb', 'bloom', 'vine', 'cactus']
+CAPTIONS = ['New leaf!', 'Looking healthy', 'First flower of the season', 'Repotted today', '', 'Growing fast']
+
+SPECIES = [(category, name) for category, names in PLANT_OPTIONS.items() for name in names]
+
+
+def _next_id(conn, column):
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _group_offsets(counts):
+    # position of every row within its group, for rows laid out group by group
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(counts.sum()) - starts
+
+
+def _dates(days):
+    return days.astype('datetime64[D]').astype(object).tolist()
+
+
+def _datetimes(seconds):
+    return seconds.astype('datetime64[s]').astype(object).tolist()
+
+
+class Writer:
+    def __init__(self, conn, chunk):
+        self.conn = conn
+        self.chunk = chunk
+        self.counts = {}
+
+    def insert(self, model, columns):
+        # columns: {name: list}, all the same length; one executemany per chunk
+        started = time.perf_counter()
+        names = list(columns)
+        rows = list(zip(*columns.values()))
+        for i in range(0, len(rows), self.chunk):
+            self.conn.execute(insert(model), [dict(zip(names, row)) for row in rows[i:i + self.chunk]])
+            self.conn.commit()
+        self.counts[model.__tablename__] = len(rows)
+        print(f"  {model.__tablename__:<20} {len(rows):>10,} rows  {time.perf_counter() - started:6.2f}s")
+
+
+def generate(conn, rng, users, plants, growth, watering, photos, friends, notifications,
+             password, chunk, today=None):
+    today = np.datetime64(today or date.today(), 'D')
+    out = Writer(conn, chunk)
+
+    # users
+    first_user = _next_id(conn, User.id)
+    user_ids = np.arange(first_user, first_user + users)
+    usernames = [f'{ADJECTIVES[a]}_{NOUNS[b]}{uid}' for a, b, uid in
+                 zip(rng.integers(len(ADJECTIVES), size=users).tolist(),
+                     rng.integers(len(NOUNS), size=users).tolist(), user_ids.tolist())]
+    last_login = today - rng.integers(0, 60, users)
+    out.insert(User, {
+        'id': user_ids.tolist(),
+        'username': usernames,
+        'email': [f'{name}@example.com' for name in usernames],
+        'password': [password] * users,
+        'last_login_date': _dates(last_login),
+        'login_streak': (rng.geometric(0.3, users) * (last_login == today)).tolist(),
+    })
+
+    private = user_ids[rng.random(users) < 0.1]
+    out.insert(UserSettings, {
+        'user_id': private.tolist(),
+        'is_profile_public': [False] * len(private),
+        'allow_friend_requests': [True] * len(private),
+    })
+
+    # plants, each user's plants numbered so names stay unique per user
+    per_user = rng.poisson(plants, users)
+    plant_count = int(per_user.sum())
+    first_plant = _next_id(conn, Plants.id)
+    plant_ids = np.arange(first_plant, first_plant + plant_count)
+    plant_owner = np.repeat(user_ids, per_user)
+    species = rng.integers(len(SPECIES), size=plant_count)
+    plant_names = [SPECIES[s][1] if n == 0 else f'{SPECIES[s][1]} {n + 1}'
+                   for s, n in zip(species.tolist(), _group_offsets(per_user).tolist())]
+    planted = today - rng.integers(30, 730, plant_count)
+    out.insert(Plants, {
+        'id': plant_ids.tolist(),
+        'user_id': plant_owner.tolist(),
+        'plant_name': plant_names,
+        'plant_type': [SPECIES[s][1].lower() for s in species.tolist()],
+        'plant_category': [SPECIES[s][0] for s in species.tolist()],
+        'chosen_image_url': [f'assets/Flower_Avatars/{AVATARS[a]}'
+                             for a in rng.integers(len(AVATARS), size=plant_count).tolist()],
+        'date_created': _datetimes(planted.astype('datetime64[s]')),
+    })
+
+    # histories: per plant a run of dates from when it was planted, dropping any past today
+    def history(mean, min_gap, max_gap):
+        counts = rng.poisson(mean, plant_count)
+        rows = np.repeat(np.arange(plant_count), counts)
+        gaps = rng.integers(min_gap, max_gap, len(rows))
+        # days since planting: running total of the gaps within each plant
+        totals = np.cumsum(gaps)
+        firsts = (np.cumsum(counts) - counts)[counts > 0]
+        offsets = totals - np.repeat(totals[firsts] - gaps[firsts], counts[counts > 0])
+        days = planted[rows] + offsets
+        keep = days <= today
+        return rows[keep], days[keep], offsets[keep]
+
+    rows, days, offsets = history(growth, 3, 15)
+    start_height = rng.uniform(1, 10, plant_count)
+    rate = rng.uniform(0.02, 0.4, plant_count)  # cm a day
+    heights = start_height[rows] + rate[rows] * offsets + rng.normal(0, 0.3, len(rows))
+    out.insert(PlantGrowthEntry, {
+        'user_id': plant_owner[rows].tolist(),
+        'plant_id': plant_ids[rows].tolist(),
+        'plant_name': [plant_names[i] for i in rows.tolist()],
+        'date_recorded': _dates(days),
+        'cm_grown': np.round(np.maximum(heights, 0.1), 1).tolist(),
+    })
+
+    rows, days, _ = history(watering, 1, 9)
+    out.insert(PlantWaterEntry, {
+        'user_id': plant_owner[rows].tolist(),
+        'plant_id': plant_ids[rows].tolist(),
+        'plant_name': [plant_names[i] for i in rows.tolist()],
+        'date_watered': _dates(days),
+        'ml_watered': (rng.integers(5, 50, len(rows)) * 10).astype(float).tolist(),
+    })
+
+    # photos, uploaded some time after planting
+    counts = rng.poisson(photos, plant_count)
+    rows = np.repeat(np.arange(plant_count), counts)
+    age = (today - planted[rows]).astype(np.int64) * 86400
+    uploaded = planted[rows].astype('datetime64[s]') + (rng.random(len(rows)) * age).astype(np.int64)
+    out.insert(uploadedPics, {
+        'user_id': plant_owner[rows].tolist(),
+        'plant_id': plant_ids[rows].tolist(),
+        'image_url': [f'assets/Flower_Avatars/{AVATARS[a]}' for a in rng.integers(len(AVATARS), size=len(rows)).tolist()],
+        'caption': [CAPTIONS[c] for c in rng.integers(len(CAPTIONS), size=len(rows)).tolist()],
+        'datetime_uploaded': _datetimes(uploaded),
+    })
+
+    # follows: Pareto out-degree with mean `friends`, targets picked in proportion to a
+    # Pareto popularity weight, so in-degree is heavy-tailed too
+    degree = np.minimum((rng.pareto(1.5, users) + 1) * friends / 3, users - 1).astype(np.int64)
+    popularity = rng.pareto(1.2, users) + 1
+    source = np.repeat(user_ids, degree)
+    target = rng.choice(user_ids, size=len(source), p=popularity / popularity.sum())
+    edges = np.unique(source * (first_user + users) + target)  # drops repeats
+    source, target = np.divmod(edges, first_user + users)
+    keep = source != target
+    out.insert(FriendsList, {
+        'user_id': source[keep].tolist(),
+        'friend_id': target[keep].tolist(),
+        'status': ['accepted'] * int(keep.sum()),
+    })
+
+    # shares, each with its notification; most of them read already
+    shares = int(notifications * users) if plant_count else 0
+    shared = rng.integers(plant_count, size=shares) if shares else np.array([], dtype=np.int64)
+    sender = plant_owner[shared]
+    receiver = rng.choice(user_ids, size=shares)
+    keep = sender != receiver
+    shared, sender, receiver = shared[keep], sender[keep], receiver[keep]
+    when = _datetimes(today.astype('datetime64[s]') - rng.integers(0, 90 * 86400, len(shared)))
+    out.insert(SharedPlant, {
+        'plant_id': plant_ids[shared].tolist(),
+        'shared_by': sender.tolist(),
+        'shared_with': receiver.tolist(),
+        'datetime_shared': when,
+    })
+    out.insert(Notification, {
+        'receiver_id': receiver.tolist(),
+        'sender_id': sender.tolist(),
+        'plant_id': plant_ids[shared].tolist(),
+        'message': [f'{usernames[s - first_user]} shared a plant with you!' for s in sender.tolist()],
+        'is_read': (rng.random(len(shared)) < 0.7).tolist(),
+        'timestamp': when,
+    })
+
+    # derived data the app normally keeps up on every write
+    started = time.perf_counter()
+    feed = (select(FriendsList.user_id, uploadedPics.user_id, uploadedPics.photo_id, uploadedPics.datetime_uploaded)
+            .join(uploadedPics, uploadedPics.user_id == FriendsList.friend_id)
+            .where(FriendsList.user_id >= first_user))
+    result = conn.execute(insert(FeedEntry).prefix_with('OR IGNORE')
+                          .from_select(['owner_id', 'author_id', 'photo_id', 'datetime_uploaded'], feed))
+    unread = (select(func.count()).where(Notification.receiver_id == User.id, Notification.is_read == False)
+              .scalar_subquery())
+    conn.execute(update(User).where(User.id >= first_user).values(unread_notifications=unread))
+    conn.commit()
+    out.counts[FeedEntry.__tablename__] = result.rowcount
+    print(f"  {'feeds + unread':<20} {result.rowcount:>10,} rows  {time.perf_counter() - started:6.2f}s")
+    return out.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic Plantly data for load testing')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--plants', type=float, default=3, help='mean plants per user')
+    parser.add_argument('--growth', type=float, default=20, help='mean growth entries per plant')
+    parser.add_argument('--watering', type=float, default=30, help='mean waterings per plant')
+    parser.add_argument('--photos', type=float, default=2, help='mean photos per plant')
+    parser.add_argument('--friends', type=float, default=10, help='mean people each user follows')
+    parser.add_argument('--notifications', type=float, default=5, help='mean shares received per user')
+    parser.add_argument('--password', default='password', help='password for every generated user')
+    parser.add_argument('--chunk', type=int, default=20000, help='rows per INSERT and commit')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--config', default=None, help='config profile, defaults to PLANTLY_CONFIG')
+    args = parser.parse_args()
+    if args.users < 2:
+        parser.error('--users must be at least 2')
+
+    app = create_app(args.config)
+    rng = np.random.default_rng(args.seed)
+    password = generate_password_hash(args.password, app.config['PASSWORD_HASH_METHOD'])
+
+    started = time.perf_counter()
+    with app.app_context():
+        user_db.create_all()
+        with user_db.engine.connect() as conn:
+            # throwaway data, a crash part way through isn't worth an fsync per chunk
+            if conn.dialect.name == 'sqlite':
+                synchronous = conn.exec_driver_sql('PRAGMA synchronous').scalar()
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+            print(f"Generating {args.users:,} users into {user_db.engine.url.render_as_string(hide_password=True)}")
+            counts = generate(conn, rng, args.users, args.plants, args.growth, args.watering, args.photos,
+                              args.friends, args.notifications, password, args.chunk)
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql(f'PRAGMA synchronous = {synchronous}')
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    print(f"✅ {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), "
+          f"log in as any generated user with password '{args.password}'")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
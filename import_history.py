@@ -0,0 +1,44 @@
+# import_history.py
+# Loads growth or watering history for one user from a CSV or NDJSON file:
+#   python import_history.py <username> growth measurements.csv
+#   python import_history.py <username> watering waterings.txt --format ndjson
+# Same rules as POST /api/import/<kind>: bad lines are reported, not fatal.
+
+import argparse
+import sys
+
+from app import create_app
+from app.models import User
+from app.importer import import_rows, read_rows, guess_format, KINDS, FORMATS
+
+parser = argparse.ArgumentParser(description='Import growth or watering history from CSV or NDJSON')
+parser.add_argument('username')
+parser.add_argument('kind', choices=KINDS)
+parser.add_argument('path')
+parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension')
+args = parser.parse_args()
+
+fmt = args.format or guess_format(args.path)
+if fmt is None:
+    parser.error(f"can't tell the format of {args.path}, pass --format")
+
+app = create_app()
+
+with app.app_context():
+    user = User.query.filter_by(username=args.username).first()
+    if not user:
+        print(f"❌ no user called {args.username}")
+        sys.exit(1)
+
+    with open(args.path, 'rb') as f:
+        report = import_rows(user.id, args.kind, read_rows(f, fmt))
+
+    for err in report['errors']:
+        print(f"line {err['line']}: {err['error']}")
+    if report['error_count'] > len(report['errors']):
+        print(f"... and {report['error_count'] - len(report['errors'])} more errors")
+    print(f"✅ imported {report['inserted']} {args.kind} rows, "
+          f"skipped {report['duplicates']} duplicates, {report['error_count']} errors")
+    if 'stopped_at' in report:
+        print(f"⚠️ stopped at line {report['stopped_at']}, run it again to import the rest")
+        sys.exit(1)
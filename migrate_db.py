@@ -0,0 +1,57 @@
+# migrate_db.py
+# Brings an existing database up to the current schema in place:
+#   python migrate_db.py           apply pending migrations, fill in plant ids and move inline photos to the blob store
+#   python migrate_db.py --check   also verify the hot queries use their indexes
+
+import sys
+
+from app import create_app
+from app.models import user_db, uploadedPics
+from app.migrations import upgrade, current_version, check_query_plans, backfill_plant_ids
+from app.blobstore import blob_store, blob_url, BlobError
+
+app = create_app()
+
+with app.app_context():
+    user_db.create_all()  # tables added since the database was created
+
+    for version, description in upgrade(user_db.engine):
+        print(f"applied migration {version}: {description}")
+
+    # growth/watering rows from before plant ids, a batch per transaction
+    for table, (filled, missing) in backfill_plant_ids(user_db.engine).items():
+        if filled:
+            print(f"linked {filled} {table} rows to their plant")
+        if missing:
+            print(f"⚠️ {missing} {table} rows belong to plants that were deleted, left without a plant_id")
+
+    # photos uploaded before the blob store kept the whole data URL in the row
+    moved, last_id = 0, 0
+    while True:
+        batch = (uploadedPics.query
+                 .filter(uploadedPics.image_url.like('data:%'), uploadedPics.photo_id > last_id)
+                 .order_by(uploadedPics.photo_id).limit(100).all())
+        if not batch:
+            break
+        for pic in batch:
+            last_id = pic.photo_id
+            try:
+                pic.blob_key, _ = blob_store.put_data_url(pic.image_url)
+                pic.image_url = blob_url(pic.blob_key)
+                moved += 1
+            except BlobError as e:
+                print(f"⚠️ photo {pic.photo_id} left inline: {e}")
+        user_db.session.commit()
+    if moved:
+        print(f"moved {moved} inline photos to the blob store")
+
+    with user_db.engine.connect() as conn:
+        print(f"schema version {current_version(conn)}")
+
+        if '--check' in sys.argv:
+            failures = check_query_plans(conn)
+            for name, plan in failures:
+                print(f"❌ {name} is not using its index: {' / '.join(plan)}")
+            if failures:
+                sys.exit(1)
+            print("✅ all hot queries use their indexes")
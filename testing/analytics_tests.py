@@ -0,0 +1,110 @@
+#the NumPy maths behind the chart and watering endpoints, called directly
+
+import numpy as np
+import pytest
+
+from app.analytics import lttb, rollup, moving_average, growth_rate, watering_intervals
+
+
+def days(*values):
+    return np.array(values, dtype='datetime64[D]')
+
+
+def test_empty_series():
+    empty_days, empty = days(), np.array([], dtype=float)
+    assert all(len(column) == 0 for column in rollup(empty_days, empty, 'week').values())
+    assert len(moving_average(empty_days, empty, 7)) == 0
+    assert len(growth_rate(empty_days, empty)) == 0
+    assert len(lttb(empty, empty, 3)) == 0
+    assert watering_intervals(np.array([], dtype='int64'), empty_days, {}) == {}
+
+
+def test_single_point():
+    one_day, one = days('2025-03-04'), np.array([5.0])
+    buckets = rollup(one_day, one, 'month')
+    assert [str(s) for s in buckets['start']] == ['2025-03-01']
+    assert (buckets['count'].tolist(), buckets['mean'].tolist(), buckets['last'].tolist()) == ([1], [5.0], [5.0])
+    assert moving_average(one_day, one, 7).tolist() == [5.0]
+    assert np.isnan(growth_rate(one_day, one)).all()
+    assert lttb(np.array([0]), one, 3).tolist() == [0]
+
+
+@pytest.mark.parametrize('threshold', [10, 11, 500])
+def test_lttb_keeps_everything_when_asked_for_as_many_points(threshold):
+    x = np.arange(10)
+    assert lttb(x, np.sin(x), threshold).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize('n, threshold', [(11, 3), (100, 7), (1000, 300)])
+def test_lttb_keeps_the_ends(n, threshold):
+    x = np.arange(n)
+    keep = lttb(x, np.random.default_rng(n).normal(size=n), threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()  # in order, no point twice
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(100)
+    y[42] = 50
+    assert 42 in lttb(np.arange(100), y, 10)
+
+
+def test_week_buckets_start_on_monday():
+    # Sun 5 Jan, Mon 6 Jan, Sun 12 Jan, Mon 13 Jan; Wed 1 Jan 2025 is in the week of Mon 30 Dec 2024
+    series = days('2025-01-01', '2025-01-05', '2025-01-06', '2025-01-12', '2025-01-13')
+    buckets = rollup(series, np.array([1.0, 2.0, 3.0, 4.0, 5.0]), 'week')
+    assert [str(s) for s in buckets['start']] == ['2024-12-30', '2025-01-06', '2025-01-13']
+    assert buckets['count'].tolist() == [2, 2, 1]
+    assert buckets['mean'].tolist() == [1.5, 3.5, 5.0]
+    assert buckets['last'].tolist() == [2.0, 4.0, 5.0]
+
+
+def test_month_buckets_split_on_the_first():
+    series = days('2024-02-29', '2025-01-31', '2025-02-01', '2025-02-28', '2025-03-01')
+    buckets = rollup(series, np.array([1.0, 2.0, 3.0, 7.0, 4.0]), 'month')
+    assert [str(s) for s in buckets['start']] == ['2024-02-01', '2025-01-01', '2025-02-01', '2025-03-01']
+    assert buckets['count'].tolist() == [1, 1, 2, 1]
+    assert (buckets['min'].tolist(), buckets['max'].tolist()) == ([1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 7.0, 4.0])
+
+
+def test_moving_average_uses_calendar_days():
+    # the 7 day window ending on the 10th starts on the 4th, so the 1st has dropped out
+    series = days('2025-01-01', '2025-01-02', '2025-01-10')
+    assert moving_average(series, np.array([2.0, 4.0, 9.0]), 7).tolist() == [2.0, 3.0, 9.0]
+
+
+def test_growth_rate_per_day():
+    rate = growth_rate(days('2025-01-01', '2025-01-03', '2025-01-04'), np.array([1.0, 2.0, 5.0]))
+    assert np.isnan(rate[0]) and rate[1:].tolist() == [0.5, 3.0]
+
+
+def waterings(*per_plant):
+    # {plant_id: [day, ...]} sorted the way watering_series returns them
+    pairs = sorted((plant, np.datetime64(day, 'D')) for plant, dates in per_plant for day in dates)
+    return (np.array([p for p, _ in pairs], dtype='int64'), np.array([d for _, d in pairs]),
+            {plant: f'Plant {plant}' for plant, _ in per_plant})
+
+
+def test_interval_median_even_and_odd():
+    stats = watering_intervals(*waterings(
+        (1, ['2025-01-01', '2025-01-02', '2025-01-05']),                # 1, 3
+        (2, ['2025-01-01', '2025-01-02', '2025-01-07', '2025-01-09']),  # 1, 5, 2
+    ))
+    assert stats[1]['median_interval_days'] == 2.0
+    assert stats[2]['median_interval_days'] == 2.0
+    assert (stats[2]['min_interval_days'], stats[2]['max_interval_days']) == (1.0, 5.0)
+    assert stats[2]['mean_interval_days'] == round(8 / 3, 2)
+    assert stats[1]['next_watering'] == '2025-01-07'
+
+
+def test_same_day_waterings_count_once():
+    stats = watering_intervals(*waterings(
+        (1, ['2025-01-01', '2025-01-01', '2025-01-04', '2025-01-04', '2025-01-07']),
+        (2, ['2025-01-03', '2025-01-03']),
+    ))
+    assert stats[1]['waterings'] == 3
+    assert stats[1]['median_interval_days'] == 3.0 and stats[1]['interval_cv'] == 0.0
+    assert stats[2]['waterings'] == 1
+    assert stats[2]['median_interval_days'] is None and stats[2]['next_watering'] is None
+    assert stats[2]['last_watered'] == '2025-01-03'
@@ -0,0 +1,54 @@
+#in-process caches next to other worker processes: a write that never called
+#invalidate() here (as if another process made it) still shows on the next read
+
+from datetime import date
+
+from app.cache import snapshot_cache, watering_cache, directory_cache
+from app.models import user_db, User, Plants, PlantWaterEntry
+
+
+def elsewhere(*rows):
+    #written and committed without touching this process's caches
+    user_db.session.add_all(rows)
+    user_db.session.commit()
+
+
+def test_session_sees_another_process_write(client, make_user, log_in):
+    user = make_user('cached', plants=1)
+    log_in(client, user)
+    client.get('/api/session')
+    assert snapshot_cache.stats()['entries'] == 1
+
+    elsewhere(Plants(user_id=user.id, plant_name='Basil', plant_type='herb', chosen_image_url='basil.png',
+                     plant_category='Indoor'))
+    plants = client.get('/api/session').get_json()['plants']
+    assert sorted(p['plant_name'] for p in plants) == ['Basil', 'Plant 0']
+
+    hits = snapshot_cache.stats()['hits']
+    client.get('/api/session')
+    assert snapshot_cache.stats()['hits'] == hits + 1
+
+
+def test_watering_stats_see_another_process_write(client, make_user, log_in):
+    user = make_user('cached', plants=2)
+    log_in(client, user)
+    plant = Plants.query.filter_by(user_id=user.id).order_by(Plants.id).first()
+    client.get('/api/watering/analytics')
+
+    elsewhere(PlantWaterEntry(user_id=user.id, plant_id=plant.id, plant_name=plant.plant_name,
+                              date_watered=date(2025, 1, 10), ml_watered=100))
+    recomputed = watering_cache.stats()['recomputed']
+    plants = {p['plant_id']: p for p in client.get('/api/watering/analytics').get_json()['plants']}
+    assert plants[plant.id]['waterings'] == 4
+    assert watering_cache.stats()['recomputed'] == recomputed + 1  # just that plant
+
+
+def test_directory_sees_another_process_register(client, make_user, log_in):
+    log_in(client, make_user('cached'))
+    assert client.get('/api/users').get_json()['users'] == []
+
+    newcomer = User(username='newcomer', email='newcomer@example.com', password='x')
+    elsewhere(newcomer)
+    users = client.get('/api/users').get_json()['users']
+    assert users == [{'user_id': newcomer.id, 'username': 'newcomer'}]
+    assert directory_cache.stats()['misses'] == 2
@@ -1,15 +1,18 @@
-#very basic setup for testing
-# NOT TO BE USED IN FINAL OR SUBMITTED LIKE THIS!!!!!!!!!!!!
+#config for the tests, used by testing/conftest.py
+#builds on the app's own test profile (app/config.py): in-memory database,
+#CSRF off, cheap password hashes, quiet logs
 
+from app.config import TestConfig as AppTestConfig
 
-class TestConfig:
+
+class TestConfig(AppTestConfig):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory DB
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory DB, one per test process
     WTF_CSRF_ENABLED = False #should also have tests where this is true
     SECRET_KEY = 'test_secret'
 
 
-#How to get started: 
-#may need to install FACTORY - as seen in the lectures
-# pip install pytest flask-testing
-# pytest tests/ (to run all current tests - Note they probably won't work at this stage in time)
\ No newline at end of file
+#How to get started:
+# pip install pytest pytest-xdist
+# python -m pytest                (from the repo root, runs everything in testing/)
+# python -m pytest -n auto        (spread over one process per CPU)
@@ -0,0 +1,157 @@
+# Shared pytest fixtures.
+#
+# The schema is built once per test process. Every test then runs inside one
+# outer transaction on that database; user_db.session joins it with
+# join_transaction_mode='create_savepoint', so a route's commit() only
+# releases a savepoint and the whole test is rolled back at the end. Tests
+# start from empty tables without create_all/drop_all each time.
+#
+# Each process has its own in-memory database and photo directory, so the
+# suite can be split across processes with pytest-xdist (python -m pytest -n auto).
+#
+# assert_max_queries(n) fails a test when the block runs more than n SQL
+# statements, listing them, to catch N+1 queries:
+#   def test_friends(client, assert_max_queries):
+#       with assert_max_queries(2):
+#           client.get('/api/friends')
+#
+# make_user(username, plants=, friends=) adds a user (password 'password') with
+# plants, growth/watering history, photos and friends; log_in(client, user)
+# puts them in the client's session.
+
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.cache import snapshot_cache, watering_cache, directory_cache
+from app.models import (user_db, User, Plants, FriendsList, PlantGrowthEntry, PlantWaterEntry,
+                        uploadedPics, Notification)
+from testing.config import TestConfig
+
+# transaction control the harness itself adds, not counted against a budget
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def _use_sqlite_savepoints(engine):
+    # pysqlite opens and commits transactions on its own, which breaks SAVEPOINT;
+    # let SQLAlchemy emit BEGIN instead (see the SQLAlchemy pysqlite docs)
+    @event.listens_for(engine, 'connect')
+    def no_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+@pytest.fixture(scope='session')
+def _app(tmp_path_factory):
+    # tmp_path_factory is per xdist worker, so photo files never collide
+    config = type('TestConfig', (TestConfig,), {'PHOTO_STORE_PATH': str(tmp_path_factory.mktemp('photos'))})
+    app = create_app(config)
+    with app.app_context():
+        _use_sqlite_savepoints(user_db.engine)
+        user_db.create_all()
+    yield app
+    with app.app_context():
+        user_db.session.remove()
+        user_db.engine.dispose()
+
+
+@pytest.fixture
+def app(_app):
+    with _app.app_context():
+        connection = user_db.engine.connect()
+        transaction = connection.begin()
+        user_db.session.remove()
+        user_db.session.configure(bind=connection, join_transaction_mode='create_savepoint')
+        # the caches are process-wide and would remember rows from earlier tests
+        snapshot_cache.clear()
+        watering_cache.clear()
+        directory_cache.clear()
+        try:
+            yield _app
+        finally:
+            user_db.session.remove()
+            user_db.session.configure(bind=None)
+            transaction.rollback()
+            connection.close()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def assert_max_queries(app):
+    engine = user_db.engine
+
+    @contextmanager
+    def budget(n):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+                statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        if len(statements) > n:
+            listing = '\n'.join(f'  {i}. ' + ' '.join(sql.split()) for i, sql in enumerate(statements, 1))
+            pytest.fail(f'expected at most {n} queries, ran {len(statements)}:\n{listing}', pytrace=False)
+
+    return budget
+
+
+@pytest.fixture
+def make_user(app):
+    password = generate_password_hash('password', app.config['PASSWORD_HASH_METHOD'])
+
+    def make(username, plants=0, friends=0):
+        # `plants` plants, each with a few days of history and a photo, and `friends` accepted friends
+        user = User(username=username, email=f'{username}@example.com', password=password)
+        user_db.session.add(user)
+        user_db.session.flush()
+        for n in range(plants):
+            plant = Plants(user_id=user.id, plant_name=f'Plant {n}', plant_type='fern',
+                           chosen_image_url='fern.png', plant_category='Indoor')
+            user_db.session.add(plant)
+            user_db.session.flush()
+            for day in range(3):
+                when = date(2025, 1, 1) + timedelta(days=day)
+                user_db.session.add(PlantGrowthEntry(user_id=user.id, plant_id=plant.id, plant_name=plant.plant_name,
+                                                     date_recorded=when, cm_grown=1.0 + day))
+                user_db.session.add(PlantWaterEntry(user_id=user.id, plant_id=plant.id, plant_name=plant.plant_name,
+                                                    date_watered=when, ml_watered=200))
+            user_db.session.add(uploadedPics(user_id=user.id, plant_id=plant.id,
+                                             image_url='/static/images/fern.png', caption='new leaf'))
+        for n in range(friends):
+            friend = User(username=f'{username}-friend{n}', email=f'{username}-friend{n}@example.com',
+                          password=password)
+            user_db.session.add(friend)
+            user_db.session.flush()
+            user_db.session.add(FriendsList(user_id=user.id, friend_id=friend.id, status='accepted'))
+            user_db.session.add(FriendsList(user_id=friend.id, friend_id=user.id, status='accepted'))
+            user_db.session.add(Notification(receiver_id=user.id, sender_id=friend.id,
+                                             message=f'{friend.username} added you as a friend'))
+        user_db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def log_in():
+    def log_in(client, user):
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+            sess['username'] = user.username
+    return log_in
@@ -0,0 +1,30 @@
+#the paged user directory (/api/users)
+
+import pytest
+
+
+@pytest.fixture
+def listed(client, make_user, log_in):
+    user = make_user('fernando', friends=1)  # fernando-friend0
+    for name in ('Fern', 'ferny', 'bracken', 'Maidenhair-fern'):
+        make_user(name)
+    log_in(client, user)
+    return user
+
+
+def test_directory_pages(client, listed):
+    seen, cursor = [], None
+    while True:
+        body = client.get('/api/users', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})}).get_json()
+        seen += [u['username'] for u in body['users']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert seen == ['bracken', 'Fern', 'fernando-friend0', 'ferny', 'Maidenhair-fern']
+
+    body = client.get('/api/users?prefix=FER').get_json()
+    assert [u['username'] for u in body['users']] == ['Fern', 'fernando-friend0', 'ferny']
+
+
+def test_directory_rejects_a_bad_cursor(client, listed):
+    assert client.get('/api/users?cursor=nonsense').status_code == 400
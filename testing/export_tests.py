@@ -0,0 +1,39 @@
+#account export: the download's filename and what comes back in it
+
+import json
+from datetime import date
+from urllib.parse import unquote
+
+import pytest
+
+
+def disposition(response):
+    header = response.headers['Content-Disposition']
+    header.encode('latin-1')  # what the server has to send it as
+    params = dict(part.strip().split('=', 1) for part in header.split(';')[1:])
+    assert params['filename*'].startswith("UTF-8''")
+    return params['filename'].strip('"'), unquote(params['filename*'][len("UTF-8''"):])
+
+
+@pytest.mark.parametrize('username, simple', [
+    ('grower', 'plantly-grower-{today}.ndjson'),
+    ('植物', 'plantly-{id}-{today}.ndjson'),
+    ('a"b', 'plantly-{id}-{today}.ndjson'),
+])
+def test_filename(client, make_user, log_in, username, simple):
+    user = make_user(username, plants=1)
+    log_in(client, user)
+
+    response = client.get('/api/export')
+    assert response.status_code == 200
+    assert disposition(response) == (simple.format(id=user.id, today=date.today()),
+                                      f'plantly-{username}-{date.today()}.ndjson')
+    sections = [json.loads(line)['section'] for line in response.get_data(as_text=True).splitlines()]
+    assert sections.count('plants') == 1 and sections.count('growth_entries') == 3
+
+
+def test_csv_filename_names_the_section(client, make_user, log_in):
+    user = make_user('植物', plants=1)
+    log_in(client, user)
+    response = client.get('/api/export?format=csv&section=growth_entries')
+    assert disposition(response)[1] == f'plantly-植物-{date.today()}-growth_entries.csv'
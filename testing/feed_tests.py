@@ -0,0 +1,97 @@
+#the materialized friends feed: photos fan out to followers when they are saved,
+#following backfills recent ones, unfollowing and deleting take them back out
+
+from datetime import datetime, timedelta
+
+from app.feed import backfill_follow
+from app.models import user_db, FeedEntry, Plants, uploadedPics
+
+
+def follow(client, log_in, follower, author):
+    log_in(client, follower)
+    assert client.post('/api/add-friend', json={'username': author.username}).status_code == 201
+
+
+def friends_feed(client, log_in, user):
+    log_in(client, user)
+    return [post['photo_id'] for post in client.get('/api/update-social').get_json()['friends_posts']]
+
+
+def photos_of(user):
+    return [p.photo_id for p in uploadedPics.query.filter_by(user_id=user.id)
+            .order_by(uploadedPics.datetime_uploaded.desc(), uploadedPics.photo_id.desc())]
+
+
+def post_photo(client, log_in, author):
+    log_in(client, author)
+    plant = Plants.query.filter_by(user_id=author.id).first()
+    response = client.post('/api/add-photo', json={'plant_id': plant.id, 'image_url': '/static/images/fern.png'})
+    return response.get_json()['photo_id']
+
+
+def test_new_photo_fans_out_to_followers(client, make_user, log_in):
+    author = make_user('author', plants=1)
+    fans = [make_user('fan'), make_user('fan2')]
+    stranger = make_user('stranger')
+    for fan in fans:
+        follow(client, log_in, fan, author)
+
+    photo_id = post_photo(client, log_in, author)
+    assert FeedEntry.query.filter_by(photo_id=photo_id).count() == 2
+    for fan in fans:
+        assert friends_feed(client, log_in, fan)[0] == photo_id
+    assert friends_feed(client, log_in, stranger) == []
+    assert friends_feed(client, log_in, author) == []  # your own photos aren't in your friends feed
+
+
+def test_follow_backfills_recent_photos(client, make_user, log_in):
+    author = make_user('author', plants=3)
+    fan = make_user('fan')
+    follow(client, log_in, fan, author)
+    assert sorted(friends_feed(client, log_in, fan)) == sorted(photos_of(author))
+
+    #following again is a no-op, not a second copy
+    assert client.post('/api/add-friend', json={'username': 'author'}).status_code == 200
+    assert FeedEntry.query.filter_by(owner_id=fan.id).count() == 3
+
+
+def test_backfill_takes_only_the_newest(app, make_user):
+    author = make_user('author', plants=4)
+    fan = make_user('fan')
+    start = datetime(2025, 1, 1)
+    for n, photo in enumerate(uploadedPics.query.filter_by(user_id=author.id).order_by(uploadedPics.photo_id)):
+        photo.datetime_uploaded = start + timedelta(days=n)
+    user_db.session.commit()
+
+    backfill_follow(fan.id, author.id, limit=2)
+    backfilled = [e.photo_id for e in FeedEntry.query.filter_by(owner_id=fan.id)
+                  .order_by(FeedEntry.datetime_uploaded.desc())]
+    assert backfilled == photos_of(author)[:2]
+
+
+def test_unfollow_removes_only_that_author(client, make_user, log_in):
+    author, other = make_user('author', plants=2), make_user('other', plants=1)
+    fan = make_user('fan')
+    follow(client, log_in, fan, author)
+    follow(client, log_in, fan, other)
+
+    assert client.post('/api/remove-friend', json={'friend_id': author.id}).status_code == 200
+    assert friends_feed(client, log_in, fan) == photos_of(other)
+
+    #and nothing new arrives from them
+    post_photo(client, log_in, author)
+    assert friends_feed(client, log_in, fan) == photos_of(other)
+
+
+def test_deleted_photos_leave_every_feed(client, make_user, log_in):
+    author = make_user('author', plants=2)
+    fans = [make_user('fan'), make_user('fan2')]
+    for fan in fans:
+        follow(client, log_in, fan, author)
+
+    log_in(client, author)
+    gone, kept = Plants.query.filter_by(user_id=author.id).order_by(Plants.id).all()
+    assert client.post('/api/delete-plant', json={'plant_id': gone.id}).status_code == 200
+    for fan in fans:
+        assert friends_feed(client, log_in, fan) == photos_of(author)
+    assert [p.plant_id for p in uploadedPics.query.filter_by(user_id=author.id)] == [kept.id]
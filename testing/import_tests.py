@@ -0,0 +1,127 @@
+#history import: CSV and NDJSON uploads, and what happens to lines that can't go in
+
+import io
+import json
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import importer
+from app.importer import import_rows, read_rows
+from app.models import Plants, PlantGrowthEntry, PlantWaterEntry
+
+
+def first_plant(user):
+    return Plants.query.filter_by(user_id=user.id).order_by(Plants.id).first()
+
+
+def upload(client, kind, body, fmt):
+    return client.post(f'/api/import/{kind}?format={fmt}', data=body,
+                       content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+
+
+def test_csv_import(client, make_user, log_in):
+    user = make_user('importer', plants=1)
+    log_in(client, user)
+    plant = first_plant(user)
+    body = f'plant_id,date,height\n{plant.id},2025-02-01,4\n{plant.id},2025-02-02,5.5\n'
+
+    response = upload(client, 'growth', body.encode(), 'csv')
+    assert response.status_code == 200
+    assert response.get_json() == {'inserted': 2, 'duplicates': 0, 'error_count': 0, 'errors': []}
+    assert PlantGrowthEntry.query.filter_by(plant_id=plant.id).count() == 5
+
+
+def test_ndjson_import(client, make_user, log_in):
+    user = make_user('importer', plants=1)
+    log_in(client, user)
+    plant = first_plant(user)
+    lines = [{'plant_id': plant.id, 'date': '2025-02-01', 'ml': 150},
+             {'plant_name': plant.plant_name, 'date': '2025-02-02'},
+             {'plant_id': plant.id, 'date': '2025-01-01', 'ml': 200}]  # already stored
+    body = '\n'.join(json.dumps(line) for line in lines).encode()
+
+    report = upload(client, 'watering', body, 'ndjson').get_json()
+    assert (report['inserted'], report['duplicates'], report['error_count']) == (2, 1, 0)
+    assert PlantWaterEntry.query.filter_by(plant_id=plant.id).count() == 5
+
+
+@pytest.mark.parametrize('row, error', [
+    ({'plant_id': True, 'date': '2025-02-01', 'height': 1}, 'Invalid plant_id: True'),
+    ({'plant_id': 1.5, 'date': '2025-02-01', 'height': 1}, 'Invalid plant_id: 1.5'),
+    ({'plant_id': '1.0', 'date': '2025-02-01', 'height': 1}, 'Invalid plant_id: 1.0'),
+    ({'plant_id': 999, 'date': '2025-02-01', 'height': 1}, 'Unknown plant_id: 999'),
+    ({'plant_id': '{id}', 'date': '01/02/2025', 'height': 1}, 'Invalid date: 01/02/2025. Use YYYY-MM-DD'),
+    ({'plant_id': '{id}', 'date': '2025-02-01', 'height': -1}, 'Invalid number: -1.0'),
+    ({'plant_id': '{id}', 'date': '2025-02-01', 'height': True}, 'Invalid number: True'),
+])
+def test_bad_row_is_reported_and_skipped(client, make_user, log_in, row, error):
+    user = make_user('importer', plants=1)
+    log_in(client, user)
+    plant = first_plant(user)
+    if row['plant_id'] == '{id}':
+        row['plant_id'] = plant.id
+    good = {'plant_id': plant.id, 'date': '2025-03-01', 'height': 2}
+    body = f'{json.dumps(row)}\n{json.dumps(good)}\n'.encode()
+
+    report = upload(client, 'growth', body, 'ndjson').get_json()
+    assert report['inserted'] == 1
+    assert report['errors'] == [{'line': 1, 'error': error}]
+
+
+def test_malformed_csv_line_does_not_stop_the_import(client, make_user, log_in):
+    user = make_user('importer', plants=1)
+    log_in(client, user)
+    plant = first_plant(user)
+    huge = 'x' * 200_000  # over the csv module's field size limit
+    body = f'plant_id,date,height\n{plant.id},2025-02-01,{huge}\n{plant.id},2025-02-02,3\n'
+
+    report = upload(client, 'growth', body.encode(), 'csv').get_json()
+    assert report['inserted'] == 1
+    assert report['errors'][0]['line'] == 2
+    assert report['errors'][0]['error'].startswith('Malformed CSV')
+
+
+def test_bad_encoding_keeps_what_was_read(client, make_user, log_in):
+    user = make_user('importer', plants=1)
+    log_in(client, user)
+    plant = first_plant(user)
+    body = f'plant_id,date,height\n{plant.id},2025-02-01,4\n'.encode() + b'\xff\xfe,2025-02-02,5\n'
+
+    report = upload(client, 'growth', body, 'csv').get_json()
+    assert report['error_count'] == 1
+    assert 'not valid UTF-8' in report['errors'][0]['error']
+    assert 'stopped_at' in report
+
+
+def test_database_error_returns_the_partial_report(app, make_user, monkeypatch):
+    user = make_user('importer', plants=1)
+    plant = first_plant(user)
+    rows = [(n, {'plant_id': str(plant.id), 'date': f'2025-02-{n:02}', 'height': '1'}) for n in range(1, 7)]
+    insert_batch = importer._insert_batch
+    calls = []
+
+    def fail_second_batch(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OperationalError('INSERT', {}, Exception('disk I/O error'))
+        return insert_batch(*args)
+
+    monkeypatch.setattr(importer, '_insert_batch', fail_second_batch)
+    report = import_rows(user.id, 'growth', rows, batch_size=2)
+    assert report['inserted'] == 2
+    assert report['stopped_at'] == 3
+    assert report['errors'] == [{'line': 3, 'error': 'Database error, nothing from this line on was imported: '
+                                                     'disk I/O error'}]
+    assert len(calls) == 2  # didn't go on with the third batch
+    assert PlantGrowthEntry.query.filter_by(plant_id=plant.id).count() == 5
+
+    #sending it again picks up where it stopped
+    monkeypatch.setattr(importer, '_insert_batch', insert_batch)
+    report = import_rows(user.id, 'growth', rows, batch_size=2)
+    assert (report['inserted'], report['duplicates']) == (4, 2)
+
+
+def test_read_rows_csv_line_numbers():
+    body = io.BytesIO(b'\xef\xbb\xbfplant_name,date\nFern,2025-01-01\n\nFern,2025-01-02\n')
+    assert [line for line, _ in read_rows(body, 'csv')] == [2, 4]
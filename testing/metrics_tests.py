@@ -0,0 +1,39 @@
+#/metrics: who may read it, and SQL timing that survives a failing statement
+
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.metrics import metrics
+from app.models import user_db
+
+
+@pytest.mark.parametrize('url', ['/metrics', '/api/cache-stats'])
+def test_only_served_to_this_host(client, url):
+    assert client.get(url).status_code == 200
+    assert client.get(url, environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 404
+    #through a proxy on this host
+    assert client.get(url, headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 404
+
+
+def test_public_when_configured(app, client):
+    app.config['METRICS_PUBLIC'] = True
+    try:
+        assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 200
+    finally:
+        app.config['METRICS_PUBLIC'] = False
+
+
+def test_failed_statement_does_not_skew_the_next_one(app):
+    with app.test_request_context('/api/session'):
+        metrics._start()
+        with pytest.raises(OperationalError):
+            user_db.session.execute(text('SELECT * FROM no_such_table'))
+        user_db.session.rollback()
+        user_db.session.execute(text('SELECT 1'))
+
+        #the harness's own SAVEPOINTs are counted as well, leave them out
+        counted = {sql: n for sql, n in g.metrics_statements.items() if 'SAVEPOINT' not in sql}
+        assert counted == {'SELECT * FROM no_such_table': 1, 'SELECT 1': 1}
+        assert g.metrics_sql_seconds < 1
@@ -0,0 +1,133 @@
+#notifications: dismissing one or many with real ids, the ones sharing a plant sends,
+#and the SSE stream delivering them
+
+import json
+
+import pytest
+
+from app.models import user_db, Notification, Plants, SharedPlant
+
+
+def test_dismiss_many(client, make_user, log_in):
+    user = make_user('reader', friends=3)
+    log_in(client, user)
+    ids = [n.id for n in Notification.query.filter_by(receiver_id=user.id)]
+
+    response = client.post('/api/notifications/dismiss', json={'ids': ids[:2]})
+    assert response.status_code == 200
+    assert response.get_json()['dismissed'] == 2
+    assert [n.id for n in Notification.query.filter_by(receiver_id=user.id)] == ids[2:]
+
+
+def test_dismiss_one_the_old_way(client, make_user, log_in):
+    user = make_user('reader', friends=1)
+    log_in(client, user)
+    notification = Notification.query.filter_by(receiver_id=user.id).one()
+
+    response = client.post('/api/dismiss-notification', json={'notification_id': notification.id})
+    assert response.get_json()['dismissed'] == 1
+
+
+@pytest.mark.parametrize('body', [
+    {'ids': []},
+    {'ids': 'abc'},
+    {'ids': 7},
+    {'ids': [1, True]},
+    {'ids': [1.5]},
+    {'ids': ['1']},
+    {'ids': [None]},
+    {'notification_id': 'x'},
+    {},
+])
+def test_dismiss_rejects_anything_but_int_ids(client, make_user, log_in, body):
+    user = make_user('reader', friends=1)
+    log_in(client, user)
+    response = client.post('/api/notifications/dismiss', json=body)
+    assert response.status_code == 400
+    assert Notification.query.filter_by(receiver_id=user.id).count() == 1
+
+
+def test_share_plant_notifies_the_recipient(client, make_user, log_in):
+    friend = make_user('friend')
+    user = make_user('sharer', plants=1)
+    log_in(client, user)
+    plant = Plants.query.filter_by(user_id=user.id).one()
+
+    for shared_with in (friend.id, friend.username):
+        response = client.post('/api/share_plant', json={'plant_id': plant.id, 'shared_with': shared_with})
+        assert response.status_code == 200
+    assert SharedPlant.query.filter_by(shared_with=friend.id).count() == 2
+    assert Notification.query.filter_by(receiver_id=friend.id, plant_id=plant.id).count() == 2
+
+
+@pytest.mark.parametrize('shared_with, status', [
+    (9999, 404),
+    ('nobody', 404),
+    (True, 400),
+    (1.5, 400),
+    ([1], 400),
+    ({'id': 1}, 400),
+])
+def test_share_plant_with_a_bad_recipient_writes_nothing(client, make_user, log_in, shared_with, status):
+    user = make_user('sharer', plants=1)
+    log_in(client, user)
+    plant = Plants.query.filter_by(user_id=user.id).one()
+
+    response = client.post('/api/share_plant', json={'plant_id': plant.id, 'shared_with': shared_with})
+    assert response.status_code == status
+    assert SharedPlant.query.count() == 0
+    assert Notification.query.count() == 0
+
+
+@pytest.fixture
+def short_streams(app):
+    config = {'NOTIFICATION_STREAM_HEARTBEAT': 0.01, 'NOTIFICATION_STREAM_LIFETIME': 0.2}
+    saved = {key: app.config[key] for key in config}
+    app.config.update(config)
+    yield
+    app.config.update(saved)
+
+
+def streamed(response, until=None):
+    # notification ids sent before the stream ends (or `until` of them arrived)
+    ids = []
+    try:
+        for chunk in response.response:
+            for line in chunk.decode().splitlines():
+                if line.startswith('data: '):
+                    ids.append(json.loads(line[len('data: '):])['id'])
+            if until and len(ids) >= until:
+                break
+    finally:
+        response.close()
+    return ids
+
+
+def written_elsewhere(receiver, sender_id, message):
+    #committed without a publish, the way another worker process would
+    notification = Notification(receiver_id=receiver.id, sender_id=sender_id, message=message)
+    user_db.session.add(notification)
+    user_db.session.commit()
+    return notification.id
+
+
+def test_stream_picks_up_notifications_from_other_workers(client, make_user, log_in, short_streams):
+    user = make_user('reader', friends=1)
+    sender = Notification.query.filter_by(receiver_id=user.id).one().sender_id
+    log_in(client, user)
+
+    response = client.get('/api/notifications/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    new_id = written_elsewhere(user, sender, 'from another worker')
+    assert streamed(response, until=1) == [new_id]  # and not the one the user already had
+
+
+def test_stream_replays_after_last_event_id(client, make_user, log_in, short_streams):
+    user = make_user('reader', friends=3)
+    log_in(client, user)
+    first, *missed = [n.id for n in Notification.query.filter_by(receiver_id=user.id).order_by(Notification.id)]
+
+    response = client.get('/api/notifications/stream', headers={'Last-Event-ID': str(first)}, buffered=False)
+    assert streamed(response) == missed
@@ -0,0 +1,91 @@
+#keyset pagination: pages follow each other without gaps or repeats, a
+#cursor the server didn't make is a 400, never a 500, and the history a
+#snapshot leaves out is one cursor away
+
+from datetime import date, timedelta
+
+import pytest
+
+from app.models import user_db, Plants, PlantGrowthEntry, Notification
+from app.pagination import encode_cursor
+from app.snapshot import HISTORY_PER_PLANT, NOTIFICATIONS_PER_SNAPSHOT
+
+PAGED = ['/api/notifications?cursor={}', '/api/update-social?public_cursor={}', '/api/photos?cursor={}',
+         '/api/growth?cursor={}', '/api/watering?cursor={}']
+
+
+def test_pages_cover_everything_once(client, make_user, log_in):
+    user = make_user('pager', friends=7)
+    log_in(client, user)
+
+    seen, cursor = [], None
+    while True:
+        url = '/api/notifications?limit=3' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        seen += [n['id'] for n in data['notifications']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 7 and len(set(seen)) == 7
+
+
+@pytest.mark.parametrize('url', PAGED)
+@pytest.mark.parametrize('cursor', [
+    'W3siYSI6MX0sMV0',               # [{"a":1},1]
+    encode_cursor('2025-01-01', 'x'),
+    encode_cursor(True, 1),
+    encode_cursor('2025-01-01', 1.5),
+    encode_cursor('2025-01-01'),
+    'not base64 at all!',
+])
+def test_malformed_cursor_is_a_400(client, make_user, log_in, url, cursor):
+    log_in(client, make_user('pager', plants=1))
+    response = client.get(url.format(cursor))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+
+def test_snapshot_history_is_capped_with_cursors_for_the_rest(client, make_user, log_in):
+    user = make_user('pager', plants=2)
+    log_in(client, user)
+    plant, other = Plants.query.filter_by(user_id=user.id).order_by(Plants.id).all()
+    user_db.session.add_all(PlantGrowthEntry(user_id=user.id, plant_id=plant.id, plant_name=plant.plant_name,
+                                             date_recorded=date(2025, 2, 1) + timedelta(days=n), cm_grown=n)
+                            for n in range(HISTORY_PER_PLANT))
+    user_db.session.commit()
+
+    snapshot = client.get('/api/session').get_json()
+    growth = [e for e in snapshot['growth_entries'] if e['plant_id'] == plant.id]
+    assert len(growth) == HISTORY_PER_PLANT
+    january = [e.id for e in PlantGrowthEntry.query.filter(PlantGrowthEntry.plant_id == plant.id,
+                                                            PlantGrowthEntry.date_recorded < date(2025, 2, 1))
+               .order_by(PlantGrowthEntry.date_recorded.desc())]
+    assert not {e['id'] for e in growth} & set(january)  # the newest ones
+    assert len([e for e in snapshot['growth_entries'] if e['plant_id'] == other.id]) == 3
+    assert list(snapshot['history_cursors']) == [str(plant.id)]
+    assert list(snapshot['history_cursors'][str(plant.id)]) == ['growth_entries']
+
+    #the cursor picks up right where the snapshot stopped
+    cursor = snapshot['history_cursors'][str(plant.id)]['growth_entries']
+    older = client.get(f'/api/growth?plant_id={plant.id}&cursor={cursor}').get_json()
+    assert [e['id'] for e in older['growth_entries']] == january
+    assert older['next_cursor'] is None
+
+
+def test_snapshot_embeds_one_page_of_notifications(client, assert_max_queries, make_user, log_in):
+    user = make_user('pager', friends=1)
+    sender = Notification.query.filter_by(receiver_id=user.id).one().sender_id
+    user_db.session.add_all(Notification(receiver_id=user.id, sender_id=sender, message=f'note {n}')
+                            for n in range(NOTIFICATIONS_PER_SNAPSHOT + 4))
+    user_db.session.commit()
+    log_in(client, user)
+
+    with assert_max_queries(9):
+        snapshot = client.get('/api/session').get_json()
+    assert len(snapshot['notifications']) == NOTIFICATIONS_PER_SNAPSHOT
+
+    #the rest is where /api/notifications would have gone next
+    rest = client.get(f"/api/notifications?cursor={snapshot['notifications_cursor']}").get_json()
+    seen = [n['id'] for n in snapshot['notifications'] + rest['notifications']]
+    assert sorted(seen) == sorted(n.id for n in Notification.query.filter_by(receiver_id=user.id))
+    assert rest['next_cursor'] is None
@@ -0,0 +1,98 @@
+#password hashing admission control: login/register turned away with 503 when
+#the pool is full, and stored hashes upgraded to the configured method on login
+
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.models import user_db, User
+from app.passwords import password_hasher
+
+
+@pytest.fixture
+def saturated(app, monkeypatch):
+    # every worker busy and no queue behind them; call the fixture's value to let them finish
+    monkeypatch.setattr(password_hasher, 'max_queue', 0)
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def hold():
+        started.release()
+        release.wait(10)
+
+    threads = [threading.Thread(target=password_hasher._run, args=(hold,)) for _ in range(password_hasher.workers)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        assert started.acquire(timeout=10)
+
+    def drain():
+        release.set()
+        for thread in threads:
+            thread.join(10)
+
+    try:
+        yield drain
+    finally:
+        drain()
+
+
+def test_login_when_busy(client, make_user, saturated):
+    make_user('waiting')
+    rejected = password_hasher.stats()['rejected']
+
+    response = client.post('/api/login', json={'username': 'waiting', 'password': 'password'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(password_hasher.retry_after)
+    assert password_hasher.stats()['rejected'] == rejected + 1
+    with client.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+
+def test_register_when_busy(client, saturated):
+    response = client.post('/api/register', json={'username': 'new', 'email': 'new@example.com',
+                                                  'password': 'password'})
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert User.query.filter_by(username='new').count() == 0
+
+
+def test_accepts_again_once_the_pool_drains(client, make_user, saturated):
+    make_user('waiting')
+    assert client.post('/api/login', json={'username': 'waiting', 'password': 'password'}).status_code == 503
+
+    saturated()
+    assert password_hasher.stats()['in_flight'] == 0
+    assert client.post('/api/login', json={'username': 'waiting', 'password': 'password'}).status_code == 200
+
+
+def test_outdated_hash_is_upgraded_on_login(app, client, make_user):
+    user = make_user('veteran')
+    old_hash = generate_password_hash('password', 'pbkdf2:sha256:2')
+    user.password = old_hash
+    user_db.session.commit()
+    assert password_hasher.needs_rehash(old_hash)
+
+    assert client.post('/api/login', json={'username': 'veteran', 'password': 'password'}).status_code == 200
+    user_db.session.refresh(user)
+    assert user.password != old_hash
+    assert user.password.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not password_hasher.needs_rehash(user.password)
+
+    #the new hash works, and isn't rewritten again
+    upgraded = user.password
+    assert client.post('/api/login', json={'username': 'veteran', 'password': 'password'}).status_code == 200
+    user_db.session.refresh(user)
+    assert user.password == upgraded
+
+
+def test_wrong_password_keeps_the_old_hash(client, make_user):
+    user = make_user('veteran')
+    old_hash = generate_password_hash('password', 'pbkdf2:sha256:2')
+    user.password = old_hash
+    user_db.session.commit()
+
+    assert client.post('/api/login', json={'username': 'veteran', 'password': 'nope'}).status_code == 401
+    user_db.session.refresh(user)
+    assert user.password == old_hash
@@ -0,0 +1,111 @@
+#photo uploads into the content-addressed blob store, how /api/blobs/<key>
+#is cached and ranged, and the resized variants made after an upload
+
+import hashlib
+import io
+import os
+
+import pytest
+
+from app.blobstore import blob_store
+from app.derivatives import derivatives, variant_path
+from app.models import Plants, uploadedPics
+
+# only the signature is checked on upload, the rest can be anything
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+
+def upload(client, plant, data, caption='new leaf'):
+    return client.post('/api/upload-photo', content_type='multipart/form-data', data={
+        'plant_id': str(plant.id), 'caption': caption, 'photo': (io.BytesIO(data), 'leaf.png')})
+
+
+@pytest.fixture
+def plant(client, make_user, log_in):
+    user = make_user('snapper', plants=1)
+    log_in(client, user)
+    return Plants.query.filter_by(user_id=user.id).one()
+
+
+@pytest.fixture
+def no_resizing(monkeypatch):
+    monkeypatch.setattr(derivatives, 'submit', lambda *args, **kwargs: None)
+
+
+def test_same_bytes_are_stored_once(client, plant, no_resizing):
+    key = hashlib.sha256(PNG_BYTES).hexdigest()
+    first = upload(client, plant, PNG_BYTES)
+    second = upload(client, plant, PNG_BYTES, caption='same leaf')
+    assert first.status_code == second.status_code == 201
+    assert first.get_json()['image_url'] == second.get_json()['image_url'] == f'/api/blobs/{key}'
+
+    with open(blob_store.path(key), 'rb') as stored:
+        assert stored.read() == PNG_BYTES
+    assert os.listdir(os.path.join(blob_store.root, 'tmp')) == []
+    assert uploadedPics.query.filter_by(blob_key=key).count() == 2
+
+
+@pytest.mark.parametrize('data, status', [(b'GIF89a' + b'\0' * 32, 201), (b'not an image', 415), (b'', 415)])
+def test_only_images_are_accepted(client, plant, no_resizing, data, status):
+    assert upload(client, plant, data).status_code == status
+
+
+def test_too_large(client, plant, no_resizing, monkeypatch):
+    monkeypatch.setattr(blob_store, 'max_bytes', 100)
+    assert upload(client, plant, PNG_BYTES).status_code == 413
+    assert os.listdir(os.path.join(blob_store.root, 'tmp')) == []
+
+
+def test_blob_is_cached_for_good(client, plant, no_resizing):
+    url = upload(client, plant, PNG_BYTES).get_json()['image_url']
+    key = url.rsplit('/', 1)[1]
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == PNG_BYTES and response.mimetype == 'image/png'
+    assert response.headers['ETag'] == f'"{key}"'  # strong, the hash itself
+    assert response.cache_control.immutable and response.cache_control.public
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+    revalidated = client.get(url, headers={'If-None-Match': f'"{key}"'})
+    assert revalidated.status_code == 304 and revalidated.data == b''
+    assert revalidated.headers['ETag'] == f'"{key}"' and revalidated.cache_control.immutable
+
+
+def test_range_request(client, plant, no_resizing):
+    url = upload(client, plant, PNG_BYTES).get_json()['image_url']
+    response = client.get(url, headers={'Range': 'bytes=8-23'})
+    assert response.status_code == 206
+    assert response.data == PNG_BYTES[8:24]
+    assert response.headers['Content-Range'] == f'bytes 8-23/{len(PNG_BYTES)}'
+
+
+def test_unknown_blob(client):
+    assert client.get('/api/blobs/' + '0' * 64).status_code == 404
+    assert client.get('/api/blobs/not-a-key').status_code == 404
+
+
+def test_variant_not_ready_is_served_uncached(client, plant, no_resizing):
+    url = upload(client, plant, PNG_BYTES).get_json()['image_url']
+    response = client.get(f'{url}?size=thumb')
+    assert response.status_code == 200
+    assert response.data == PNG_BYTES
+    assert response.cache_control.no_cache and not response.cache_control.immutable
+
+
+def test_thumbnail_is_generated(client, plant):
+    Image = pytest.importorskip('PIL.Image')
+    data = io.BytesIO()
+    Image.new('RGBA', (800, 400), (0, 128, 0, 128)).save(data, 'PNG')
+    url = upload(client, plant, data.getvalue()).get_json()['image_url']
+    key = url.rsplit('/', 1)[1]
+
+    #queued by the upload; submit hands back that job, or a new one if it already finished
+    derivatives.submit(blob_store.path(key)).result(timeout=30)
+    assert os.path.exists(variant_path(blob_store.path(key), 'card'))
+
+    response = client.get(f'{url}?size=thumb')
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['ETag'] == f'"{key}-thumb"' and response.cache_control.immutable
+    with Image.open(io.BytesIO(response.data)) as thumb:
+        assert thumb.format == 'JPEG' and thumb.size == (160, 80)
@@ -0,0 +1,122 @@
+#growth and watering entries belong to a plant by plant_id
+#routes take plant_id or (for older clients) plant_name and answer with both
+
+from app.models import (user_db, User, Plants, PlantGrowthEntry, PlantWaterEntry, uploadedPics, SharedPlant,
+                        Notification, FeedEntry, ChangeLog)
+from app.importer import import_rows
+
+
+def user_plants(user):
+    return Plants.query.filter_by(user_id=user.id).order_by(Plants.id).all()
+
+
+def first_plant(user):
+    return user_plants(user)[0]
+
+
+def deleted_plant_id(user):
+    # an id that was a real plant and isn't any more, rather than a guess
+    plant = Plants(user_id=user.id, plant_name='Gone', plant_type='fern', chosen_image_url='fern.png',
+                   plant_category='Indoor')
+    user_db.session.add(plant)
+    user_db.session.flush()
+    plant_id = plant.id
+    user_db.session.delete(plant)
+    user_db.session.commit()
+    return plant_id
+
+
+def test_add_growth_by_id_or_name(client, make_user, log_in):
+    user = make_user('grower', plants=2)
+    log_in(client, user)
+    plant = first_plant(user)
+
+    by_id = client.post('/api/add-growth', json={'plant_id': plant.id, 'date': '2025-02-01', 'height': 4.5})
+    by_name = client.post('/api/add-growth', json={'plant_name': plant.plant_name, 'date': '2025-02-02', 'height': 5})
+    assert by_id.status_code == 201 and by_name.status_code == 201
+    assert by_id.get_json()['entry']['plant_id'] == plant.id
+    assert by_name.get_json()['entry']['plant_id'] == plant.id
+
+    response = client.get(f'/api/growth?plant_id={plant.id}')
+    assert [e['plant_id'] for e in response.get_json()['growth_entries']] == [plant.id] * 5
+
+
+def test_cannot_use_someone_elses_plant(client, make_user, log_in):
+    other = make_user('other', plants=1)
+    user = make_user('grower', plants=1)
+    log_in(client, user)
+    plant = first_plant(other)
+
+    response = client.post('/api/add-watering', json={'plant_id': plant.id, 'watering_dates': ['2025-02-01']})
+    assert response.status_code == 404
+    assert client.get(f'/api/growth/analytics?plant_id={plant.id}').status_code == 404
+
+
+def test_delete_plant_deletes_its_history(client, make_user, log_in):
+    user = make_user('grower', plants=2)
+    log_in(client, user)
+    plant, other = user_plants(user)
+
+    response = client.post('/api/delete-plant', json={'plant_id': plant.id})
+    assert response.status_code == 200
+    assert PlantGrowthEntry.query.filter_by(plant_id=plant.id).count() == 0
+    assert PlantWaterEntry.query.filter_by(plant_id=plant.id).count() == 0
+    assert PlantGrowthEntry.query.filter_by(user_id=user.id).count() == 3  # the other plant's
+
+    snapshot = client.get('/api/session').get_json()
+    assert {e['plant_id'] for e in snapshot['growth_entries']} == {other.id}
+
+
+def test_delete_plant_takes_its_photos_and_shares(client, make_user, log_in):
+    friend = make_user('friend')
+    user = make_user('grower', plants=1, friends=1)
+    follower = User.query.filter_by(username='grower-friend0').one()
+    log_in(client, user)
+    plant = first_plant(user)
+    client.post('/api/add-photo', json={'plant_id': plant.id, 'image_url': '/static/images/fern.png'})
+    client.post('/api/share_plant', json={'plant_id': plant.id, 'shared_with': friend.id})
+    assert FeedEntry.query.filter_by(owner_id=follower.id).count() == 1
+    log_in(client, friend)
+    friend_snapshot = client.get('/api/session').get_json()
+    assert len(friend_snapshot['shared_plants']) == 1
+
+    log_in(client, user)
+    assert client.post('/api/delete-plant', json={'plant_id': plant.id}).status_code == 200
+    assert uploadedPics.query.filter_by(plant_id=plant.id).count() == 0
+    assert SharedPlant.query.filter_by(plant_id=plant.id).count() == 0
+    assert FeedEntry.query.filter_by(owner_id=follower.id).count() == 0
+    notification = Notification.query.filter_by(receiver_id=friend.id).one()
+    assert notification.plant_id is None  # kept, without the link
+
+    #the recipient's cached snapshot was dropped, and their delta sync hears about it too
+    log_in(client, friend)
+    assert client.get('/api/session').get_json()['shared_plants'] == []
+    delta = client.get(f"/api/session?since={friend_snapshot['cursor']}").get_json()
+    assert len(delta['tombstones']['shared_plants']) == 1
+    assert [n['id'] for n in delta['changed']['notifications']] == [notification.id]
+    assert ChangeLog.query.filter_by(user_id=user.id, section='photos', op='delete').count() == 2
+
+
+def test_watering_analytics_by_plant_id(client, make_user, log_in):
+    user = make_user('grower', plants=2)
+    log_in(client, user)
+    plant, other = user_plants(user)
+
+    client.post('/api/add-watering', json={'plant_id': plant.id, 'watering_dates': ['2025-01-05']})
+    plants = client.get('/api/watering/analytics').get_json()['plants']
+    assert sorted((p['plant_id'], p['plant_name'], p['waterings']) for p in plants) == [
+        (plant.id, plant.plant_name, 4), (other.id, other.plant_name, 3)]
+    assert client.get(f'/api/growth/analytics?plant_id={deleted_plant_id(user)}').status_code == 404
+
+
+def test_import_by_plant_id_skips_duplicates(app, make_user):
+    user = make_user('grower', plants=1)
+    plant = first_plant(user)
+    rows = [(1, {'plant_id': str(plant.id), 'date': '2025-01-01', 'height': '1'}),  # already stored
+            (2, {'plant_name': plant.plant_name, 'date': '2025-03-01', 'height': '7'}),
+            (3, {'plant_id': str(deleted_plant_id(user)), 'date': '2025-03-02', 'height': '7'})]
+
+    report = import_rows(user.id, 'growth', rows)
+    assert (report['inserted'], report['duplicates'], report['error_count']) == (1, 1, 1)
+    assert PlantGrowthEntry.query.filter_by(plant_id=plant.id).count() == 4
+
@@ -0,0 +1,59 @@
+#query budgets: how many SQL statements a request may run
+#each test builds a small and a bigger account and gives both the same budget,
+#so a query added inside a loop (an N+1) fails here instead of in production
+
+import pytest
+
+from app.models import User, Plants
+
+
+@pytest.mark.parametrize('size', [1, 8])
+def test_login_query_budget(client, assert_max_queries, make_user, size):
+    make_user('budget', plants=size, friends=size)
+    with assert_max_queries(13):
+        response = client.post('/api/login', json={'username': 'budget', 'password': 'password'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('size', [1, 8])
+def test_session_query_budget(client, assert_max_queries, make_user, log_in, size):
+    user = make_user('budget', plants=size, friends=size)
+    log_in(client, user)
+    with assert_max_queries(9):
+        response = client.get('/api/session')
+    assert response.status_code == 200
+    assert len(response.get_json()['plants']) == size
+
+
+@pytest.mark.parametrize('size', [1, 8])
+def test_get_friends_query_budget(client, assert_max_queries, make_user, log_in, size):
+    user = make_user('budget', friends=size)
+    log_in(client, user)
+    with assert_max_queries(1):
+        response = client.get('/api/friends')
+    assert response.status_code == 200
+    assert len(response.get_json()['friends']) == size
+
+
+@pytest.mark.parametrize('size', [1, 8])
+def test_notifications_query_budget(client, assert_max_queries, make_user, log_in, size):
+    user = make_user('budget', friends=size)
+    log_in(client, user)
+    with assert_max_queries(2):
+        response = client.get('/api/notifications')
+    assert response.status_code == 200
+
+
+def test_budget_failure_lists_statements(app, assert_max_queries):
+    #the helper itself: going over the budget fails and shows what ran
+    with pytest.raises(pytest.fail.Exception, match='expected at most 1 queries, ran 2'):
+        with assert_max_queries(1):
+            User.query.count()
+            Plants.query.count()
+
+
+def test_tests_start_empty(app, make_user):
+    #the previous tests' users were rolled back with their savepoints
+    assert User.query.count() == 0
+    make_user('budget')
+    assert User.query.count() == 1
@@ -0,0 +1,43 @@
+#user search (/api/search-users): trigram substring matches, short prefixes, the friend flag
+
+import pytest
+
+
+def search(client, q, **args):
+    response = client.get('/api/search-users', query_string={'q': q, **args})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+@pytest.fixture
+def searcher(client, make_user, log_in):
+    user = make_user('fernando', friends=1)  # fernando-friend0
+    for name in ('Fern', 'ferny', 'bracken', 'Maidenhair-fern'):
+        make_user(name)
+    log_in(client, user)
+    return user
+
+
+def test_substring_match(client, searcher):
+    #three or more characters go through the trigram index, anywhere in the name
+    names = {r['username']: r['is_friend'] for r in search(client, 'FERN')}
+    assert names == {'Fern': False, 'ferny': False, 'Maidenhair-fern': False, 'fernando-friend0': True}
+    assert [r['username'] for r in search(client, 'racke')] == ['bracken']
+
+
+def test_short_query_matches_prefix(client, searcher):
+    assert [r['username'] for r in search(client, 'fe')] == ['Fern', 'fernando-friend0', 'ferny']
+    assert search(client, 'rn') == []
+
+
+def test_limit_and_quotes(client, searcher):
+    assert len(search(client, 'fern', limit=2)) == 2
+    assert search(client, '"fern') == []
+
+
+def test_empty_query(client, searcher):
+    assert search(client, '   ') == []
+
+
+def test_logged_out(client):
+    assert client.get('/api/search-users?q=fern').status_code == 401
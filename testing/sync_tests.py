@@ -0,0 +1,98 @@
+#delta sync: /api/session?since=<cursor> brings a cached snapshot up to date
+#with what changed, and tells the client to resync when it can't
+
+from datetime import datetime, timedelta
+
+from app.changes import prune_changes
+from app.models import user_db, ChangeLog, Plants
+
+
+def full_snapshot(client):
+    snapshot = client.get('/api/session').get_json()
+    assert snapshot['full']
+    return snapshot
+
+
+def delta(client, cursor):
+    response = client.get(f'/api/session?since={cursor}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_create_update_delete_round_trip(client, make_user, log_in):
+    user = make_user('syncer', plants=1, friends=2)
+    log_in(client, user)
+    cursor = full_snapshot(client)['cursor']
+
+    #create
+    plant_id = client.post('/api/add-plant', json={'plant_name': 'Basil', 'plant_type': 'herb',
+                                                   'chosen_image_url': 'basil.png',
+                                                   'plant_category': 'Indoor'}).get_json()['plant_id']
+    body = delta(client, cursor)
+    assert [p['id'] for p in body['changed']['plants']] == [plant_id]
+    assert body['tombstones'] == {}
+
+    #update
+    client.post('/api/notifications/mark-all-read')
+    body = delta(client, body['cursor'])
+    assert [n['is_read'] for n in body['changed']['notifications']] == [True, True]
+    assert 'plants' not in body['changed']
+
+    #delete, with the plant's history
+    client.post('/api/delete-plant', json={'plant_id': plant_id})
+    old = Plants.query.filter(Plants.user_id == user.id, Plants.id != plant_id).one()
+    client.post('/api/delete-plant', json={'plant_id': old.id})
+    body = delta(client, body['cursor'])
+    assert sorted(body['tombstones']['plants']) == sorted([plant_id, old.id])
+    assert len(body['tombstones']['growth_entries']) == 3
+    assert body['changed'] == {}
+
+    #nothing new, same cursor back
+    assert delta(client, body['cursor']) == {**body, 'changed': {}, 'tombstones': {}}
+
+
+def test_pruned_cursor_resyncs(app, client, make_user, log_in):
+    user = make_user('syncer', plants=1)
+    log_in(client, user)
+    stale = full_snapshot(client)['cursor']
+    client.post('/api/add-plant', json={'plant_name': 'Basil', 'plant_type': 'herb',
+                                        'chosen_image_url': 'basil.png', 'plant_category': 'Indoor'})
+    ChangeLog.query.update({'changed_at': datetime(2020, 1, 1)})
+    client.post('/api/settings', json={'is_profile_public': False})
+
+    prune_changes(user_db.session, datetime.now() - timedelta(days=30))
+    assert delta(client, stale) == {'user_id': user.id, 'full': False, 'resync': True}
+
+    #a snapshot taken after pruning syncs normally again
+    body = delta(client, full_snapshot(client)['cursor'])
+    assert 'resync' not in body
+
+
+def test_compaction_keeps_the_latest_change_per_row(app, client, make_user, log_in):
+    user = make_user('syncer')
+    log_in(client, user)
+    cursor = full_snapshot(client)['cursor']
+    for public in (False, True, False):
+        client.post('/api/settings', json={'is_profile_public': public})
+
+    before = delta(client, cursor)
+    compacted, pruned = prune_changes(user_db.session, datetime(2000, 1, 1))
+    assert compacted >= 2 and pruned == 0
+    assert ChangeLog.query.filter_by(user_id=user.id, section='settings').count() == 1
+    assert delta(client, cursor) == before
+
+
+def test_delta_over_the_cap_resyncs(app, client, make_user, log_in):
+    user = make_user('syncer')
+    log_in(client, user)
+    cursor = full_snapshot(client)['cursor']
+    for n in range(3):
+        client.post('/api/settings', json={'is_profile_public': n % 2 == 0})
+
+    cap = app.config['SYNC_MAX_CHANGES']
+    app.config['SYNC_MAX_CHANGES'] = 2
+    try:
+        assert delta(client, cursor)['resync']
+    finally:
+        app.config['SYNC_MAX_CHANGES'] = cap
+    assert 'resync' not in delta(client, cursor)
@@ -1,4 +1,6 @@
 # view_db.py
+# Prints every table; rows are read in batches so this works on big databases too.
+# For one user's data in a reusable format use GET /api/export instead.
 
 from app import create_app
 from app.models import user_db
@@ -18,37 +20,38 @@ app = create_app()
 
 with app.app_context():
     print("\n🌱 Users:")
-    for u in User.query.all():
+    for u in User.query.yield_per(500):
         print(f"ID: {u.id}, Username: {u.username}, Email: {getattr(u, 'email', 'N/A')}")
 
     print("\n🪴 Plants:")
-    for p in Plants.query.all():
-        print(f"ID: {p.id}, Name: {p.name}, Owner ID: {p.user_id}")
+    for p in Plants.query.yield_per(500):
+        print(f"ID: {p.id}, Name: {p.plant_name}, Owner ID: {p.user_id}")
 
     print("\n📤 Shared Plants:")
-    for s in SharedPlant.query.all():
+    for s in SharedPlant.query.yield_per(500):
         print(f"Plant ID: {s.plant_id}, From User: {s.shared_by}, To User: {s.shared_with}")
 
     print("\n🔔 Notifications:")
-    for n in Notification.query.all():
+    for n in Notification.query.yield_per(500):
         print(f"To: {n.receiver_id}, From: {n.sender_id}, Msg: {n.message}")
 
     print("\n👥 Friends List:")
-    for f in FriendsList.query.all():
+    for f in FriendsList.query.yield_per(500):
         print(f"User: {f.user_id}, Friend: {f.friend_id}, Status: {f.status}")
 
     print("\n📈 Growth Entries:")
-    for g in PlantGrowthEntry.query.all():
-        print(f"Plant: {g.plant_id}, Date: {g.date}, Height: {g.height}cm")
+    for g in PlantGrowthEntry.query.yield_per(500):
+        print(f"Plant: {g.plant_name}, Date: {g.date_recorded}, Height: {g.cm_grown}cm")
 
     print("\n💧 Watering Entries:")
-    for w in PlantWaterEntry.query.all():
-        print(f"Plant: {w.plant_id}, Date: {w.date_watered}")
+    for w in PlantWaterEntry.query.yield_per(500):
+        print(f"Plant: {w.plant_name}, Date: {w.date_watered}")
 
     print("\n🖼️ Uploaded Photos:")
-    for p in uploadedPics.query.all():
-        print(f"Plant: {p.plant_id}, URL: {p.image_url}")
+    for p in uploadedPics.query.yield_per(500):
+        # older photos keep the whole data URL in image_url, don't print megabytes of base64
+        print(f"Plant: {p.plant_id}, URL: {p.image_url[:80]}")
 
     print("\n⚙️ User Settings:")
-    for s in UserSettings.query.all():
-        print(f"User ID: {s.user_id}, Setting: {vars(s)}")
\ No newline at end of file
+    for s in UserSettings.query.yield_per(500):
+        print(f"User ID: {s.user_id}, Public: {s.is_profile_public}, Friend requests: {s.allow_friend_requests}")
\ No newline at end of file